@@ -0,0 +1,208 @@
+"""
+Multi-movie catalog.
+
+Every movie lives in its own directory, so movies can be processed and
+screened side by side without touching each other's files:
+
+    catalog/
+        index.json                  movie records + theatre lookup
+        store/                      content-addressed encrypted shards
+        <movie_id>/
+            shards/                 plaintext work dir (transient)
+            encrypted/              encrypted shards (imported legacy movies)
+            manifest.json
+            playlist.m3u8
+            secret.key
+
+Shards ingested by the pipeline live in the shared shard store (see
+shard_store); a manifest part with an ``object`` id points there.
+"""
+import os
+import sys
+import json
+import shutil
+import threading
+from datetime import datetime, timezone
+
+from shard_crypto import key_check
+from shard_store import ShardStore
+
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog")
+
+
+class Catalog:
+    """Index of movies keyed by ``movie_id``, with per-movie storage paths."""
+
+    def __init__(self, root=CATALOG_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        self._movies = self._load()
+        # Bumped on every index change, so callers can tell a cached view is stale
+        self.version = 0
+        self.store = ShardStore(os.path.join(root, "store"))
+
+    # -----------------------------
+    # PATHS
+    # -----------------------------
+    def movie_dir(self, movie_id):
+        return os.path.join(self.root, movie_id)
+
+    def shard_dir(self, movie_id):
+        return os.path.join(self.root, movie_id, "shards")
+
+    def encrypted_dir(self, movie_id):
+        return os.path.join(self.root, movie_id, "encrypted")
+
+    def part_path(self, movie_id, part):
+        """Encrypted file of a manifest part (shard store or movie directory)."""
+        if part.get("object"):
+            return self.store.object_path(part["object"])
+        return os.path.join(self.encrypted_dir(movie_id), part["id"])
+
+    def manifest_path(self, movie_id):
+        return os.path.join(self.root, movie_id, "manifest.json")
+
+    def playlist_path(self, movie_id):
+        return os.path.join(self.root, movie_id, "playlist.m3u8")
+
+    def key_path(self, movie_id):
+        return os.path.join(self.root, movie_id, "secret.key")
+
+    # -----------------------------
+    # INDEX
+    # -----------------------------
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f).get("movies", {})
+        except (json.JSONDecodeError, IOError):
+            return {}
+
+    def _save(self):
+        self.version += 1
+        by_theatre = {}
+        for movie_id, movie in self._movies.items():
+            by_theatre.setdefault(movie["theatre_id"], []).append(movie_id)
+
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"movies": self._movies, "by_theatre": by_theatre}, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def create(self, movie_id, name, theatre_id, **fields):
+        """Register a movie and create its (empty) storage directories."""
+        with self._lock:
+            if movie_id in self._movies:
+                raise ValueError(f"Movie already exists: {movie_id}")
+            for d in (self.shard_dir(movie_id), self.encrypted_dir(movie_id)):
+                os.makedirs(d, exist_ok=True)
+            movie = {
+                "movie_id": movie_id,
+                "name": name,
+                "theatre_id": theatre_id,
+                "status": "uploaded",
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            movie.update(fields)
+            self._movies[movie_id] = movie
+            self._save()
+            return dict(movie)
+
+    def update(self, movie_id, **fields):
+        with self._lock:
+            movie = self._movies[movie_id]
+            movie.update(fields)
+            self._save()
+            return dict(movie)
+
+    def get(self, movie_id):
+        with self._lock:
+            movie = self._movies.get(movie_id)
+            return dict(movie) if movie else None
+
+    def list(self, theatre_id=None, status=None):
+        """Movies, newest first, optionally filtered by theatre and status."""
+        with self._lock:
+            movies = [
+                dict(m) for m in self._movies.values()
+                if (theatre_id is None or m["theatre_id"] == theatre_id)
+                and (status is None or m["status"] == status)
+            ]
+        return sorted(movies, key=lambda m: m["created_at"], reverse=True)
+
+    def reset(self, movie_id):
+        """Empty a movie's shard directories before (re)processing it."""
+        self.store.release(movie_id)
+        for d in (self.shard_dir(movie_id), self.encrypted_dir(movie_id)):
+            shutil.rmtree(d, ignore_errors=True)
+            os.makedirs(d, exist_ok=True)
+
+    def remove(self, movie_id):
+        with self._lock:
+            self._movies.pop(movie_id, None)
+            self._save()
+        self.store.release(movie_id)
+        shutil.rmtree(self.movie_dir(movie_id), ignore_errors=True)
+
+    def load_manifest(self, movie_id):
+        with open(self.manifest_path(movie_id), "r") as f:
+            return json.load(f)
+
+    def load_key(self, movie_id):
+        with open(self.key_path(movie_id), "rb") as f:
+            return f.read().strip()
+
+    # -----------------------------
+    # LEGACY IMPORT
+    # -----------------------------
+    def import_legacy(self, movie_id, backend_dir):
+        """Copy a pre-catalog backend/ layout (manifest.json, secret.key,
+        encrypted_shards/) into the catalog as ``movie_id``."""
+        manifest_src = os.path.join(backend_dir, "manifest.json")
+        with open(manifest_src, "r") as f:
+            manifest = json.load(f)
+
+        first = manifest["shards"][0]["id"] if manifest["shards"] else movie_id
+        movie = self.create(
+            movie_id,
+            first.split("_part")[0],
+            manifest["theatre_id"],
+            status="ready",
+            shards=len(manifest["shards"]),
+        )
+        with open(os.path.join(backend_dir, "secret.key"), "rb") as f:
+            key = f.read().strip()
+        manifest["movie_id"] = movie_id
+        manifest["key_check"] = key_check(key, movie_id)
+        parts = ([manifest["init"]] if manifest.get("init") else []) + manifest["shards"]
+        for part in parts:
+            shutil.copy2(
+                os.path.join(backend_dir, "encrypted_shards", part["id"]),
+                os.path.join(self.encrypted_dir(movie_id), part["id"])
+            )
+        with open(self.key_path(movie_id), "wb") as f:
+            f.write(key)
+        with open(self.manifest_path(movie_id), "w") as f:
+            json.dump(manifest, f, indent=4)
+        return movie
+
+
+if __name__ == "__main__":
+    # Usage: python catalog.py list
+    #        python catalog.py import-legacy <movie_id>
+    catalog = Catalog()
+    if len(sys.argv) == 3 and sys.argv[1] == "import-legacy":
+        movie = catalog.import_legacy(sys.argv[2], os.path.dirname(os.path.abspath(__file__)))
+        print(f"✅ Imported legacy movie as '{movie['movie_id']}' ({movie['shards']} shards)")
+    elif len(sys.argv) == 2 and sys.argv[1] == "list":
+        for movie in catalog.list():
+            print(f"{movie['movie_id']}  {movie['status']:<9} {movie['theatre_id']:<12} {movie['name']}")
+        stats = catalog.store.stats()
+        print(f"Shard store: {stats['objects']} objects, {stats['bytes']} bytes, {stats['sources']} sources")
+    else:
+        print("Usage: python catalog.py list | import-legacy <movie_id>")
+        sys.exit(1)
@@ -1,5 +1,9 @@
 import os
-from cryptography.fernet import Fernet
+import sys
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from shard_crypto import encrypt_shard, generate_key
 
 # -----------------------------
 # CONFIG
@@ -7,50 +11,70 @@ from cryptography.fernet import Fernet
 SHARDS_FOLDER = "shards"
 ENCRYPTED_FOLDER = "encrypted_shards"
 
-# Create encrypted folder if it doesn't exist
-os.makedirs(ENCRYPTED_FOLDER, exist_ok=True)
+# Ciphertext hashes computed while encrypting; generate_manifest.py reuses them
+HASHES_FILE = "shard_hashes.json"
 
 # Generate a key or load from file (keep this safe!)
 KEY_FILE = "secret.key"
 
-if os.path.exists(KEY_FILE):
-    with open(KEY_FILE, "rb") as f:
-        key = f.read()
-else:
-    key = Fernet.generate_key()
+# Parallel workers (override with: python encrypt_shards.py <workers>)
+WORKERS = os.cpu_count() or 1
+
+
+def load_or_create_key():
+    if os.path.exists(KEY_FILE):
+        with open(KEY_FILE, "rb") as f:
+            return f.read().strip()
+    key = generate_key()
     with open(KEY_FILE, "wb") as f:
         f.write(key)
+    return key
 
-fernet = Fernet(key)
 
 # -----------------------------
 # ENCRYPT SHARDS
 # -----------------------------
-shards = [f for f in os.listdir(SHARDS_FOLDER) if os.path.isfile(os.path.join(SHARDS_FOLDER, f))]
-
-if not shards:
-    print("⚠ No shards found to encrypt!")
-else:
-    print(f"🔒 Encrypting {len(shards)} shard(s)...")
-
-for shard_file in shards:
-    shard_path = os.path.join(SHARDS_FOLDER, shard_file)
-    
-    # Read plaintext shard
-    with open(shard_path, "rb") as f:
-        data = f.read()
-    
-    # Encrypt
-    encrypted_data = fernet.encrypt(data)
-    
-    # Write encrypted shard
-    encrypted_path = os.path.join(ENCRYPTED_FOLDER, shard_file + ".enc")
-    with open(encrypted_path, "wb") as f:
-        f.write(encrypted_data)
-    
-    # Delete plaintext shard
-    os.remove(shard_path)
-    print(f"✅ Encrypted and deleted: {shard_file}")
-
-print(f"🎉 All shards encrypted. Encrypted files stored in '{ENCRYPTED_FOLDER}'")
-print(f"🔑 Encryption key saved in '{KEY_FILE}' — keep this safe!")
+def main(workers=WORKERS):
+    # Create encrypted folder if it doesn't exist
+    os.makedirs(ENCRYPTED_FOLDER, exist_ok=True)
+    key = load_or_create_key()
+
+    shards = [
+        f for f in os.listdir(SHARDS_FOLDER)
+        if os.path.isfile(os.path.join(SHARDS_FOLDER, f)) and not f.endswith(".m3u8")
+    ]
+
+    if not shards:
+        print("⚠ No shards found to encrypt!")
+        return
+    print(f"🔒 Encrypting {len(shards)} shard(s) on {min(workers, len(shards))} worker(s)...")
+
+    hashes = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(shards)))) as pool:
+        futures = {
+            pool.submit(
+                encrypt_shard,
+                os.path.join(SHARDS_FOLDER, shard_file),
+                os.path.join(ENCRYPTED_FOLDER, shard_file + ".enc"),
+                key
+            ): shard_file
+            for shard_file in shards
+        }
+        for future in as_completed(futures):
+            shard_file = futures[future]
+            entry = future.result()
+            hashes[entry["id"]] = entry
+
+            # Delete plaintext shard
+            os.remove(os.path.join(SHARDS_FOLDER, shard_file))
+            print(f"✅ [{len(hashes)}/{len(shards)}] Encrypted and deleted: {shard_file}")
+
+    with open(HASHES_FILE, "w") as f:
+        json.dump(hashes, f, indent=4)
+
+    print(f"🎉 All shards encrypted. Encrypted files stored in '{ENCRYPTED_FOLDER}'")
+    print(f"🔑 Encryption key saved in '{KEY_FILE}' — keep this safe!")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS)
@@ -3,12 +3,23 @@ import json
 import hashlib
 from datetime import datetime, timedelta
 
+from shard_crypto import chunked_plaintext_size, is_chunked
+
 # Folder where encrypted shards are stored
 SHARDS_FOLDER = "encrypted_shards"
 
 # Output manifest file
 MANIFEST_FILE = "manifest.json"
 
+# Hashes recorded by encrypt_shards.py while encrypting
+HASHES_FILE = "shard_hashes.json"
+
+# HLS playlists shard_movie.py leaves next to the plaintext segments
+PLAYLISTS_FOLDER = "shards"
+
+# fMP4 init segment written by shard_movie.py, one per movie
+INIT_SUFFIX = "_init.mp4"
+
 # Example theatre ID and playback window
 THEATRE_ID = "THEATRE_001"
 PLAYBACK_START = datetime.utcnow()
@@ -18,10 +29,36 @@ def sha256_file(filepath):
     """Compute SHA-256 hash of a file"""
     h = hashlib.sha256()
     with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
             h.update(chunk)
     return h.hexdigest()
 
+def load_recorded_hashes():
+    """Hashes from encrypt_shards.py, for shards unchanged since encryption"""
+    if not os.path.exists(HASHES_FILE):
+        return {}
+    with open(HASHES_FILE, "r") as f:
+        return json.load(f)
+
+def load_segment_durations():
+    """Segment durations (seconds) by plaintext file name, from the playlists"""
+    durations = {}
+    if not os.path.exists(PLAYLISTS_FOLDER):
+        return durations
+    for name in os.listdir(PLAYLISTS_FOLDER):
+        if not name.endswith(".m3u8"):
+            continue
+        with open(os.path.join(PLAYLISTS_FOLDER, name), "r") as f:
+            duration = None
+            for line in f:
+                line = line.strip()
+                if line.startswith("#EXTINF:"):
+                    duration = float(line[len("#EXTINF:"):].split(",")[0])
+                elif line and not line.startswith("#") and duration is not None:
+                    durations[os.path.basename(line)] = duration
+                    duration = None
+    return durations
+
 def generate_manifest():
     if not os.path.exists(SHARDS_FOLDER):
         print(f"⚠ Folder '{SHARDS_FOLDER}' does not exist!")
@@ -38,16 +75,38 @@ def generate_manifest():
             "start": PLAYBACK_START.isoformat() + "Z",
             "end": PLAYBACK_END.isoformat() + "Z"
         },
+        "format": "fmp4",
+        "init": None,
         "shards": []
     }
 
+    recorded = load_recorded_hashes()
+    durations = load_segment_durations()
     for shard_file in sorted(shards):
         shard_path = os.path.join(SHARDS_FOLDER, shard_file)
-        shard_hash = sha256_file(shard_path)
-        manifest_data["shards"].append({
-            "id": shard_file,
-            "sha256": shard_hash
-        })
+        entry = recorded.get(shard_file)
+        if entry and os.path.getmtime(shard_path) <= os.path.getmtime(HASHES_FILE):
+            entry = dict(entry)
+        else:
+            entry = {
+                "id": shard_file,
+                "sha256": sha256_file(shard_path)
+            }
+            if is_chunked(shard_path):
+                entry["size"] = chunked_plaintext_size(shard_path)
+
+        name = shard_file[:-len(".enc")] if shard_file.endswith(".enc") else shard_file
+        if name in durations:
+            entry["duration"] = durations[name]
+        if name.endswith(INIT_SUFFIX):
+            # fMP4 fragments only play behind their init segment
+            manifest_data["init"] = entry
+        else:
+            manifest_data["shards"].append(entry)
+
+    if manifest_data["init"] is None:
+        # Whole-file MP4 shards (from before HLS segmenting)
+        del manifest_data["format"], manifest_data["init"]
 
     with open(MANIFEST_FILE, "w") as f:
         json.dump(manifest_data, f, indent=4)
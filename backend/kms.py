@@ -1,59 +1,290 @@
-import secrets
+"""
+Local key management service (asyncio HTTP, JSON).
+
+A stand-in for the production KMS: movie master keys never leave it. A
+theatre opens a session for a movie, which is valid for that movie's
+playback window. It then asks for shard keys in batches. Each issued key
+is the per-file AEAD key of one chunked shard (see
+shard_crypto.derive_shard_key), so it opens that shard only. Legacy Fernet
+shards have no per-file key and get the movie key, with scope "movie".
+Sessions and derived keys are cached until the playback window closes,
+per manifest build (its created_at), so a movie reprocessed inside its
+window gets keys from its new master key. A background task evicts
+expired entries.
+
+    POST /v1/sessions   {"movie_id", "theatre_id"}
+                        -> {"session", "expires", "shards", "manifest_key"}
+    POST /v1/keys       {"session", "shard_ids": [...]}   (at most MAX_BATCH)
+                        -> {"keys": {shard_id: {"key", "scope"}}, "expires"}
+    GET  /v1/health
+
+Every request needs "Authorization: Bearer <CINEMASHIELD_KMS_TOKEN>". The
+server refuses to start without a token unless CINEMASHIELD_KMS_INSECURE=1
+is set, for local development only.
+
+Usage: python kms.py [port]
+"""
+import os
+import sys
 import json
-from datetime import datetime, timedelta
-
-# Example manifest file
-MANIFEST_FILE = "manifest.json"
-
-# In-memory key store (for demo; in real world, use secure DB)
-KEY_STORE = {}
-
-def generate_temp_key(shard_id, theatre_id, valid_minutes=120):
-    """Generate a temporary AES key for a shard"""
-    key = secrets.token_hex(32)  # 256-bit key in hex
-    expires_at = datetime.utcnow() + timedelta(minutes=valid_minutes)
-    
-    # Store the key info
-    KEY_STORE[shard_id] = {
-        "key": key,
-        "theatre_id": theatre_id,
-        "expires_at": expires_at
-    }
-    return key
-
-def validate_key(shard_id, theatre_id, key):
-    """Check if a key is valid for the shard"""
-    info = KEY_STORE.get(shard_id)
-    if not info:
-        return False, "Key does not exist"
-    
-    now = datetime.utcnow()
-    if info["theatre_id"] != theatre_id:
-        return False, "Invalid theatre ID"
-    if now > info["expires_at"]:
-        return False, "Key expired"
-    if info["key"] != key:
-        return False, "Invalid key"
-    
-    return True, "Key valid"
-
-def load_manifest():
-    """Load shard info from manifest"""
-    with open(MANIFEST_FILE, "r") as f:
-        return json.load(f)
+import time
+import asyncio
+import hmac
+import secrets
+import threading
+from datetime import datetime, timezone
+
+from catalog import Catalog
+from merkle import is_merkle, manifest_key
+from shard_crypto import derive_shard_key, is_chunked, part_key
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BATCH = 64
+SWEEP_INTERVAL = 30
+MAX_BODY = 64 * 1024
+
+
+class KMSError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class TTLCache:
+    """Thread-safe dict whose entries expire at a given Unix time."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.time():
+                del self._items[key]
+                return None
+            return item[1]
+
+    def put(self, key, value, expires):
+        with self._lock:
+            self._items[key] = (expires, value)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (expires, _) in self._items.items() if expires <= now]:
+                del self._items[key]
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _parse_iso(s):
+    dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class KMS:
+    def __init__(self, catalog=None):
+        self.catalog = catalog or Catalog()
+        self.sessions = TTLCache()
+        self.keys = TTLCache()
+
+    def open_session(self, movie_id, theatre_id):
+        movie = self.catalog.get(movie_id or "")
+        if not movie or movie["status"] != "ready":
+            raise KMSError("Unknown movie", 404)
+        manifest = self.catalog.load_manifest(movie_id)
+        if (theatre_id or "").upper() != manifest["theatre_id"].upper():
+            raise KMSError("Movie is not licensed to this theatre", 403)
+
+        start = _parse_iso(manifest["playback_window"]["start"])
+        end = _parse_iso(manifest["playback_window"]["end"])
+        now = datetime.now(timezone.utc)
+        if not start <= now <= end:
+            raise KMSError("Outside the playback window", 403)
+
+        parts = ([manifest["init"]] if manifest.get("init") else []) + manifest["shards"]
+        build = manifest.get("created_at")
+        # Pin the session to the master key of this manifest build
+        master = self._master_key(movie_id, build, end.timestamp())
+        session = secrets.token_urlsafe(24)
+        self.sessions.put(session, {
+            "movie_id": movie_id,
+            "build": build,
+            "theatre_id": manifest["theatre_id"],
+            "parts": {part["id"]: part for part in parts},
+            "expires": end.timestamp(),
+        }, end.timestamp())
+
+        response = {
+            "session": session,
+            "movie_id": movie_id,
+            "expires": end.isoformat(),
+            "shards": [part["id"] for part in parts],
+        }
+        if is_merkle(manifest):
+            response["manifest_key"] = manifest_key(master)
+        return response
+
+    def _master_key(self, movie_id, build, expires):
+        key = self.keys.get((movie_id, build, None))
+        if key is None:
+            key = self.catalog.load_key(movie_id)
+            self.keys.put((movie_id, build, None), key, expires)
+        return key
+
+    def issue_keys(self, session_id, shard_ids):
+        session = self.sessions.get(session_id or "")
+        if session is None:
+            raise KMSError("Unknown or expired session", 401)
+        if not isinstance(shard_ids, list) or not shard_ids:
+            raise KMSError("shard_ids must be a non-empty list")
+        if len(shard_ids) > MAX_BATCH:
+            raise KMSError(f"At most {MAX_BATCH} keys per request")
+        unknown = [sid for sid in shard_ids if sid not in session["parts"]]
+        if unknown:
+            raise KMSError(f"Shards not in this movie: {unknown[:5]}", 403)
+
+        movie_id, build, expires = session["movie_id"], session["build"], session["expires"]
+        keys = {}
+        for shard_id in shard_ids:
+            issued = self.keys.get((movie_id, build, shard_id))
+            if issued is None:
+                part = session["parts"][shard_id]
+                master = self._master_key(movie_id, build, expires)
+                path = self.catalog.part_path(movie_id, part)
+                if is_chunked(path):
+                    issued = {"key": derive_shard_key(part_key(master, part), path).encode(), "scope": "shard"}
+                else:
+                    issued = {"key": master.decode(), "scope": "movie"}
+                self.keys.put((movie_id, build, shard_id), issued, expires)
+            keys[shard_id] = issued
+        return {"keys": keys, "expires": datetime.fromtimestamp(expires, timezone.utc).isoformat()}
+
+    def sweep(self):
+        self.sessions.sweep()
+        self.keys.sweep()
+
+
+# -----------------------------
+# HTTP
+# -----------------------------
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class KMSServer:
+    def __init__(self, kms, auth_token=None, insecure=False):
+        """``insecure`` serves keys without a token (local development only)."""
+        if not auth_token and not insecure:
+            raise ValueError("The KMS needs an auth token")
+        self.kms = kms
+        self.auth_token = auth_token
+
+    def _authorized(self, headers):
+        if not self.auth_token:
+            return True
+        expected = f"Bearer {self.auth_token}".encode()
+        return hmac.compare_digest(headers.get("authorization", "").encode(), expected)
+
+    async def route(self, method, path, headers, body):
+        if not self._authorized(headers):
+            raise KMSError("Unauthorized", 401)
+        if path == "/v1/health" and method == "GET":
+            return {"ok": True, "sessions": len(self.kms.sessions), "keys": len(self.kms.keys)}
+        if method != "POST":
+            raise KMSError("Method not allowed", 405)
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise KMSError("Body must be JSON")
+        if path == "/v1/sessions":
+            return await asyncio.to_thread(
+                self.kms.open_session, payload.get("movie_id"), payload.get("theatre_id")
+            )
+        if path == "/v1/keys":
+            return await asyncio.to_thread(
+                self.kms.issue_keys, payload.get("session"), payload.get("shard_ids")
+            )
+        raise KMSError("Not found", 404)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                try:
+                    if length > MAX_BODY:
+                        raise KMSError("Request too large", 413)
+                    body = await reader.readexactly(length) if length else b""
+                    status, result = 200, await self.route(method, path, headers, body)
+                except KMSError as e:
+                    status, result = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, result = 500, {"error": str(e)}
+
+                data = json.dumps(result).encode()
+                keep_alive = headers.get("connection", "").lower() != "close" and status != 413
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Cache-Control: no-store\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def sweeper(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.kms.sweep()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        sweeper = asyncio.create_task(self.sweeper())
+        if ready:
+            ready(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
 
 if __name__ == "__main__":
-    manifest = load_manifest()
-    theatre_id = manifest["theatre_id"]
-    
-    # Generate keys for all shards
-    for shard in manifest["shards"]:
-        shard_id = shard["id"]
-        key = generate_temp_key(shard_id, theatre_id)
-        print(f"Shard: {shard_id} | Theatre: {theatre_id} | Key: {key}")
-
-    # Example validation
-    sample_shard = manifest["shards"][0]["id"]
-    sample_key = KEY_STORE[sample_shard]["key"]
-    valid, msg = validate_key(sample_shard, theatre_id, sample_key)
-    print(f"Validation for {sample_shard}: {valid}, {msg}")
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    token = os.environ.get("CINEMASHIELD_KMS_TOKEN")
+    insecure = os.environ.get("CINEMASHIELD_KMS_INSECURE") == "1"
+    if not token and not insecure:
+        sys.exit("❌ Set CINEMASHIELD_KMS_TOKEN (or CINEMASHIELD_KMS_INSECURE=1 for local development)")
+    if not token:
+        print("⚠ CINEMASHIELD_KMS_INSECURE=1: serving keys without authentication")
+    kms_server = KMSServer(KMS(), auth_token=token, insecure=insecure)
+    print(f"🔑 KMS listening on http://{DEFAULT_HOST}:{port}")
+    try:
+        asyncio.run(kms_server.serve(DEFAULT_HOST, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,179 @@
+"""
+Merkle trees over encrypted shard blocks (manifest v2).
+
+Every encrypted part is cut into blocks that line up with its AEAD chunks:
+block 0 is the file header plus sealed chunk 0, and block i is sealed
+chunk i. The manifest stores each part's leaf hashes and subtree root.
+It also stores the movie root over all part roots, plus an HMAC of that
+root under a key derived from the movie key. A reader can therefore check
+the manifest once, then verify only the blocks it is about to decrypt, and
+re-check a damaged range without rehashing the whole film.
+
+Leaves and inner nodes are domain-separated (0x00 / 0x01 prefixes); an odd
+node at the end of a level is carried up unchanged.
+"""
+import hmac
+import hashlib
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from shard_crypto import CHUNK_SIZE, HEADER_SIZE, TAG_SIZE, load_key
+from shard_io import ShardIntegrityError, leaf_hash
+
+MANIFEST_VERSION = 2
+BLOCK_SIZE = CHUNK_SIZE + TAG_SIZE
+BLOCK_OFFSET = HEADER_SIZE
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def merkle_root(leaves):
+    """Root of the tree over hex ``leaves`` (the empty tree hashes b"")."""
+    if not leaves:
+        return hashlib.sha256(b"").hexdigest()
+    level = list(leaves)
+    while len(level) > 1:
+        paired = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0]
+
+
+def block_bounds(index, size, block_size=BLOCK_SIZE, offset=BLOCK_OFFSET):
+    """Byte range ``[start, end)`` of block ``index`` in a file of ``size``."""
+    start = 0 if index == 0 else offset + index * block_size
+    return start, min(offset + (index + 1) * block_size, size)
+
+
+def block_count(size, block_size=BLOCK_SIZE, offset=BLOCK_OFFSET):
+    return max(1, -(-(size - offset) // block_size))
+
+
+def block_hashes(buf, block_size=BLOCK_SIZE, offset=BLOCK_OFFSET):
+    """Leaf hashes of a whole encrypted part held in (or mapped to) ``buf``."""
+    size = len(buf)
+    return [
+        leaf_hash(buf[slice(*block_bounds(i, size, block_size, offset))])
+        for i in range(block_count(size, block_size, offset))
+    ]
+
+
+def _root_key(key):
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"cinemashield manifest v2",
+    ).derive(load_key(key))
+
+
+def manifest_key(key):
+    """The manifest-root MAC key, safe to hand out without the movie key."""
+    return _root_key(key).hex()
+
+
+def root_hmac(key, root, movie_id, root_key=None):
+    root_key = bytes.fromhex(root_key) if root_key else _root_key(key)
+    return hmac.new(root_key, f"{movie_id}:{root}".encode(), hashlib.sha256).hexdigest()
+
+
+def seal_manifest(manifest, key):
+    """Fill in part roots, the movie root and its HMAC on a v2 manifest.
+
+    Every part entry must already carry its ``chunks`` leaf hashes.
+    """
+    parts = ([manifest["init"]] if manifest.get("init") else []) + manifest["shards"]
+    for part in parts:
+        part["root"] = merkle_root(part["chunks"])
+    root = merkle_root([part["root"] for part in parts])
+    manifest["version"] = MANIFEST_VERSION
+    manifest["merkle"] = {
+        "block_size": BLOCK_SIZE,
+        "offset": BLOCK_OFFSET,
+        "root": root,
+        "hmac": root_hmac(key, root, manifest["movie_id"]),
+    }
+    return manifest
+
+
+def is_merkle(manifest):
+    return manifest.get("version", 1) >= MANIFEST_VERSION and "merkle" in manifest
+
+
+class ManifestVerifier:
+    """Checks a v2 manifest once, then verifies blocks of its parts lazily.
+
+    Needs the movie key, or only its ``root_key`` (see manifest_key) when the
+    movie key is held by the KMS.
+    """
+
+    def __init__(self, manifest, key=None, root_key=None):
+        merkle = manifest["merkle"]
+        parts = ([manifest["init"]] if manifest.get("init") else []) + manifest["shards"]
+        for part in parts:
+            if merkle_root(part["chunks"]) != part["root"]:
+                raise ShardIntegrityError(f"Manifest leaf hashes do not match root: {part['id']}")
+        root = merkle_root([part["root"] for part in parts])
+        expected = root_hmac(key, root, manifest["movie_id"], root_key)
+        if root != merkle["root"] or not hmac.compare_digest(expected, merkle["hmac"]):
+            raise ShardIntegrityError("Manifest Merkle root is not authentic")
+        self.block_size = merkle["block_size"]
+        self.offset = merkle["offset"]
+        self._parts = {part["id"]: part for part in parts}
+
+    def for_part(self, part_id, on_complete=None):
+        return BlockVerifier(self._parts[part_id], self.block_size, self.offset, on_complete)
+
+
+class BlockVerifier:
+    """Verifies blocks of one encrypted part against its leaf hashes.
+
+    Verified blocks are remembered, so overlapping reads hash them once.
+    ``on_complete`` is called once every block has been verified.
+    """
+
+    def __init__(self, part, block_size=BLOCK_SIZE, offset=BLOCK_OFFSET, on_complete=None):
+        self.part_id = part["id"]
+        self.leaves = part["chunks"]
+        self.block_size = block_size
+        self.offset = offset
+        self.on_complete = on_complete
+        self._verified = set()
+
+    @property
+    def complete(self):
+        return len(self._verified) == len(self.leaves)
+
+    def blocks_for(self, start, end):
+        """Indexes of the blocks covering bytes ``[start, end)``."""
+        first = 0 if start < self.offset + self.block_size else (start - self.offset) // self.block_size
+        last = 0 if end <= self.offset + self.block_size else (end - 1 - self.offset) // self.block_size
+        return range(first, min(last, len(self.leaves) - 1) + 1)
+
+    def verify_range(self, buf, start, end):
+        """Verify every block of ``buf`` overlapping bytes ``[start, end)``."""
+        for index in self.blocks_for(start, end):
+            if index in self._verified:
+                continue
+            if leaf_hash(buf[slice(*block_bounds(index, len(buf), self.block_size, self.offset))]) != self.leaves[index]:
+                raise ShardIntegrityError(f"Integrity check failed: {self.part_id} block {index}")
+            self._verified.add(index)
+            if self.on_complete and self.complete:
+                self.on_complete()
+
+    def damaged_blocks(self, buf):
+        """Indexes of all blocks that fail verification (full re-check)."""
+        self._verified.clear()
+        if len(self.leaves) != block_count(len(buf), self.block_size, self.offset):
+            return list(range(len(self.leaves)))
+        bad = []
+        for index, expected in enumerate(self.leaves):
+            if leaf_hash(buf[slice(*block_bounds(index, len(buf), self.block_size, self.offset))]) == expected:
+                self._verified.add(index)
+            else:
+                bad.append(index)
+        return bad
@@ -0,0 +1,190 @@
+"""
+Pipe transport for decrypted MP4 shards.
+
+Whole-file MP4 shards (the pre-HLS format) keep their ``moov`` index after
+the media data, which ffmpeg can only read from a seekable file. That is
+why they used to be decrypted to temp files first. faststart() instead
+streams a shard out of a random-access shard reader in ftyp, moov, mdat
+order. The index is read from the tail and its chunk offsets are shifted
+by the size of the moved box; the media data then follows chunk by chunk.
+Only the index is held in memory.
+
+PipeConcat runs one ffmpeg concat over such streams. The concat list and
+each shard reach ffmpeg through their own OS pipe (``pipe:N``), so no
+decrypted shard is written to disk. Needs POSIX fd passing.
+"""
+import os
+import struct
+import threading
+import subprocess
+
+# Boxes on the path from moov down to the chunk offset tables
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def _box_header(buf, pos, end):
+    size, kind = struct.unpack_from(">I4s", buf, pos)
+    header = 8
+    if size == 1:
+        size = struct.unpack_from(">Q", buf, pos + 8)[0]
+        header = 16
+    elif size == 0:
+        size = end - pos
+    if size < header or pos + size > end:
+        raise ValueError(f"Malformed MP4 box at offset {pos}")
+    return kind, header, size
+
+
+def _read(reader, start, length):
+    return b"".join(reader.read_range(start, start + length - 1))
+
+
+def top_level_boxes(reader):
+    """``(type, start, end)`` of each top-level box of a decrypted shard."""
+    total = reader.plaintext_size
+    boxes = []
+    pos = 0
+    while pos < total:
+        head = _read(reader, pos, min(16, total - pos))
+        if len(head) < 8:
+            raise ValueError(f"Malformed MP4 box at offset {pos}")
+        kind, _, size = _box_header(head.ljust(16, b"\0"), 0, total - pos)
+        boxes.append((kind, pos, pos + size))
+        pos += size
+    return boxes
+
+
+def shift_chunk_offsets(moov, delta, lo, hi):
+    """Add ``delta`` to every stco/co64 offset in ``[lo, hi)`` (in place)."""
+
+    def walk(start, end):
+        pos = start
+        while pos + 8 <= end:
+            kind, header, size = _box_header(moov, pos, end)
+            if kind in CONTAINERS:
+                walk(pos + header, pos + size)
+            elif kind in (b"stco", b"co64"):
+                fmt, width = (">I", 4) if kind == b"stco" else (">Q", 8)
+                count = struct.unpack_from(">I", moov, pos + header + 4)[0]
+                for i in range(count):
+                    at = pos + header + 8 + i * width
+                    offset = struct.unpack_from(fmt, moov, at)[0]
+                    if lo <= offset < hi:
+                        if kind == b"stco" and offset + delta > 0xFFFFFFFF:
+                            raise ValueError("Chunk offset overflows stco; shard needs co64")
+                        struct.pack_into(fmt, moov, at, offset + delta)
+            pos += size
+
+    walk(0, len(moov))
+    return moov
+
+
+def faststart(reader):
+    """Yield a decrypted MP4 shard with its moov box ahead of the media data.
+
+    ``reader`` is an open shard reader (see shard_crypto.open_shard). Shards
+    already in that order are passed through unchanged.
+    """
+    boxes = top_level_boxes(reader)
+    kinds = [kind for kind, _, _ in boxes]
+    if b"moov" not in kinds or b"mdat" not in kinds or kinds.index(b"moov") < kinds.index(b"mdat"):
+        yield from reader.iter_chunks()
+        return
+
+    _, mdat_start, _ = boxes[kinds.index(b"mdat")]
+    _, moov_start, moov_end = boxes[kinds.index(b"moov")]
+    moov = bytearray(_read(reader, moov_start, moov_end - moov_start))
+    # Everything from the first mdat up to the old moov position moves down
+    shift_chunk_offsets(moov, len(moov), mdat_start, moov_start)
+
+    if mdat_start:
+        yield from reader.read_range(0, mdat_start - 1)
+    yield bytes(moov)
+    yield from reader.read_range(mdat_start, moov_start - 1)
+    if moov_end < reader.plaintext_size:
+        yield from reader.read_range(moov_end, reader.plaintext_size - 1)
+
+
+class PipeConcat:
+    """One ffmpeg concatenating byte streams fed through pipes.
+
+    ``sources`` are zero-argument callables returning an iterable of bytes;
+    they are opened one at a time, in order, as ffmpeg reaches them.
+    ``output_args`` follow the input (e.g. ``["-c", "copy", path]``).
+    An error raised by a source is re-raised from wait().
+    """
+
+    def __init__(self, sources, output_args, stdout=None, stderr=subprocess.DEVNULL):
+        self._sources = sources
+        self._error = None
+        self._stopped = False
+        pipes = [os.pipe() for _ in sources]
+        list_read, list_write = os.pipe()
+        try:
+            # The list is tiny; it fits the pipe buffer and is written up front
+            os.write(list_write, "".join(f"file 'pipe:{r}'\n" for r, _ in pipes).encode())
+            os.close(list_write)
+            self.proc = subprocess.Popen([
+                "ffmpeg", "-y", "-v", "error",
+                "-f", "concat", "-safe", "0",
+                "-protocol_whitelist", "file,pipe",
+                "-i", f"pipe:{list_read}",
+                *output_args
+            ], stdin=subprocess.DEVNULL, stdout=stdout, stderr=stderr,
+                pass_fds=[list_read] + [r for r, _ in pipes])
+        except BaseException:
+            for fd in [w for _, w in pipes]:
+                os.close(fd)
+            raise
+        finally:
+            os.close(list_read)
+            for r, _ in pipes:
+                os.close(r)
+        self.stdout = self.proc.stdout
+        self._feeder = threading.Thread(target=self._feed, args=([w for _, w in pipes],), daemon=True)
+        self._feeder.start()
+
+    def _feed(self, fds):
+        for i, fd in enumerate(fds):
+            stream = None
+            try:
+                if self._stopped or self._error is not None:
+                    continue
+                stream = self._sources[i]()
+                for data in stream:
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(fd, view):]
+            except BrokenPipeError:
+                # ffmpeg moved past this input early, or exited
+                if self.proc.poll() is not None:
+                    self._stopped = True
+            except Exception as e:
+                self._error = e
+                self.proc.kill()
+            finally:
+                if hasattr(stream, "close"):
+                    stream.close()
+                os.close(fd)
+
+    def wait(self):
+        self._feeder.join()
+        returncode = self.proc.wait()
+        if self._error is not None:
+            raise self._error
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, "ffmpeg concat")
+
+    def kill(self):
+        self._stopped = True
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self._feeder.join()
+        self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.kill()
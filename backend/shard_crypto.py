@@ -0,0 +1,512 @@
+"""
+Chunked streaming AEAD format for encrypted shards.
+
+On-disk layout (all integers big-endian):
+
+    header   magic b"CSA1" | version u8 | alg u8 | chunk_size u32 | salt 16B
+    chunk 0  AEAD(plaintext[0:chunk_size])            + 16B tag
+    chunk 1  AEAD(plaintext[chunk_size:2*chunk_size]) + 16B tag
+    ...
+    chunk N  AEAD(remaining bytes, possibly empty)    + 16B tag
+
+Each file gets its own key, HKDF(master key, salt). Chunk nonces are the
+chunk index plus a "last chunk" flag, and every chunk authenticates the
+header and the shard id, so chunks cannot be reordered, truncated, or
+swapped between shards without the tag check failing. Any chunk can be
+located and decrypted on its own, which gives random access.
+
+Keys keep the Fernet format (url-safe base64 of 32 bytes), so the same key
+still opens legacy whole-shard Fernet tokens through the compat reader.
+"""
+import io
+import os
+import sys
+import json
+import base64
+import hashlib
+import hmac
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from shard_io import BlockHasher, MappedShard
+
+MAGIC = b"CSA1"
+VERSION = 1
+ALG_AES_GCM = 1
+ALG_CHACHA20_POLY1305 = 2
+CHUNK_SIZE = 1024 * 1024
+TAG_SIZE = 16
+SALT_SIZE = 16
+HEADER = struct.Struct(">4sBBI16s")
+HEADER_SIZE = HEADER.size
+
+_CIPHERS = {
+    ALG_AES_GCM: AESGCM,
+    ALG_CHACHA20_POLY1305: ChaCha20Poly1305,
+}
+
+
+class InvalidShardKey(ValueError):
+    """The key is malformed, wrong for this shard, or the shard was altered."""
+
+
+def generate_key():
+    """Return a new master key in Fernet's url-safe base64 format."""
+    return base64.urlsafe_b64encode(os.urandom(32))
+
+
+def load_key(key):
+    """Decode a url-safe base64 master key to its 32 raw bytes."""
+    if isinstance(key, str):
+        key = key.encode()
+    try:
+        raw = base64.urlsafe_b64decode(key)
+    except (ValueError, TypeError):
+        raw = b""
+    if len(raw) != 32:
+        raise InvalidShardKey("Fernet key must be 32 url-safe base64-encoded bytes.")
+    return raw
+
+
+class ShardKey:
+    """A single shard's file key, as issued by the KMS.
+
+    Accepted wherever a master key is, but opens only the one chunked
+    shard it was derived for (the master key never leaves the KMS).
+    """
+
+    def __init__(self, raw):
+        if isinstance(raw, str):
+            raw = base64.urlsafe_b64decode(raw)
+        if len(raw) != 32:
+            raise InvalidShardKey("Shard key must be 32 bytes.")
+        self.raw = raw
+
+    def encode(self):
+        return base64.urlsafe_b64encode(self.raw).decode()
+
+
+def _derive_file_key(key, salt):
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        info=b"cinemashield shard v1",
+    ).derive(load_key(key))
+
+
+def _file_cipher(key, alg, salt):
+    if isinstance(key, ShardKey):
+        return _CIPHERS[alg](key.raw)
+    return _CIPHERS[alg](_derive_file_key(key, salt))
+
+
+def derive_shard_key(key, path):
+    """Derive the ShardKey of the chunked shard at ``path`` from the master key."""
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE:
+        raise ValueError(f"Truncated shard header: {path}")
+    magic, version, alg, chunk_size, salt = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a chunked shard: {path}")
+    return ShardKey(_derive_file_key(key, salt))
+
+
+def _nonce(index, last):
+    return index.to_bytes(11, "big") + (b"\x01" if last else b"\x00")
+
+
+def _aad(header, context):
+    if isinstance(context, str):
+        context = context.encode()
+    return header + (context or b"")
+
+
+def key_check(key, context):
+    """Return the hex key-check value of ``key`` for ``context`` (a movie id).
+
+    An HMAC under a key derived separately from the shard keys, so storing
+    it in the manifest reveals nothing about the data keys, yet a candidate
+    key can be validated without touching shard data.
+    """
+    check_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"cinemashield key check v1",
+    ).derive(load_key(key))
+    if isinstance(context, str):
+        context = context.encode()
+    return hmac.new(check_key, context, hashlib.sha256).hexdigest()
+
+
+def verify_key_check(key, context, expected):
+    """True if ``key`` produces the key-check value ``expected``."""
+    return hmac.compare_digest(key_check(key, context), expected)
+
+
+def wrap_key(key, data_key):
+    """Encrypt a data key under ``key`` (both in master-key format)."""
+    return Fernet(key).encrypt(data_key).decode()
+
+
+def unwrap_key(key, wrapped):
+    try:
+        return Fernet(key).decrypt(wrapped.encode() if isinstance(wrapped, str) else wrapped)
+    except (InvalidToken, ValueError):
+        raise InvalidShardKey("Invalid key for this wrapped shard key.")
+
+
+def part_key(key, part):
+    """The key that opens a manifest part: its own data key when the part
+    lives in the shard store (wrapped under the movie ``key``), else ``key``."""
+    if part.get("wrapped_key"):
+        return unwrap_key(key, part["wrapped_key"])
+    return key
+
+
+def is_chunked(path):
+    """True if the file starts with the chunked AEAD header."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def chunked_plaintext_size(path):
+    """Plaintext size of a chunked shard, from its header and length alone."""
+    with open(path, "rb") as f:
+        magic, _, _, chunk_size, _ = HEADER.unpack(f.read(HEADER_SIZE))
+        body = os.fstat(f.fileno()).st_size - HEADER_SIZE
+    if magic != MAGIC:
+        raise ValueError(f"Not a chunked shard: {path}")
+    chunk_count = -(-body // (chunk_size + TAG_SIZE))
+    return body - chunk_count * TAG_SIZE
+
+
+# -----------------------------
+# ENCRYPT
+# -----------------------------
+
+def encrypt_stream(src, dst, key, context=None, chunk_size=CHUNK_SIZE, alg=ALG_AES_GCM):
+    """Encrypt file object ``src`` into file object ``dst``, chunk by chunk.
+
+    ``context`` (normally the encrypted shard id) is authenticated with
+    every chunk and must be passed again to decrypt. Memory use is bounded
+    by ``chunk_size``. Returns the plaintext size.
+    """
+    salt = os.urandom(SALT_SIZE)
+    header = HEADER.pack(MAGIC, VERSION, alg, chunk_size, salt)
+    cipher = _file_cipher(key, alg, salt)
+    aad = _aad(header, context)
+
+    dst.write(header)
+    size = 0
+    index = 0
+    chunk = src.read(chunk_size)
+    while True:
+        following = src.read(chunk_size) if len(chunk) == chunk_size else b""
+        last = not following
+        dst.write(cipher.encrypt(_nonce(index, last), chunk, aad))
+        size += len(chunk)
+        if last:
+            return size
+        chunk = following
+        index += 1
+
+
+def encrypt_file(src_path, dst_path, key, context=None, chunk_size=CHUNK_SIZE):
+    """Encrypt ``src_path`` to ``dst_path``. Returns the plaintext size."""
+    if context is None:
+        context = os.path.basename(dst_path)
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        return encrypt_stream(src, dst, key, context=context, chunk_size=chunk_size)
+
+
+class _HashingWriter:
+    """File wrapper that SHA-256s everything written through it, whole
+    and per Merkle block."""
+
+    def __init__(self, f, block_size):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+        self.blocks = BlockHasher(block_size, HEADER_SIZE)
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.blocks.update(data)
+        return self._f.write(data)
+
+
+def encrypt_shard(src_path, dst_path, key, chunk_size=CHUNK_SIZE, shard_id=None):
+    """Encrypt one shard and hash its ciphertext in the same pass.
+
+    Module-level so it can run in a process pool. ``shard_id`` defaults to
+    the file name of ``dst_path``. Returns the manifest entry fields:
+    ``{"id", "size", "sha256", "chunks"}``, where ``chunks`` are the Merkle
+    leaf hashes of the ciphertext blocks.
+    """
+    shard_id = shard_id or os.path.basename(dst_path)
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        writer = _HashingWriter(dst, chunk_size + TAG_SIZE)
+        size = encrypt_stream(src, writer, key, context=shard_id, chunk_size=chunk_size)
+    return {
+        "id": shard_id,
+        "size": size,
+        "sha256": writer.sha256.hexdigest(),
+        "chunks": writer.blocks.finish(),
+    }
+
+
+# -----------------------------
+# DECRYPT
+# -----------------------------
+
+class ChunkedReader:
+    """Random-access reader over a chunked AEAD shard.
+
+    ``source`` is a file path (memory-mapped), a MappedShard, or an
+    in-memory bytes-like object; for the latter, ``context`` (the shard id)
+    must be given explicitly. Chunks are decrypted straight from memoryview
+    slices of the source, without intermediate copies. An optional
+    ``verifier`` (merkle.BlockVerifier) checks each chunk's ciphertext
+    against the manifest before it is decrypted.
+    """
+
+    def __init__(self, source, key, context=None, verifier=None):
+        self._owned = None
+        self._verifier = verifier
+        if isinstance(source, (str, os.PathLike)):
+            source = self._owned = MappedShard(source)
+        if isinstance(source, MappedShard):
+            self.path = source.path
+            self._buf = source.view
+            if context is None:
+                context = os.path.basename(self.path)
+        else:
+            self.path = context
+            self._buf = memoryview(source)
+        total = len(self._buf)
+        try:
+            header = bytes(self._buf[:HEADER_SIZE])
+            if len(header) != HEADER_SIZE:
+                raise ValueError(f"Truncated shard header: {self.path}")
+            magic, version, alg, chunk_size, salt = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or alg not in _CIPHERS:
+                raise ValueError(f"Unsupported shard format: {self.path}")
+
+            self.chunk_size = chunk_size
+            self._cipher = _file_cipher(key, alg, salt)
+            self._aad = _aad(header, context)
+
+            body = total - HEADER_SIZE
+            stride = chunk_size + TAG_SIZE
+            if body < TAG_SIZE:
+                raise ValueError(f"Truncated shard: {self.path}")
+            self.chunk_count = -(-body // stride)
+            last_len = body - (self.chunk_count - 1) * stride
+            if last_len < TAG_SIZE:
+                raise ValueError(f"Truncated shard: {self.path}")
+            self.plaintext_size = (self.chunk_count - 1) * chunk_size + last_len - TAG_SIZE
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._buf = memoryview(b"")
+        if self._owned is not None:
+            self._owned.close()
+            self._owned = None
+
+    def read_chunk(self, index):
+        """Decrypt and return chunk ``index``."""
+        if not 0 <= index < self.chunk_count:
+            raise IndexError(f"Chunk {index} out of range")
+        stride = self.chunk_size + TAG_SIZE
+        offset = HEADER_SIZE + index * stride
+        sealed = self._buf[offset:offset + stride]
+        if self._verifier is not None:
+            self._verifier.verify_range(self._buf, offset, offset + len(sealed))
+        last = index == self.chunk_count - 1
+        try:
+            return self._cipher.decrypt(_nonce(index, last), sealed, self._aad)
+        except InvalidTag:
+            raise InvalidShardKey(f"Invalid decryption key or corrupted shard: {self.path}")
+
+    def iter_chunks(self, start=0):
+        for index in range(start, self.chunk_count):
+            yield self.read_chunk(index)
+
+    def read_range(self, start, end):
+        """Yield plaintext bytes ``[start, end]`` (inclusive), chunk by chunk."""
+        end = min(end, self.plaintext_size - 1)
+        if start > end:
+            return
+        for index in range(start // self.chunk_size, end // self.chunk_size + 1):
+            chunk = self.read_chunk(index)
+            base = index * self.chunk_size
+            yield chunk[max(start - base, 0):end - base + 1]
+
+    def read_all(self):
+        return b"".join(self.iter_chunks())
+
+
+class FernetReader:
+    """Compat reader exposing legacy whole-shard Fernet tokens as one chunk."""
+
+    def __init__(self, source, key, context=None, verifier=None):
+        if isinstance(source, (str, os.PathLike)):
+            self.path = os.fspath(source)
+            with open(source, "rb") as f:
+                token = f.read()
+        elif isinstance(source, MappedShard):
+            self.path = source.path
+            token = bytes(source.view)
+        else:
+            self.path = context
+            token = bytes(source)
+        if verifier is not None:
+            verifier.verify_range(token, 0, len(token))
+        try:
+            self._plaintext = Fernet(key).decrypt(token)
+        except InvalidToken:
+            raise InvalidShardKey(f"Invalid decryption key or corrupted shard: {self.path}")
+        except ValueError as e:
+            raise InvalidShardKey(str(e))
+        self.chunk_size = max(len(self._plaintext), 1)
+        self.chunk_count = 1
+        self.plaintext_size = len(self._plaintext)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._plaintext = b""
+
+    def read_chunk(self, index):
+        if index != 0:
+            raise IndexError(f"Chunk {index} out of range")
+        return self._plaintext
+
+    def iter_chunks(self, start=0):
+        if start == 0:
+            yield self._plaintext
+
+    def read_range(self, start, end):
+        if start <= end:
+            yield self._plaintext[start:end + 1]
+
+    def read_all(self):
+        return self._plaintext
+
+
+def open_shard(path, key, context=None, expected_sha256=None, verifier=None):
+    """Open an encrypted shard in either format for (random-access) reading.
+
+    The shard is memory-mapped once; with ``expected_sha256`` the mapping is
+    hashed first (raising ShardIntegrityError on mismatch), and decryption
+    then reads from the same pages instead of the file a second time. With
+    a block ``verifier`` only the chunks actually read are checked.
+    """
+    shard = MappedShard(path)
+    try:
+        if expected_sha256 is not None:
+            shard.verify(expected_sha256)
+        chunked = bytes(shard.view[:len(MAGIC)]) == MAGIC
+        reader = (ChunkedReader if chunked else FernetReader)(
+            shard, key, context=context, verifier=verifier
+        )
+    except Exception:
+        shard.close()
+        raise
+    if chunked:
+        reader._owned = shard
+    else:
+        shard.close()
+    return reader
+
+
+def decrypt_file(path, key, context=None):
+    """Decrypt a whole shard (chunked or legacy Fernet) into bytes."""
+    with open_shard(path, key, context=context) as reader:
+        return reader.read_all()
+
+
+def open_buffer(data, key, context, verifier=None):
+    """Reader over a shard held in memory or mapped (MappedShard), either format."""
+    head = data.view[:len(MAGIC)] if isinstance(data, MappedShard) else data[:len(MAGIC)]
+    reader_cls = ChunkedReader if bytes(head) == MAGIC else FernetReader
+    return reader_cls(data, key, context=context, verifier=verifier)
+
+
+def decrypt_bytes(data, key, context):
+    """Decrypt an encrypted shard already held in memory (either format)."""
+    with open_buffer(data, key, context) as reader:
+        return reader.read_all()
+
+
+# -----------------------------
+# MIGRATION
+# -----------------------------
+
+def migrate_shard(path, key):
+    """Rewrite a legacy Fernet shard in the chunked format, in place.
+
+    Returns the new ``(sha256, plaintext_size)``; the shard id (file name)
+    is unchanged.
+    """
+    plaintext = FernetReader(path, key).read_all()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as dst:
+        size = encrypt_stream(io.BytesIO(plaintext), dst, key, context=os.path.basename(path))
+    os.replace(tmp_path, path)
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest(), size
+
+
+def migrate_manifest(manifest_path, shard_dir, key):
+    """Migrate every legacy shard listed in a manifest and update its hashes."""
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    parts = ([manifest["init"]] if manifest.get("init") else []) + manifest["shards"]
+    migrated = 0
+    for part in parts:
+        path = os.path.join(shard_dir, part["id"])
+        if is_chunked(path):
+            continue
+        part["sha256"], part["size"] = migrate_shard(path, key)
+        migrated += 1
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    return migrated
+
+
+if __name__ == "__main__":
+    # Usage: python shard_crypto.py <manifest.json> <encrypted_shards dir> <key file>
+    if len(sys.argv) != 4:
+        print("Usage: python shard_crypto.py <manifest.json> <encrypted_shards dir> <key file>")
+        sys.exit(1)
+
+    with open(sys.argv[3], "rb") as f:
+        master_key = f.read().strip()
+    count = migrate_manifest(sys.argv[1], sys.argv[2], master_key)
+    print(f"✅ Migrated {count} shard(s) to the chunked AEAD format")
@@ -0,0 +1,105 @@
+"""
+Memory-mapped access to shard files.
+
+A MappedShard maps the file read-only and hands out memoryview slices, so
+hashing, integrity checks and chunk decryption all read straight from the
+page cache: no whole-file ``f.read()`` copies, and a shard that is checked
+and then decrypted is only read from disk once. Resident memory stays
+bounded by the pages actually touched, not by the shard size. The Merkle
+leaf hashing used by manifest v2 lives here too, so encryption can hash
+blocks as it writes them.
+"""
+import os
+import mmap
+import hashlib
+
+HASH_BLOCK = 1024 * 1024
+
+
+class ShardIntegrityError(ValueError):
+    """A shard's SHA-256 does not match the manifest."""
+
+
+class MappedShard:
+    """Read-only mapping of one shard file with byte-range access."""
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # mmap cannot map empty files
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def range(self, start, end):
+        """Zero-copy view of bytes ``[start, end)``."""
+        return self.view[start:end]
+
+    def sha256(self):
+        h = hashlib.sha256()
+        for offset in range(0, self.size, HASH_BLOCK):
+            h.update(self.view[offset:offset + HASH_BLOCK])
+        return h.hexdigest()
+
+    def verify(self, expected_sha256):
+        """Raise ShardIntegrityError unless the shard hashes to ``expected_sha256``."""
+        if self.sha256() != expected_sha256:
+            raise ShardIntegrityError(f"Integrity check failed: {os.path.basename(self.path)}")
+
+    def close(self):
+        self.view.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A caller still holds a slice; the mapping closes with it
+                pass
+            self._map = None
+
+
+def leaf_hash(block):
+    """Merkle leaf hash of one block (0x00 domain prefix)."""
+    h = hashlib.sha256(b"\x00")
+    h.update(block)
+    return h.hexdigest()
+
+
+class BlockHasher:
+    """Incremental Merkle leaf hashing of sequentially written data.
+
+    Block 0 spans ``offset + block_size`` bytes (the header plus the first
+    block), every later block ``block_size`` bytes.
+    """
+
+    def __init__(self, block_size, offset):
+        self.block_size = block_size
+        self.leaves = []
+        self._limit = offset + block_size
+        self._pos = 0
+        self._h = hashlib.sha256(b"\x00")
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self._limit - self._pos)
+            self._h.update(view[:take])
+            self._pos += take
+            view = view[take:]
+            if self._pos == self._limit:
+                self.leaves.append(self._h.hexdigest())
+                self._h = hashlib.sha256(b"\x00")
+                self._limit += self.block_size
+
+    def finish(self):
+        if self._pos != self._limit - self.block_size or not self.leaves:
+            self.leaves.append(self._h.hexdigest())
+        return self.leaves
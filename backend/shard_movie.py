@@ -24,7 +24,8 @@ def get_video_duration(file_path):
 
 def shard_video(file_path):
     base_name = os.path.splitext(os.path.basename(file_path))[0]
-    output_pattern = os.path.join(SHARD_FOLDER, f"{base_name}_part%03d.mp4")
+    segment_pattern = os.path.join(SHARD_FOLDER, f"{base_name}_part%03d.m4s")
+    playlist_path = os.path.join(SHARD_FOLDER, f"{base_name}.m3u8")
 
     total_duration = get_video_duration(file_path)
     shard_duration = math.ceil(total_duration / TOTAL_SHARDS)
@@ -45,14 +46,24 @@ def shard_video(file_path):
         # Audio (if present)
         "-c:a", "copy",
 
-        "-f", "segment",
-        "-segment_time", str(shard_duration),
-        "-reset_timestamps", "1",
-        output_pattern
+        # HLS playlist + fragmented-MP4 segments (one shared init segment)
+        "-f", "hls",
+        "-hls_time", str(shard_duration),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", f"{base_name}_init.mp4",
+        "-hls_segment_filename", segment_pattern,
+        "-start_number", "0",
+        playlist_path
     ]
 
     subprocess.run(cmd, check=True)
-    print(f"✔ Created exactly {TOTAL_SHARDS} shards")
+    segments = [
+        f for f in os.listdir(SHARD_FOLDER)
+        if f.startswith(f"{base_name}_part") and f.endswith(".m4s")
+    ]
+    print(f"✔ Created {len(segments)} segments + init segment {base_name}_init.mp4")
+    print(f"✔ HLS playlist: {playlist_path}")
 
 def process_uploads():
     if not os.path.exists(UPLOAD_FOLDER):
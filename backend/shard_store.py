@@ -0,0 +1,196 @@
+"""
+Content-addressed store of encrypted shards, shared by all movies.
+
+A shard is stored once per distinct plaintext segment. Its object id is an
+HMAC (under the store key) of the segment's SHA-256, so identical segments
+map to the same object without the ids revealing the content hash to
+anyone without the store key. Each object is encrypted under its own
+random data key, which the index keeps wrapped with the store key. A movie
+that uses an object gets that data key wrapped with the movie key in its
+manifest, so one movie key still opens exactly that movie's shards.
+
+    catalog/store/
+        store.key                   wraps object data keys
+        index.json                  objects + source recipes
+        objects/<id[:2]>/<id>.enc   encrypted shards
+
+Besides objects, the index remembers each ingested source file (by its
+digest) as a recipe: its segment names, object ids and durations. A
+re-delivery of the same source is then assembled from the store without
+transcoding or encrypting anything.
+"""
+import os
+import json
+import hmac
+import uuid
+import hashlib
+import threading
+
+from shard_crypto import generate_key, unwrap_key, wrap_key
+
+HASH_BLOCK = 1024 * 1024
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ShardStore:
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.RLock()
+        self._dirty = False
+        os.makedirs(os.path.join(self.objects_dir, "tmp"), exist_ok=True)
+
+        key_path = os.path.join(root, "store.key")
+        if not os.path.exists(key_path):
+            with open(key_path, "wb") as f:
+                f.write(generate_key())
+        with open(key_path, "rb") as f:
+            self._key = f.read().strip()
+
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+        self._objects = index.get("objects", {})
+        self._sources = index.get("sources", {})
+
+    def _save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"objects": self._objects, "sources": self._sources}, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+    def flush(self):
+        """Write the index if add() or use() changed it since the last save.
+
+        Those run once per segment and leave saving to the ingest that calls
+        them, which flushes once per movie: rewriting the whole index per
+        segment would make ingest quadratic in the number of segments.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    # -----------------------------
+    # OBJECTS
+    # -----------------------------
+    def object_id(self, plaintext_sha256):
+        return hmac.new(self._key, bytes.fromhex(plaintext_sha256), hashlib.sha256).hexdigest()
+
+    def object_path(self, object_id):
+        return os.path.join(self.objects_dir, object_id[:2], f"{object_id}.enc")
+
+    def temp_path(self):
+        """Scratch path on the store's filesystem for an object being written."""
+        return os.path.join(self.objects_dir, "tmp", uuid.uuid4().hex)
+
+    def get(self, object_id):
+        """Stored entry (id, size, sha256, chunks) of an object, or None."""
+        with self._lock:
+            record = self._objects.get(object_id)
+        if record is None or not os.path.exists(self.object_path(object_id)):
+            return None
+        return {k: record[k] for k in ("id", "size", "sha256", "chunks")}
+
+    def data_key(self, object_id):
+        with self._lock:
+            return unwrap_key(self._key, self._objects[object_id]["key"])
+
+    def add(self, object_id, tmp_path, entry, data_key):
+        """Move a freshly encrypted object into place and index it.
+
+        If another ingest stored the same object meanwhile, its copy wins
+        and ``tmp_path`` is discarded. Returns the stored entry. The index
+        is written by the next flush().
+        """
+        with self._lock:
+            existing = self.get(object_id)
+            if existing is not None:
+                os.remove(tmp_path)
+                return existing
+            path = self.object_path(object_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            self._objects[object_id] = {
+                "id": entry["id"],
+                "size": entry["size"],
+                "sha256": entry["sha256"],
+                "chunks": entry["chunks"],
+                "key": wrap_key(self._key, data_key),
+                "movies": [],
+            }
+            self._dirty = True
+            return self.get(object_id)
+
+    # -----------------------------
+    # REFERENCES
+    # -----------------------------
+    def use(self, movie_id, object_id, movie_key):
+        """Reference an object from ``movie_id``; returns its manifest entry,
+        with the data key wrapped for that movie. None if it is not stored.
+        The index is written by the next flush()."""
+        with self._lock:
+            entry = self.get(object_id)
+            if entry is None:
+                return None
+            movies = self._objects[object_id]["movies"]
+            if movie_id not in movies:
+                movies.append(movie_id)
+                self._dirty = True
+            entry["object"] = object_id
+            entry["wrapped_key"] = wrap_key(movie_key, self.data_key(object_id))
+            return entry
+
+    def release(self, movie_id):
+        """Drop a movie's references; delete objects no movie uses any more."""
+        with self._lock:
+            for object_id, record in list(self._objects.items()):
+                if movie_id in record["movies"]:
+                    record["movies"].remove(movie_id)
+                    if not record["movies"]:
+                        del self._objects[object_id]
+                        try:
+                            os.remove(self.object_path(object_id))
+                        except FileNotFoundError:
+                            pass
+            self._sources = {
+                digest: recipe for digest, recipe in self._sources.items()
+                if all(segment["object"] in self._objects for segment in recipe["segments"])
+            }
+            self._save()
+
+    # -----------------------------
+    # SOURCE RECIPES
+    # -----------------------------
+    def remember_source(self, source_sha256, recipe):
+        """Store how a source was cut: ``{"segments": [{"name", "object",
+        "duration"}, ...]}``, one entry per segment including the init."""
+        with self._lock:
+            self._sources[source_sha256] = recipe
+            self._save()
+
+    def recipe(self, source_sha256):
+        """The recipe of an earlier ingest of this source, if all its objects remain."""
+        with self._lock:
+            recipe = self._sources.get(source_sha256)
+        if recipe and all(self.get(segment["object"]) for segment in recipe["segments"]):
+            return recipe
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "objects": len(self._objects),
+                "bytes": sum(record["size"] for record in self._objects.values()),
+                "sources": len(self._sources),
+            }
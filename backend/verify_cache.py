@@ -0,0 +1,106 @@
+"""
+Persistent cache of successful shard verifications.
+
+Each record is keyed by the shard path and holds the file identity at
+verification time (device, inode, size, mtime) plus the manifest digest it
+was checked against. While all of those still match, the shard is known
+good and hashing it again can be skipped; any rewrite, replacement or
+manifest change invalidates it. Audits can bypass the cache with
+``force=True`` (or the player's ``--full-verify``).
+
+The file is a log of JSON lines, each mapping shard paths to their new
+record (or null once invalidated), applied in order on load. A
+verification appends one line instead of rewriting the file; the log is
+compacted into a single snapshot line (dropping shards that no longer
+exist) once it holds twice as many updates as live records. A cache written as
+one JSON object by older versions loads as a snapshot.
+
+Matching file identity is not proof against someone who rewrites a shard
+and restores its mtime on purpose; that is what forced verification is for.
+"""
+import os
+import json
+import threading
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "verify_cache.json")
+# Updates appended before the log may be compacted, whatever its size
+COMPACT_MIN_UPDATES = 1024
+
+
+def _identity(path):
+    st = os.stat(path)
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+class VerificationCache:
+    def __init__(self, path=CACHE_PATH, force=False):
+        self.path = path
+        self.force = force
+        self._lock = threading.Lock()
+        self._records = {}
+        self._updates = 0
+        self._torn = False
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        changes = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last line of a process that died mid-write;
+                        # the next write compacts it away
+                        self._torn = True
+                        continue
+                    for key, record in changes.items():
+                        if record is None:
+                            self._records.pop(key, None)
+                        else:
+                            self._records[key] = record
+                    self._updates += 1
+        except FileNotFoundError:
+            pass
+
+    def is_verified(self, shard_path, expected):
+        """True if ``shard_path`` was verified against ``expected`` and is unchanged."""
+        if self.force:
+            return False
+        key = os.path.abspath(shard_path)
+        with self._lock:
+            record = self._records.get(key)
+        if not record or record["expected"] != expected:
+            return False
+        try:
+            return record["identity"] == _identity(shard_path)
+        except FileNotFoundError:
+            return False
+
+    def mark_verified(self, shard_path, expected):
+        """Record that ``shard_path`` currently matches ``expected``."""
+        key = os.path.abspath(shard_path)
+        record = {"expected": expected, "identity": _identity(shard_path)}
+        with self._lock:
+            self._records[key] = record
+            self._append({key: record})
+
+    def invalidate(self, shard_path):
+        key = os.path.abspath(shard_path)
+        with self._lock:
+            if self._records.pop(key, None):
+                self._append({key: None})
+
+    def _append(self, changes):
+        if self._torn or self._updates >= max(COMPACT_MIN_UPDATES, 2 * len(self._records)):
+            self._compact()
+            return
+        with open(self.path, "a") as f:
+            f.write(json.dumps(changes) + "\n")
+        self._updates += 1
+
+    def _compact(self):
+        # Drop records of shards that no longer exist
+        self._records = {k: v for k, v in self._records.items() if os.path.exists(k)}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps(self._records) + "\n")
+        os.replace(tmp_path, self.path)
+        self._updates = 1
+        self._torn = False
@@ -0,0 +1,396 @@
+"""
+Benchmarks for the ingest and playback pipelines.
+
+Synthesises a test movie with ffmpeg's lavfi sources, then times each stage
+on it in a scratch workspace with its own catalog, shard store, caches and
+audit log, so the real catalog is untouched. Importing app only opens its
+stores; app.startup(), which recovers jobs, restores sessions and sweeps
+temp files, is left to the server and never called here:
+
+    shard_video         segmenting / transcoding only
+    encrypt             encrypt_shard over those segments (process pool)
+    shard_and_encrypt   the pipelined ingest used by the app
+    generate_manifest   manifest + Merkle sealing
+    prepare_video       full decrypt + concat ('prepare' playback)
+    stream              authenticate -> first byte, full /api/stream read,
+                        random 1 MiB range reads, cold 'prepare' session
+
+Each stage runs in its own process, so the peak RSS reported for it is its
+own; ffmpeg and pool workers are reported separately as children. Results
+are printed as JSON. With --baseline (an earlier run's JSON), stages whose
+time or latency grew by more than --tolerance are listed under
+"regressions" and the exit status is 1.
+
+Usage: python benchmarks/pipeline_bench.py [--duration 60] [--bitrate 4M]
+           [--resolution 1280x720] [--gop 1] [--runs 20]
+           [--output result.json] [--baseline previous.json] [--tolerance 0.15]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import traceback
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "frontend"))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+import app  # noqa: E402
+from audit import AuditLog  # noqa: E402
+from catalog import Catalog  # noqa: E402
+from prepared_cache import PreparedCache  # noqa: E402
+from sessions import SessionStore  # noqa: E402
+from shard_crypto import encrypt_shard, generate_key  # noqa: E402
+from verify_cache import VerificationCache  # noqa: E402
+
+MB = 1024 * 1024
+SEGMENT_MOVIE = "bench_segments"
+MOVIE = "bench_movie"
+THEATRE = "THEATRE_BENCH"
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+
+def synthesize(path, duration, bitrate, resolution, gop, fps=25):
+    """Render a test movie (testsrc2 video + sine audio) with ffmpeg."""
+    frames = max(1, int(gop * fps))
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={resolution}:rate={fps}",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", str(duration),
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+        "-b:v", bitrate, "-maxrate", bitrate, "-bufsize", bitrate,
+        "-g", str(frames), "-keyint_min", str(frames), "-sc_threshold", "0",
+        "-c:a", "aac", "-b:a", "128k",
+        path
+    ], check=True)
+
+
+def summarize(samples):
+    """Latency percentiles of ``samples`` (seconds), in milliseconds."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(1000 * ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(1000 * sum(ordered) / len(ordered), 3),
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "max_ms": round(1000 * ordered[-1], 3),
+    }
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    rss = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (MB if sys.platform == "darwin" else 1024), 1)
+
+
+def isolate(workdir):
+    """Point the app's module-level state at the scratch workspace."""
+    app.catalog = Catalog(os.path.join(workdir, "catalog"))
+    app.verify_cache = VerificationCache(os.path.join(workdir, "verify_cache.json"))
+    app.prepared_cache = PreparedCache(os.path.join(workdir, "prepared"), app.PREPARED_CACHE_BYTES)
+    app.audit = AuditLog(os.path.join(workdir, "audit"))
+    app.sessions = SessionStore()
+    app.validated_keys.clear()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -----------------------------
+# STAGES
+# -----------------------------
+# Each takes the shared context and returns its metrics; "bytes" is turned
+# into MB/s. Anything under "context" is passed on to later stages.
+
+def stage_shard_video(ctx):
+    app.catalog.create(SEGMENT_MOVIE, "bench.mp4", THEATRE)
+    segments = app.shard_video(SEGMENT_MOVIE, ctx["source"])
+    return {"bytes": ctx["source_bytes"], "segments": segments}
+
+
+def stage_encrypt(ctx):
+    shard_dir = app.catalog.shard_dir(SEGMENT_MOVIE)
+    sources = sorted(
+        os.path.join(shard_dir, name) for name in os.listdir(shard_dir)
+        if name.endswith((".m4s", ".mp4"))
+    )
+    out_dir = os.path.join(ctx["workdir"], "encrypt_out")
+    os.makedirs(out_dir, exist_ok=True)
+    key = generate_key()
+    with ProcessPoolExecutor(max_workers=app.ENCRYPT_WORKERS) as pool:
+        list(pool.map(
+            encrypt_shard, sources,
+            [os.path.join(out_dir, os.path.basename(src) + ".enc") for src in sources],
+            [key] * len(sources)
+        ))
+    return {"bytes": sum(os.path.getsize(src) for src in sources), "segments": len(sources)}
+
+
+def stage_shard_and_encrypt(ctx):
+    app.catalog.create(MOVIE, "bench.mp4", THEATRE)
+    num_shards, key, shard_info, _ = app.shard_and_encrypt(MOVIE, ctx["source"])
+    return {
+        "bytes": ctx["source_bytes"],
+        "shards": num_shards,
+        "context": {
+            "key": key.decode(),
+            "shard_info": shard_info,
+            "durations": app.segment_durations(MOVIE),
+        },
+    }
+
+
+def stage_generate_manifest(ctx):
+    manifest = app.generate_manifest(
+        MOVIE, theatre_id=THEATRE, shard_info=ctx["shard_info"],
+        durations=ctx["durations"], key=ctx["key"]
+    )
+    app.catalog.update(MOVIE, status="ready", shards=len(manifest["shards"]))
+    return {"parts": len(manifest["shards"]) + 1}
+
+
+def stage_prepare_video(ctx):
+    output_path = os.path.join(ctx["workdir"], "prepared.mp4")
+    app.prepare_video(MOVIE, ctx["key"], output_path)
+    size = os.path.getsize(output_path)
+    os.remove(output_path)
+    return {"bytes": size}
+
+
+def stage_stream(ctx):
+    client = app.app.test_client()
+
+    def authenticate():
+        response = client.post("/api/authenticate", json={"key": ctx["key"], "movie_id": MOVIE})
+        if response.status_code != 200:
+            raise RuntimeError(f"authenticate failed: {response.status_code} {response.get_data(as_text=True)}")
+        return response.get_json()["token"]
+
+    def first_byte(token, headers=None):
+        response = client.get(f"/api/stream/{token}", headers=headers, buffered=False)
+        next(response.iter_encoded())
+        response.close()
+
+    first_byte_samples = []
+    for _ in range(ctx["runs"]):
+        started = time.perf_counter()
+        first_byte(authenticate())
+        first_byte_samples.append(time.perf_counter() - started)
+
+    token = authenticate()
+    started = time.perf_counter()
+    size = len(client.get(f"/api/stream/{token}").data)
+    full_read = time.perf_counter() - started
+
+    rng = random.Random(0)
+    range_samples = []
+    for _ in range(ctx["runs"]):
+        start = rng.randrange(max(1, size - MB))
+        started = time.perf_counter()
+        data = client.get(f"/api/stream/{token}", headers={"Range": f"bytes={start}-{start + MB - 1}"}).data
+        range_samples.append(time.perf_counter() - started)
+        assert len(data) == min(MB, size - start)
+
+    # Cold 'prepare' session: authentication decrypts the whole movie
+    app.PLAYBACK_MODE = "prepare"
+    started = time.perf_counter()
+    first_byte(authenticate())
+    prepare_first_byte = time.perf_counter() - started
+
+    return {
+        "bytes": size,
+        "seconds_full_read": round(full_read, 4),
+        "auth_to_first_byte": summarize(first_byte_samples),
+        "range_1mib": summarize(range_samples),
+        "prepare_auth_to_first_byte_ms": round(1000 * prepare_first_byte, 3),
+    }
+
+
+STAGES = {
+    "shard_video": stage_shard_video,
+    "encrypt": stage_encrypt,
+    "shard_and_encrypt": stage_shard_and_encrypt,
+    "generate_manifest": stage_generate_manifest,
+    "prepare_video": stage_prepare_video,
+    "stream": stage_stream,
+}
+
+
+def _run_child(conn, name, ctx):
+    try:
+        isolate(ctx["workdir"])
+        started = time.perf_counter()
+        result = STAGES[name](ctx)
+        result["seconds"] = round(time.perf_counter() - started, 4)
+        result["peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+        result["peak_rss_children_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+        app.audit.close()
+        conn.send(result)
+    except Exception:
+        conn.send({"error": traceback.format_exc()})
+    finally:
+        conn.close()
+
+
+def run_stage(name, ctx):
+    """Run one stage in a fresh process and collect its metrics."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_run_child, args=(sender, name, ctx))
+    process.start()
+    sender.close()
+    result = receiver.recv()
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"Stage {name} failed:\n{result['error']}")
+    if result.get("bytes") and result["seconds"] and name != "stream":
+        result["mb_per_s"] = round(result["bytes"] / MB / result["seconds"], 2)
+    if name == "stream" and result["seconds_full_read"]:
+        result["mb_per_s"] = round(result["bytes"] / MB / result["seconds_full_read"], 2)
+    ctx.update(result.pop("context", {}))
+    return result
+
+
+# -----------------------------
+# REGRESSIONS
+# -----------------------------
+
+def compare(current, baseline, tolerance):
+    """Stages slower (or with higher stream latency) than ``baseline``."""
+    regressions = []
+
+    def check(label, now, before):
+        if now is not None and before and now > before * (1 + tolerance):
+            regressions.append({
+                "metric": label,
+                "baseline": before,
+                "current": now,
+                "change": f"+{100 * (now / before - 1):.1f}%",
+            })
+
+    for name, stage in current["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before:
+            continue
+        check(f"{name}.seconds", stage.get("seconds"), before.get("seconds"))
+        for metric in ("auth_to_first_byte", "range_1mib"):
+            if metric in stage and metric in before:
+                check(f"{name}.{metric}.p50_ms", stage[metric]["p50_ms"], before[metric]["p50_ms"])
+                check(f"{name}.{metric}.p99_ms", stage[metric]["p99_ms"], before[metric]["p99_ms"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CinemaShield pipelines")
+    parser.add_argument("--duration", type=float, default=60, help="test movie length (seconds)")
+    parser.add_argument("--bitrate", default="4M", help="test movie video bitrate")
+    parser.add_argument("--resolution", default="1280x720", help="test movie frame size")
+    parser.add_argument("--gop", type=float, default=1,
+                        help="keyframe interval (seconds); long GOPs force a transcode")
+    parser.add_argument("--runs", type=int, default=20, help="samples per latency metric")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--output", help="also write the JSON result here")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown vs baseline")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch workspace")
+    args = parser.parse_args()
+
+    selected = [name for name in args.stages.split(",") if name]
+    unknown = [name for name in selected if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="cinemashield-bench-")
+    try:
+        source = os.path.join(workdir, "bench.mp4")
+        started = time.perf_counter()
+        synthesize(source, args.duration, args.bitrate, args.resolution, args.gop)
+        ctx = {
+            "workdir": workdir,
+            "source": source,
+            "source_bytes": os.path.getsize(source),
+            "runs": args.runs,
+        }
+        result = {
+            "benchmark": "cinemashield-pipeline",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {
+                "duration": args.duration,
+                "bitrate": args.bitrate,
+                "resolution": args.resolution,
+                "gop": args.gop,
+                "runs": args.runs,
+                "encrypt_workers": app.ENCRYPT_WORKERS,
+                "transcode_workers": app.TRANSCODE_WORKERS,
+            },
+            "source": {
+                "bytes": ctx["source_bytes"],
+                "synthesize_seconds": round(time.perf_counter() - started, 3),
+            },
+            "stages": {},
+        }
+
+        # Later stages build on earlier ones, so run the prefix they need
+        needed = max(list(STAGES).index(name) for name in selected)
+        for name in list(STAGES)[:needed + 1]:
+            stage = run_stage(name, ctx)
+            if name in selected:
+                result["stages"][name] = stage
+            print(f"{name}: {stage['seconds']}s", file=sys.stderr)
+
+        if args.baseline:
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)
+            result["baseline"] = {"revision": baseline.get("revision"), "tolerance": args.tolerance}
+            result["regressions"] = compare(result, baseline, args.tolerance)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if result.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
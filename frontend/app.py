@@ -4,19 +4,43 @@ import json
 import math
 import shutil
 import hashlib
+import hmac
 import subprocess
 import secrets
 import uuid
 import tempfile
 import atexit
+import threading
+import time
 import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from flask import (
     Flask, render_template, request, jsonify,
-    Response, send_file, session, stream_with_context
+    Response, send_file, session, has_request_context, g
 )
 from werkzeug.utils import secure_filename
-from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from audit import AuditLog  # noqa: E402
+from catalog import Catalog  # noqa: E402
+from jobs import ACTIVE_STATUSES, JobQueue, format_sse  # noqa: E402
+from manifest_cache import ManifestCache, parse_iso  # noqa: E402
+from merkle import ManifestVerifier, block_hashes, is_merkle, seal_manifest  # noqa: E402
+from metrics import Metrics, timed_call  # noqa: E402
+from mp4_pipe import PipeConcat, faststart  # noqa: E402
+from prepared_cache import PreparedCache  # noqa: E402
+from session_events import Channels, TimerWheel  # noqa: E402
+from sessions import SessionStore  # noqa: E402
+from shard_crypto import (  # noqa: E402
+    InvalidShardKey, encrypt_shard, generate_key, key_check, open_shard, part_key, verify_key_check
+)
+from shard_io import MappedShard  # noqa: E402
+from shard_store import file_sha256  # noqa: E402
+from uploads import UploadError, UploadStore, file_digest  # noqa: E402
+from verify_cache import VerificationCache  # noqa: E402
 
 # ═══════════════════════════════════════════
 # CONFIGURATION
@@ -24,32 +48,131 @@ from cryptography.fernet import Fernet
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(32)
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500 MB
+app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500 MB per request (bigger files use chunked /api/uploads)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 BACKEND_DIR = os.path.normpath(os.path.join(BASE_DIR, '..', 'backend'))
 UPLOAD_DIR = os.path.join(BACKEND_DIR, 'uploads')
-SHARD_DIR = os.path.join(BACKEND_DIR, 'shards')
-ENCRYPTED_DIR = os.path.join(BACKEND_DIR, 'encrypted_shards')
-MANIFEST_PATH = os.path.join(BACKEND_DIR, 'manifest.json')
-KEY_PATH = os.path.join(BACKEND_DIR, 'secret.key')
+CATALOG_DIR = os.path.join(BACKEND_DIR, 'catalog')
 TEMP_DIR = os.path.join(BASE_DIR, 'temp')
 
 ALLOWED_EXTENSIONS = {'mp4', 'mkv', 'avi', 'mov'}
 TOTAL_SHARDS = 4
 PLAYBACK_HOURS = 3
+INIT_SUFFIX = '_init.mp4'
+# 'stream' decrypts shards lazily inside /api/stream; 'prepare' decrypts and
+# concatenates the whole movie at authentication time (legacy shards always
+# use 'prepare', since standalone MP4 segments cannot be byte-concatenated).
+PLAYBACK_MODE = 'stream'
+# Processes used to encrypt and hash shards in parallel (1 = inline)
+ENCRYPT_WORKERS = os.cpu_count() or 1
+# Concurrent ffmpeg encoders for segment-wise transcoding (1 = single pass)
+TRANSCODE_WORKERS = os.cpu_count() or 1
+# Ingest pipelines allowed to run at the same time
+MAX_CONCURRENT_JOBS = 2
+JOBS_DB_PATH = os.path.join(BACKEND_DIR, 'jobs.db')
+# Disk budget for decrypted movies shared by 'prepare' sessions
+PREPARED_CACHE_DIR = os.path.join(TEMP_DIR, 'prepared')
+PREPARED_CACHE_BYTES = 5 * 1024 * 1024 * 1024
+# Skip rehashing shards verified earlier and unchanged since; True forces
+# full verification (audits)
+VERIFY_CACHE_PATH = os.path.join(BACKEND_DIR, 'verify_cache.json')
+FULL_VERIFY = False
+# Resumable uploads: chunk size and the largest accepted movie
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024 * 1024
+PARTIAL_UPLOAD_DIR = os.path.join(UPLOAD_DIR, '.partial')
+# Recently validated key fingerprints kept to skip re-validation
+KEY_CACHE_SIZE = 256
+# /api/status payloads kept per theatre filter, and how often the manifests
+# behind a cached payload are re-checked on disk
+STATUS_CACHE_SIZE = 64
+STATUS_RECHECK_SECONDS = 5
+# Pushed to theatre screens: remaining time every SESSION_UPDATE_SECONDS,
+# and status feeds re-checked at least every STATUS_PUSH_SECONDS
+SESSION_UPDATE_SECONDS = 60
+STATUS_PUSH_SECONDS = 60
+# Playback sessions survive restarts in SESSIONS_DB_PATH; at most
+# MAX_SESSIONS at once, swept for expiry every SESSION_SWEEP_SECONDS
+SESSIONS_DB_PATH = os.path.join(BACKEND_DIR, 'sessions.db')
+MAX_SESSIONS = 10000
+SESSION_SWEEP_SECONDS = 60
+HISTORY_SIZE = 100
+AUDIT_DIR = os.path.join(BACKEND_DIR, 'audit')
+# Pre-JSONL audit file, imported into the first segment once
 AUDIT_LOG_PATH = os.path.join(BACKEND_DIR, 'audit_log.json')
-
-for d in [UPLOAD_DIR, SHARD_DIR, ENCRYPTED_DIR, TEMP_DIR]:
+AUDIT_SEGMENT_BYTES = 4 * 1024 * 1024
+AUDIT_RETAIN_BYTES = 256 * 1024 * 1024
+AUDIT_RETAIN_DAYS = 365
+# hls.js for the theatre page, vendored at a pinned version, never loaded
+# from a CDN: it runs next to the decrypted stream and the session token.
+# Fetch dist/hls.min.js of this exact npm release into static/js/vendor and
+# check it against `npm view hls.js@<version> dist.integrity`. Without it the
+# page falls back to native HLS or the progressive /api/stream.
+HLS_JS_VERSION = '1.5.20'
+HLS_JS_STATIC = f'js/vendor/hls-{HLS_JS_VERSION}.min.js'
+
+for d in [UPLOAD_DIR, CATALOG_DIR, TEMP_DIR]:
     os.makedirs(d, exist_ok=True)
 
-# Clean temp on exit
-atexit.register(lambda: shutil.rmtree(TEMP_DIR, ignore_errors=True))
+# Timings, counters and gauges for /metrics and the pipeline's SSE events
+metrics = Metrics()
+
+# Movies, their per-movie shard directories, manifests and keys
+catalog = Catalog(CATALOG_DIR)
+
+# Parsed manifests, revalidated against the file on every lookup
+manifests = ManifestCache(lambda movie_id: catalog.manifest_path(movie_id))
+
+# Background ingest pipelines (jobs left by a dead process: see startup)
+jobs = JobQueue(JOBS_DB_PATH, max_workers=MAX_CONCURRENT_JOBS)
+
+# Decrypted movies for 'prepare' sessions, shared and evicted LRU
+prepared_cache = PreparedCache(PREPARED_CACHE_DIR, PREPARED_CACHE_BYTES)
+
+# Chunked uploads in progress
+uploads = UploadStore(PARTIAL_UPLOAD_DIR, chunk_size=UPLOAD_CHUNK_SIZE, max_size=MAX_UPLOAD_SIZE)
+
+# Shards known to match their manifest since they were last verified
+verify_cache = VerificationCache(VERIFY_CACHE_PATH, force=FULL_VERIFY)
+
+# Append-only audit trail (rotated JSONL segments)
+audit = AuditLog(
+    AUDIT_DIR,
+    segment_bytes=AUDIT_SEGMENT_BYTES,
+    retain_bytes=AUDIT_RETAIN_BYTES,
+    retain_days=AUDIT_RETAIN_DAYS,
+    legacy_path=AUDIT_LOG_PATH
+)
+
+# Playback sessions: token -> {mode, movie_id, expires, key | filepath}.
+# Keys and prepared-file paths are not written to disk; see restore_sessions
+sessions = SessionStore(SESSIONS_DB_PATH, max_sessions=MAX_SESSIONS, private=('key', 'filepath'))
 
 # In-memory stores
-movies = {}
-prepared_videos = {}  # token -> {filepath, expires}
-upload_history = []   # list of processed movies
+validated_keys = OrderedDict()  # key fingerprint -> {movie_id, created_at}, LRU order
+validated_keys_lock = threading.Lock()
+status_cache = OrderedDict()  # theatre filter -> precomputed /api/status payload, LRU order
+status_cache_lock = threading.Lock()
+# Keys of movies processed by this process, for /api/history; never read
+# back from disk, so they are not listed again after a restart
+recent_keys = OrderedDict()  # movie_id -> key, newest last
+recent_keys_lock = threading.Lock()
+
+# Server-pushed session and status events (see /api/events)
+timer_wheel = TimerWheel()
+channels = Channels()
+session_timers = {}  # token -> pending Timer of the session's next update
+status_feeds = {}    # theatre filter -> {timer, etag} of a subscribed status feed
+status_feeds_lock = threading.Lock()
+KEY_FINGERPRINT_SECRET = os.urandom(32)
+
+metrics.gauge('playback_sessions', lambda: len(sessions))
+metrics.gauge('validated_keys', lambda: len(validated_keys))
+metrics.gauge('prepared_cache_bytes', lambda: prepared_cache.stats()['bytes'])
+metrics.gauge('prepared_cache_entries', lambda: prepared_cache.stats()['entries'])
+metrics.gauge('shard_store_bytes', lambda: catalog.store.stats()['bytes'])
+metrics.gauge('shard_store_objects', lambda: catalog.store.stats()['objects'])
 
 
 # ═══════════════════════════════════════════
@@ -57,31 +180,14 @@ upload_history = []   # list of processed movies
 # ═══════════════════════════════════════════
 
 def audit_log(action, details=None):
-    """Append an entry to the audit log (JSON file + in-memory)."""
+    """Append an entry to the audit log (buffered, written in the background)."""
     entry = {
         'timestamp': datetime.now(timezone.utc).isoformat(),
         'action': action,
         'details': details or {},
-        'ip': request.remote_addr if request else None
+        'ip': request.remote_addr if has_request_context() else None
     }
-
-    # Load existing log
-    log = []
-    if os.path.exists(AUDIT_LOG_PATH):
-        try:
-            with open(AUDIT_LOG_PATH, 'r') as f:
-                log = json.load(f)
-        except (json.JSONDecodeError, IOError):
-            log = []
-
-    log.append(entry)
-
-    # Keep last 500 entries
-    log = log[-500:]
-    with open(AUDIT_LOG_PATH, 'w') as f:
-        json.dump(log, f, indent=2)
-
-    return entry
+    return audit.append(entry)
 
 
 # ═══════════════════════════════════════════
@@ -92,6 +198,7 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+@metrics.timed('ffprobe_seconds', probe='duration')
 def get_video_duration(file_path):
     cmd = [
         'ffprobe', '-v', 'error',
@@ -103,149 +210,564 @@ def get_video_duration(file_path):
     return float(result.stdout.strip())
 
 
-def sha256_file(filepath):
-    h = hashlib.sha256()
-    with open(filepath, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b''):
-            h.update(chunk)
-    return h.hexdigest()
+@metrics.timed('ffprobe_seconds', probe='codecs')
+def probe_codecs(file_path):
+    """Return the codec of the first video and audio stream, by type."""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'stream=codec_type,codec_name',
+        '-of', 'json',
+        file_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    codecs = {}
+    for stream in json.loads(result.stdout or '{}').get('streams', []):
+        codecs.setdefault(stream.get('codec_type'), stream.get('codec_name'))
+    return codecs
 
 
-def cleanup_dirs():
-    """Remove old shards, encrypted shards, and temp files."""
-    for d in [SHARD_DIR, TEMP_DIR]:
-        if os.path.exists(d):
-            shutil.rmtree(d)
-        os.makedirs(d, exist_ok=True)
-    if os.path.exists(ENCRYPTED_DIR):
-        for f in os.listdir(ENCRYPTED_DIR):
-            os.remove(os.path.join(ENCRYPTED_DIR, f))
+@metrics.timed('ffprobe_seconds', probe='keyframes')
+def keyframes_within(file_path, duration, max_gap):
+    """True if the video has a keyframe at least every ``max_gap`` seconds,
+    counting from the start to the end of the file.
 
+    Reads packet flags only (nothing is decoded), and stops reading at the
+    first gap that is too long.
+    """
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        file_path
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    last, found = 0.0, False
+    try:
+        for line in proc.stdout:
+            pts_time, _, flags = line.strip().partition(',')
+            if 'K' not in flags or pts_time in ('', 'N/A'):
+                continue
+            if float(pts_time) - last > max_gap:
+                return False
+            last, found = float(pts_time), True
+        if proc.wait() != 0:
+            return False
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+    return found and duration - last <= max_gap
+
+
+def can_stream_copy(codecs, file_path, duration, shard_duration):
+    """True if the source is H.264/AAC with GOPs no longer than a shard.
+
+    Such sources can be cut into shards at existing keyframes without a
+    re-encode. ``codecs`` is the source's probe_codecs().
+    """
+    if codecs.get('video') != 'h264' or codecs.get('audio') not in (None, 'aac'):
+        return False
+    return keyframes_within(file_path, duration, shard_duration)
+
+
+def hls_output_args(shard_dir, base_name, shard_duration):
+    """ffmpeg output options for the fMP4 HLS shard layout in ``shard_dir``.
+
+    The playlist is an EVENT playlist, rewritten as each segment completes,
+    and segments are written under a temporary name until they are whole,
+    so a segment listed in the playlist is always complete on disk.
+    """
+    return [
+        '-f', 'hls',
+        '-hls_time', str(shard_duration),
+        '-hls_playlist_type', 'event',
+        '-hls_flags', 'temp_file',
+        '-hls_segment_type', 'fmp4',
+        '-hls_fmp4_init_filename', f'{base_name}{INIT_SUFFIX}',
+        '-hls_segment_filename', os.path.join(shard_dir, f'{base_name}_part%03d.m4s'),
+        '-start_number', '0',
+        os.path.join(shard_dir, f'{base_name}.m3u8')
+    ]
 
-def shard_video(file_path):
-    """Split video into segments using FFmpeg."""
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    output_pattern = os.path.join(SHARD_DIR, f'{base_name}_part%03d.mp4')
 
-    duration = get_video_duration(file_path)
-    shard_duration = math.ceil(duration / TOTAL_SHARDS)
+def completed_segments(playlist_path):
+    """Init segment and media segments listed so far in an HLS playlist, in order."""
+    try:
+        with open(playlist_path, 'r') as f:
+            lines = [line.strip() for line in f]
+    except FileNotFoundError:
+        return []
+    names = []
+    for line in lines:
+        if line.startswith('#EXT-X-MAP:') and 'URI="' in line:
+            names.append(line.split('URI="', 1)[1].split('"', 1)[0])
+        elif line and not line.startswith('#'):
+            names.append(line)
+    return names
+
+
+@metrics.timed('ffmpeg_seconds', op='hls_mux')
+def run_hls_mux(cmd, playlist_path, on_segment=None, poll_interval=0.2):
+    """Run an ffmpeg HLS mux, calling ``on_segment(path)`` for each segment
+    (init first) as soon as ffmpeg has finished writing it."""
+    if on_segment is None:
+        subprocess.run(cmd, check=True, capture_output=True)
+        return
+
+    seen = set()
 
+    def scan():
+        for name in completed_segments(playlist_path):
+            if name not in seen:
+                seen.add(name)
+                on_segment(os.path.join(os.path.dirname(playlist_path), name))
+
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            while proc.poll() is None:
+                scan()
+                time.sleep(poll_interval)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        if proc.returncode:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr.read())
+    scan()
+
+
+@metrics.timed('ffmpeg_seconds', op='transcode_range')
+def transcode_segment(file_path, start, length, output_path, threads):
+    """Re-encode the video of one time range of the source to a standalone
+    MP4 (no audio: see shard_video)."""
     cmd = [
-        'ffmpeg', '-y', '-i', file_path,
+        'ffmpeg', '-y',
+        '-ss', f'{start:.3f}', '-i', file_path, '-t', f'{length:.3f}',
         '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
-        '-force_key_frames', f'expr:gte(t,n_forced*{shard_duration})',
-        '-c:a', 'aac',
-        '-f', 'segment',
-        '-segment_time', str(shard_duration),
-        '-reset_timestamps', '1',
-        output_pattern
+        '-an',
+        '-threads', str(threads),
+        output_path
     ]
     subprocess.run(cmd, check=True, capture_output=True)
-    shards = [f for f in os.listdir(SHARD_DIR) if os.path.isfile(os.path.join(SHARD_DIR, f))]
-    return len(shards)
 
 
-def encrypt_shards():
-    """Encrypt all shards with Fernet. Returns the key bytes."""
-    key = Fernet.generate_key()
-    fernet = Fernet(key)
+def shard_video(movie_id, file_path, workers=None, on_segment=None):
+    """Split video into fragmented-MP4 segments using FFmpeg.
 
-    with open(KEY_PATH, 'wb') as f:
-        f.write(key)
+    The HLS muxer writes one init segment (ftyp + moov) and a run of
+    moof/mdat fragments, so init + shards concatenated in order is itself a
+    valid fragmented MP4 that can be streamed without remuxing.
 
-    shards = sorted([
-        f for f in os.listdir(SHARD_DIR)
-        if os.path.isfile(os.path.join(SHARD_DIR, f))
-    ])
+    H.264/AAC sources with short enough GOPs are stream-copied. Otherwise,
+    with more than one worker, the video of each shard-length time range is
+    encoded by its own ffmpeg process and the results are joined with a
+    stream-copy mux. Every range starts on a keyframe, so shard boundaries
+    match the single-pass encode. Audio is taken from the source in that
+    mux in a single pass (copied if AAC, else encoded once): separate AAC
+    encodes per range would each start with encoder priming samples,
+    audible as gaps or clicks at the joins.
 
-    for shard_file in shards:
-        shard_path = os.path.join(SHARD_DIR, shard_file)
-        with open(shard_path, 'rb') as f:
-            data = f.read()
+    ``on_segment(path)`` is called for each segment as soon as the HLS mux
+    has completed it (see run_hls_mux), while ffmpeg keeps running.
+    """
+    shard_dir = catalog.shard_dir(movie_id)
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    playlist_path = os.path.join(shard_dir, f'{base_name}.m3u8')
+    workers = workers or TRANSCODE_WORKERS
 
-        encrypted = fernet.encrypt(data)
-        enc_path = os.path.join(ENCRYPTED_DIR, shard_file + '.enc')
-        with open(enc_path, 'wb') as f:
-            f.write(encrypted)
+    duration = get_video_duration(file_path)
+    shard_duration = math.ceil(duration / TOTAL_SHARDS)
 
-        os.remove(shard_path)
+    codecs = probe_codecs(file_path)
 
-    return key
+    if can_stream_copy(codecs, file_path, duration, shard_duration):
+        cmd = ['ffmpeg', '-y', '-i', file_path, '-c', 'copy']
+        cmd += hls_output_args(shard_dir, base_name, shard_duration)
+        run_hls_mux(cmd, playlist_path, on_segment)
 
+    elif workers > 1 and duration > shard_duration:
+        ranges = [
+            (start, min(shard_duration, duration - start))
+            for start in range(0, math.ceil(duration), shard_duration)
+        ]
+        threads = max(1, (os.cpu_count() or 1) // min(workers, len(ranges)))
+
+        with tempfile.TemporaryDirectory(dir=shard_dir) as tmpdir:
+            outputs = [os.path.join(tmpdir, f'range{i:03d}.mp4') for i in range(len(ranges))]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(transcode_segment, file_path, start, length, out, threads)
+                    for (start, length), out in zip(ranges, outputs)
+                ]
+                for future in futures:
+                    future.result()
+
+            list_path = os.path.join(tmpdir, 'concat.txt')
+            with open(list_path, 'w') as f:
+                for out in outputs:
+                    safe = out.replace(os.sep, '/')
+                    f.write(f"file '{safe}'\n")
+
+            cmd = [
+                'ffmpeg', '-y',
+                '-f', 'concat', '-safe', '0', '-i', list_path,
+                '-i', file_path,
+                '-map', '0:v:0', '-map', '1:a:0?',
+                '-c:v', 'copy',
+                '-c:a', 'copy' if codecs.get('audio') == 'aac' else 'aac'
+            ]
+            cmd += hls_output_args(shard_dir, base_name, shard_duration)
+            run_hls_mux(cmd, playlist_path, on_segment)
+
+    else:
+        cmd = [
+            'ffmpeg', '-y', '-i', file_path,
+            '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+            '-force_key_frames', f'expr:gte(t,n_forced*{shard_duration})',
+            '-c:a', 'aac'
+        ]
+        cmd += hls_output_args(shard_dir, base_name, shard_duration)
+        run_hls_mux(cmd, playlist_path, on_segment)
+
+    return sum(1 for name in completed_segments(playlist_path) if name.endswith('.m4s'))
+
+
+def segment_durations(movie_id):
+    """Read per-segment durations from the playlist written by shard_video."""
+    shard_dir = catalog.shard_dir(movie_id)
+    durations = {}
+    for name in os.listdir(shard_dir):
+        if not name.endswith('.m3u8'):
+            continue
+        with open(os.path.join(shard_dir, name), 'r') as f:
+            duration = None
+            for line in f:
+                line = line.strip()
+                if line.startswith('#EXTINF:'):
+                    duration = float(line[len('#EXTINF:'):].split(',')[0])
+                elif line and not line.startswith('#') and duration is not None:
+                    durations[os.path.basename(line)] = duration
+                    duration = None
+    return durations
+
+
+def shard_and_encrypt(movie_id, file_path, progress=None, workers=None):
+    """Shard the source and encrypt each segment as soon as ffmpeg completes it.
+
+    Encryption runs in a process pool alongside the still-running ffmpeg,
+    so wall time approaches max(transcode, encrypt), and each plaintext
+    segment is deleted as soon as it is encrypted. Each worker hashes the
+    ciphertext as it writes it, so the manifest never re-reads the
+    encrypted files. Segments already in the shard store (same plaintext)
+    are not encrypted again. ``progress(done, shard_id)`` is called as
+    segments are encrypted.
+
+    Returns ``(num_shards, key, shard_info, reused)``, where ``shard_info``
+    maps segment name to its manifest entry and ``reused`` counts segments
+    found in the store. Raises the first error of any segment, so a movie
+    is never published with one missing.
+    """
+    store = catalog.store
+    key = generate_key()
+    workers = workers or ENCRYPT_WORKERS
+
+    with open(catalog.key_path(movie_id), 'wb') as f:
+        f.write(key)
 
-def generate_manifest(theatre_id='THEATRE_001'):
-    """Create manifest.json with SHA-256 hashes and playback window."""
-    now = datetime.now(timezone.utc)
+    shard_info = {}
+    reused = []
+    lock = threading.Lock()
+    errors = []
 
-    shards = sorted([
-        f for f in os.listdir(ENCRYPTED_DIR)
-        if os.path.isfile(os.path.join(ENCRYPTED_DIR, f))
-    ])
+    def finished(shard_path, entry):
+        os.remove(shard_path)
+        with lock:
+            shard_info[os.path.basename(shard_path)] = entry
+            done = len(shard_info)
+        if progress:
+            progress(done, entry['id'])
+
+    def stored(shard_path, object_id, tmp_path, data_key, result):
+        result, seconds = result
+        metrics.observe('encrypt_seconds', seconds)
+        metrics.inc('encrypted_bytes_total', result['size'])
+        store.add(object_id, tmp_path, result, data_key)
+        finished(shard_path, store.use(movie_id, object_id, key))
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def encrypted(future, args):
+        # Runs on the pool's callback thread, which only logs exceptions:
+        # keep them for the caller instead
+        try:
+            stored(*args, future.result())
+        except BaseException as e:
+            with lock:
+                errors.append(e)
+
+    def on_segment(shard_path):
+        with metrics.timer('hash_seconds', input='segment'):
+            object_id = store.object_id(file_sha256(shard_path))
+        metrics.inc('hashed_bytes_total', os.path.getsize(shard_path), input='segment')
+        entry = store.use(movie_id, object_id, key)
+        if entry:
+            reused.append(object_id)
+            metrics.inc('store_reused_segments_total')
+            finished(shard_path, entry)
+            return
+
+        data_key = generate_key()
+        tmp_path = store.temp_path()
+        shard_id = f'{object_id}.enc'
+        if pool is None:
+            result = timed_call(encrypt_shard, shard_path, tmp_path, data_key, shard_id=shard_id)
+            stored(shard_path, object_id, tmp_path, data_key, result)
+            return
+        # The pool target must not live in this module: spawned workers
+        # would import all of app.py to run it
+        future = pool.submit(timed_call, encrypt_shard, shard_path, tmp_path, data_key, shard_id=shard_id)
+        future.add_done_callback(
+            lambda f, args=(shard_path, object_id, tmp_path, data_key): encrypted(f, args)
+        )
+
+    try:
+        try:
+            num_shards = shard_video(movie_id, file_path, on_segment=on_segment)
+        except BaseException:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            raise
+        if pool is not None:
+            # Waits for the workers and for their completion callbacks
+            pool.shutdown()
+    finally:
+        # Objects and references added segment by segment, in one write
+        store.flush()
+    if errors:
+        raise errors[0]
+
+    return num_shards, key, shard_info, len(reused)
+
+
+def reuse_source(movie_id, recipe):
+    """Assemble a movie from a recipe of an earlier ingest of the same source.
+
+    Nothing is transcoded or encrypted: the stored objects get their data
+    keys wrapped for this movie's new key. Returns what shard_and_encrypt
+    and segment_durations would, or None if an object of the recipe has
+    been deleted since it was looked up (the source must be ingested again).
+    """
+    key = generate_key()
+    with open(catalog.key_path(movie_id), 'wb') as f:
+        f.write(key)
+    shard_info, durations = {}, {}
+    try:
+        for segment in recipe['segments']:
+            entry = catalog.store.use(movie_id, segment['object'], key)
+            if entry is None:
+                return None
+            shard_info[segment['name']] = entry
+            if segment.get('duration') is not None:
+                durations[segment['name']] = segment['duration']
+    finally:
+        catalog.store.flush()
+    num_shards = sum(1 for name in shard_info if not name.endswith(INIT_SUFFIX))
+    return num_shards, key, shard_info, durations
+
+
+def generate_manifest(movie_id, theatre_id='THEATRE_001', shard_info=None, durations=None, key=None):
+    """Create manifest.json with SHA-256 hashes and playback window.
+
+    Parts come from ``shard_info`` (segment name to manifest entry, as
+    returned by shard_and_encrypt); without it, the movie's encrypted
+    directory is listed and hashed. Also writes an HLS playlist next to it
+    whose segment URIs are the encrypted shard ids, so the at-rest shard
+    set is self-describing.
+    """
+    now = datetime.now(timezone.utc)
+    durations = durations or {}
+
+    if shard_info:
+        named = sorted(shard_info.items())
+    else:
+        encrypted_dir = catalog.encrypted_dir(movie_id)
+        named = []
+        for shard_file in sorted(os.listdir(encrypted_dir)):
+            if not os.path.isfile(os.path.join(encrypted_dir, shard_file)):
+                continue
+            with MappedShard(os.path.join(encrypted_dir, shard_file)) as mapped:
+                entry = {'id': shard_file, 'sha256': mapped.sha256(), 'chunks': block_hashes(mapped.view)}
+            named.append((shard_file[:-len('.enc')], entry))
 
     manifest = {
+        'movie_id': movie_id,
         'created_at': now.isoformat(),
         'theatre_id': theatre_id,
+        'format': 'fmp4',
         'playback_window': {
             'start': now.isoformat(),
             'end': (now + timedelta(hours=PLAYBACK_HOURS)).isoformat()
         },
+        'init': None,
         'shards': []
     }
-
-    for shard_file in shards:
-        shard_path = os.path.join(ENCRYPTED_DIR, shard_file)
-        manifest['shards'].append({
-            'id': shard_file,
-            'sha256': sha256_file(shard_path)
-        })
-
-    with open(MANIFEST_PATH, 'w') as f:
+    if key:
+        manifest['key_check'] = key_check(key, movie_id)
+
+    for name, entry in named:
+        entry = dict(entry)
+        if name in durations:
+            entry['duration'] = durations[name]
+        if name.endswith(INIT_SUFFIX):
+            manifest['init'] = entry
+        else:
+            manifest['shards'].append(entry)
+    if key:
+        seal_manifest(manifest, key)
+
+    # Replaced atomically: request handlers may be reading it right now
+    manifest_path = catalog.manifest_path(movie_id)
+    with open(f'{manifest_path}.tmp', 'w') as f:
         json.dump(manifest, f, indent=4)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+    playlist_path = catalog.playlist_path(movie_id)
+    if has_playlist(manifest):
+        with open(playlist_path, 'w') as f:
+            f.write(build_playlist(
+                manifest,
+                manifest['init']['id'],
+                lambda index, shard: shard['id']
+            ))
+    elif os.path.exists(playlist_path):
+        os.remove(playlist_path)
 
     return manifest
 
 
-def parse_iso(s):
-    """Parse an ISO timestamp, handling both +00:00 and Z suffixes."""
-    s = s.rstrip('Z')
-    dt = datetime.fromisoformat(s)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt
+def load_manifest(movie_id):
+    """The movie's manifest, from the in-memory cache (do not modify it)."""
+    return manifests.get(movie_id).manifest
+
+
+def is_streamable(manifest):
+    """Fragmented-MP4 manifests with known plaintext sizes can be streamed."""
+    if manifest.get('format') != 'fmp4' or not manifest.get('init'):
+        return False
+    return all('size' in part for part in stream_parts(manifest))
+
+
+def stream_parts(manifest):
+    """Init segment followed by the media shards, in playback order."""
+    return [manifest['init']] + manifest['shards']
 
 
-def load_manifest():
-    with open(MANIFEST_PATH, 'r') as f:
-        return json.load(f)
+def has_playlist(manifest):
+    """Streamable manifests with segment durations can be served as HLS."""
+    return is_streamable(manifest) and all('duration' in s for s in manifest['shards'])
 
 
-def prepare_video(key_str, output_path):
+def build_playlist(manifest, init_uri, segment_uri):
+    """Render an HLS VOD playlist (fMP4 segments) for the manifest shards.
+
+    ``segment_uri(index, shard)`` supplies the URI of each media segment.
+    """
+    target = max(math.ceil(s['duration']) for s in manifest['shards'])
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:7',
+        f'#EXT-X-TARGETDURATION:{target}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        '#EXT-X-INDEPENDENT-SEGMENTS',
+        f'#EXT-X-MAP:URI="{init_uri}"'
+    ]
+    for index, shard in enumerate(manifest['shards']):
+        lines.append(f"#EXTINF:{shard['duration']:.6f},")
+        lines.append(segment_uri(index, shard))
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def manifest_verifier(manifest, key):
+    """Block verifier for a v2 (Merkle) manifest, or None for v1."""
+    return ManifestVerifier(manifest, key) if is_merkle(manifest) else None
+
+
+def open_part(movie_id, key, part, verifier=None):
+    """Map one encrypted shard and return a reader that decrypts from the
+    same mapping.
+
+    Shards the verification cache knows to be unchanged are not checked
+    again. Otherwise, with a manifest ``verifier`` each chunk is checked
+    against its Merkle leaf as it is read (the shard is recorded once every
+    block has passed); without one the whole shard is hashed up front.
+    """
+    enc_path = catalog.part_path(movie_id, part)
+    key = part_key(key, part)
+    if verify_cache.is_verified(enc_path, part['sha256']):
+        return open_shard(enc_path, key)
+    if verifier:
+        part_verifier = verifier.for_part(
+            part['id'],
+            on_complete=lambda: verify_cache.mark_verified(enc_path, part['sha256'])
+        )
+        return open_shard(enc_path, key, verifier=part_verifier)
+    reader = open_shard(enc_path, key, expected_sha256=part['sha256'])
+    verify_cache.mark_verified(enc_path, part['sha256'])
+    return reader
+
+
+def decrypt_part(movie_id, key, part, verifier=None):
+    """Verify one encrypted shard against its manifest hash and decrypt it."""
+    with open_part(movie_id, key, part, verifier) as reader:
+        return reader.read_all()
+
+
+@metrics.timed('prepare_video_seconds')
+def prepare_video(movie_id, key_str, output_path):
     """Decrypt all shards, verify integrity, and concatenate into one file."""
-    manifest = load_manifest()
-    if isinstance(key_str, str):
-        key_str = key_str.encode()
-    fernet = Fernet(key_str)
+    manifest = load_manifest(movie_id)
+    verifier = manifest_verifier(manifest, key_str)
+
+    if manifest.get('format') == 'fmp4':
+        # Init + fragments concatenate into a playable file as-is
+        with open(output_path, 'wb') as out:
+            for part in stream_parts(manifest):
+                with open_part(movie_id, key_str, part, verifier) as reader:
+                    for chunk in reader.iter_chunks():
+                        out.write(chunk)
+        return
+
+    def decrypted_mp4(shard_info):
+        with open_part(movie_id, key_str, shard_info, verifier) as reader:
+            yield from faststart(reader)
+
+    if os.name == 'posix':
+        # Shards reach a single ffmpeg concat through pipes; the output is
+        # the only plaintext written to disk
+        with metrics.timer('ffmpeg_seconds', op='concat'):
+            concat = PipeConcat(
+                [lambda s=shard_info: decrypted_mp4(s) for shard_info in manifest['shards']],
+                ['-c', 'copy', output_path]
+            )
+            concat.wait()
+        return
 
     with tempfile.TemporaryDirectory() as tmpdir:
         dec_files = []
 
         for shard_info in manifest['shards']:
-            enc_path = os.path.join(ENCRYPTED_DIR, shard_info['id'])
-            with open(enc_path, 'rb') as f:
-                encrypted = f.read()
-
-            # Integrity check
-            actual_hash = hashlib.sha256(encrypted).hexdigest()
-            if actual_hash != shard_info['sha256']:
-                raise ValueError(f"Integrity check failed: {shard_info['id']}")
-
-            decrypted = fernet.decrypt(encrypted)
             dec_name = shard_info['id'].replace('.enc', '')
             dec_path = os.path.join(tmpdir, dec_name)
             with open(dec_path, 'wb') as f:
-                f.write(decrypted)
+                for chunk in decrypted_mp4(shard_info):
+                    f.write(chunk)
             dec_files.append(dec_path)
-            del decrypted
 
         # ffmpeg concat list
         list_path = os.path.join(tmpdir, 'concat.txt')
@@ -261,7 +783,42 @@ def prepare_video(key_str, output_path):
             '-c', 'copy',
             output_path
         ]
-        subprocess.run(cmd, check=True, capture_output=True)
+        with metrics.timer('ffmpeg_seconds', op='concat'):
+            subprocess.run(cmd, check=True, capture_output=True)
+
+
+def generate_stream(movie_id, key_str, parts, start, end, verifier=None):
+    """Yield plaintext bytes [start, end] of the concatenated parts.
+
+    Only the chunks overlapping the requested range are read and decrypted.
+    Each chunk is authenticated together with its shard id, and for v2
+    manifests also checked against its Merkle leaf, so partial reads stay
+    tamper-evident without hashing the whole shard first.
+    """
+    offset = 0
+    served = 0
+    try:
+        for part in parts:
+            part_start, part_end = offset, offset + part['size'] - 1
+            offset += part['size']
+            if part_end < start:
+                continue
+            if part_start > end:
+                break
+
+            if verifier:
+                reader = open_part(movie_id, key_str, part, verifier)
+            else:
+                reader = open_shard(catalog.part_path(movie_id, part), part_key(key_str, part))
+            with reader:
+                lo = max(start, part_start) - part_start
+                hi = min(end, part_end) - part_start
+                for chunk in reader.read_range(lo, hi):
+                    served += len(chunk)
+                    yield chunk
+    finally:
+        # Counted once per response; includes responses cut short by the client
+        metrics.inc('stream_bytes_total', served, mode='stream')
 
 
 # ═══════════════════════════════════════════
@@ -280,15 +837,27 @@ def producer_page():
 
 @app.route('/theatre')
 def theatre_page():
-    return render_template('theatre.html')
+    vendored = os.path.exists(os.path.join(app.static_folder, HLS_JS_STATIC))
+    return render_template('theatre.html', hls_js=HLS_JS_STATIC if vendored else None)
 
 
 # ═══════════════════════════════════════════
 # PRODUCER API
 # ═══════════════════════════════════════════
 
+def normalize_theatre(value):
+    return (value or '').strip().upper() or 'THEATRE_001'
+
+
+def register_movie(movie_id, filename, theatre_id, file_path, **fields):
+    """Add an uploaded source file to the catalog, ready for processing."""
+    catalog.create(movie_id, filename, theatre_id, file_path=file_path, **fields)
+    audit_log('UPLOAD', {'movie_id': movie_id, 'filename': filename, 'theatre_id': theatre_id})
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload():
+    """Single-request upload, for small files (see /api/uploads for large ones)."""
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
 
@@ -296,90 +865,265 @@ def upload():
     if file.filename == '' or not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file type. Allowed: mp4, mkv, avi, mov'}), 400
 
-    theatre_id = request.form.get('theatre_id', 'THEATRE_001').strip().upper()
-    if not theatre_id:
-        theatre_id = 'THEATRE_001'
+    theatre_id = normalize_theatre(request.form.get('theatre_id'))
 
     filename = secure_filename(file.filename)
     movie_id = uuid.uuid4().hex[:8]
-    save_path = os.path.join(UPLOAD_DIR, filename)
+    upload_dir = os.path.join(UPLOAD_DIR, movie_id)
+    os.makedirs(upload_dir, exist_ok=True)
+    save_path = os.path.join(upload_dir, filename)
     file.save(save_path)
 
-    movies[movie_id] = {
-        'name': filename,
-        'status': 'uploaded',
-        'file_path': save_path,
-        'key': None,
-        'theatre_id': theatre_id
-    }
-
-    audit_log('UPLOAD', {'movie_id': movie_id, 'filename': filename, 'theatre_id': theatre_id})
+    register_movie(movie_id, filename, theatre_id, save_path)
     return jsonify({'movie_id': movie_id, 'filename': filename})
 
 
+# ─── Resumable chunked uploads ──────────────
+#
+#   POST   /api/uploads                       {filename, size, theatre_id}
+#   GET    /api/uploads/<id>                  which chunks have arrived
+#   PUT    /api/uploads/<id>?offset=N         raw chunk body [X-Chunk-SHA256]
+#   POST   /api/uploads/<id>/finalize         -> {movie_id, source_sha256}
+#   DELETE /api/uploads/<id>
+
+@app.errorhandler(UploadError)
+def upload_error(e):
+    return jsonify({'error': str(e)}), e.status
+
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Allowed: mp4, mkv, avi, mov'}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'File size is required'}), 400
+
+    theatre_id = normalize_theatre(data.get('theatre_id'))
+    return jsonify(uploads.create(filename, size, theatre_id=theatre_id))
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    return jsonify(uploads.status(upload_id))
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length is required'}), 411
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+
+    status = uploads.write_chunk(
+        upload_id, offset, request.stream, request.content_length,
+        expected_sha256=request.headers.get('X-Chunk-SHA256')
+    )
+    return jsonify({'received': len(status['received']), 'chunk_count': status['chunk_count']})
+
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    movie_id = uuid.uuid4().hex[:8]
+    name = uploads.status(upload_id)['filename']
+    save_path = os.path.join(UPLOAD_DIR, movie_id, name)
+    state, source_sha256 = uploads.finalize(upload_id, save_path)
+
+    register_movie(
+        movie_id, name, state['meta']['theatre_id'], save_path,
+        size=state['size'], source_sha256=source_sha256
+    )
+    return jsonify({'movie_id': movie_id, 'filename': name, 'source_sha256': source_sha256})
+
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    uploads.abort(upload_id)
+    return jsonify({'success': True})
+
+
+def run_pipeline(movie_id, emit):
+    """Shard, encrypt and manifest one movie, reporting progress via ``emit``.
+
+    Runs on a JobQueue worker, so it does not depend on any HTTP request.
+    Events carry the wall time of each finished stage under ``timings``.
+    """
+    movie = catalog.get(movie_id)
+    timings = {}
+    started = time.perf_counter()
+
+    @contextmanager
+    def stage(name):
+        with metrics.timer('pipeline_stage_seconds', stage=name) as timer:
+            yield
+        timings[name] = round(timer.elapsed, 3)
+
+    try:
+        # Cleanup (this movie's workspace only)
+        emit({'step': 'cleanup', 'message': 'Preparing workspace...', 'progress': 5})
+        with stage('cleanup'):
+            catalog.reset(movie_id)
+
+        # A source ingested before is assembled from the shard store
+        source_sha256 = movie.get('source_sha256')
+        if not source_sha256:
+            with stage('source_digest'), metrics.timer('hash_seconds', input='source'):
+                source_sha256 = file_digest(movie['file_path'], UPLOAD_CHUNK_SIZE)
+            metrics.inc('hashed_bytes_total', os.path.getsize(movie['file_path']), input='source')
+            catalog.update(movie_id, source_sha256=source_sha256)
+        recipe = catalog.store.recipe(source_sha256)
+        reused_source = None
+        if recipe:
+            with stage('reuse'):
+                reused_source = reuse_source(movie_id, recipe)
+
+        if reused_source:
+            num_shards, key, shard_info, durations = reused_source
+            audit_log('SHARD', {'movie_id': movie_id, 'shards': num_shards, 'reused': len(shard_info)})
+            emit({'step': 'sharding_done', 'message': f'Source already ingested: reused {num_shards} stored shards', 'progress': 72, 'timings': dict(timings)})
+        else:
+            # Shard + encrypt, pipelined: segments are encrypted while ffmpeg runs
+            emit({'step': 'sharding', 'message': 'Splitting video into shards...', 'progress': 15})
+            with stage('shard_encrypt'):
+                num_shards, key, shard_info, reused = shard_and_encrypt(
+                    movie_id, movie['file_path'],
+                    progress=lambda done, shard_id: emit({
+                        'step': 'encrypting',
+                        'message': f'Encrypted {done} segment(s) while transcoding',
+                        'progress': min(70, 20 + 10 * done),
+                        'elapsed': round(time.perf_counter() - started, 3)
+                    })
+                )
+            durations = segment_durations(movie_id)
+            catalog.store.remember_source(source_sha256, {'segments': [
+                {'name': name, 'object': entry['object'], 'duration': durations.get(name)}
+                for name, entry in sorted(shard_info.items())
+            ]})
+            audit_log('SHARD', {'movie_id': movie_id, 'shards': num_shards, 'reused': reused})
+            message = f'Created {num_shards} shards' + (f' ({reused} already stored)' if reused else '')
+            emit({'step': 'sharding_done', 'message': message, 'progress': 72, 'timings': dict(timings)})
+        key = key.decode()
+        audit_log('ENCRYPT', {'movie_id': movie_id})
+        emit({'step': 'encrypting_done', 'message': 'All shards encrypted', 'progress': 75})
+
+        # Manifest
+        emit({'step': 'manifest', 'message': 'Generating secure manifest...', 'progress': 85})
+        theatre_id = movie.get('theatre_id', 'THEATRE_001')
+        with stage('manifest'):
+            manifest = generate_manifest(movie_id, theatre_id=theatre_id, shard_info=shard_info, durations=durations, key=key)
+        audit_log('MANIFEST', {'movie_id': movie_id, 'theatre_id': theatre_id, 'shards': len(manifest['shards'])})
+        emit({'step': 'manifest_done', 'message': 'Manifest created with SHA-256 hashes', 'progress': 92, 'timings': dict(timings)})
+
+        # Cleanup uploaded file
+        if os.path.exists(movie['file_path']):
+            os.remove(movie['file_path'])
+
+        # processed_at puts the movie in /api/history
+        catalog.update(
+            movie_id, status='ready', shards=len(manifest['shards']),
+            processed_at=datetime.now(timezone.utc).isoformat()
+        )
+        refresh_status_feeds()
+        with recent_keys_lock:
+            recent_keys[movie_id] = key
+            while len(recent_keys) > HISTORY_SIZE:
+                recent_keys.popitem(last=False)
+
+        timings['total'] = round(time.perf_counter() - started, 3)
+        metrics.observe('pipeline_seconds', timings['total'], outcome='done')
+        audit_log('PIPELINE_COMPLETE', {'movie_id': movie_id, 'timings': timings})
+        emit({'step': 'done', 'message': 'Pipeline complete!', 'progress': 100, 'key': key, 'shards': len(manifest['shards']), 'timings': timings})
+
+    except Exception as e:
+        timings['total'] = round(time.perf_counter() - started, 3)
+        metrics.observe('pipeline_seconds', timings['total'], outcome='error')
+        catalog.update(movie_id, status='error')
+        audit_log('PIPELINE_FAILED', {'movie_id': movie_id, 'error': str(e)})
+        emit({'step': 'error', 'message': str(e), 'progress': 0, 'timings': timings})
+
+
+def ensure_job(movie_id):
+    """Queue the movie's pipeline unless it has run or is running.
+
+    Returns ``(job_id, None)`` for the job to follow, or
+    ``(None, (message, status))``.
+    """
+    movie = catalog.get(movie_id)
+    if not movie:
+        return None, ('Movie not found', 404)
+
+    job = jobs.latest_for_movie(movie_id)
+    if movie['status'] == 'uploaded' and (not job or job['status'] not in ACTIVE_STATUSES):
+        catalog.update(movie_id, status='processing')
+        job_id = jobs.submit(movie_id, lambda emit: run_pipeline(movie_id, emit))
+        audit_log('JOB_QUEUED', {'movie_id': movie_id, 'job_id': job_id})
+        return job_id, None
+    if job:
+        return job['job_id'], None
+    return None, (f"Movie is already {movie['status']}", 409)
+
+
 @app.route('/api/process/<movie_id>')
 def process_movie(movie_id):
-    """SSE endpoint — runs the full pipeline with real-time progress."""
-    movie = movies.get(movie_id)
-    if not movie:
-        return jsonify({'error': 'Movie not found'}), 404
+    """SSE endpoint — starts the pipeline job if needed and streams its progress.
 
-    def generate():
-        try:
-            # Cleanup
-            yield f"data: {json.dumps({'step': 'cleanup', 'message': 'Preparing workspace...', 'progress': 5})}\n\n"
-            cleanup_dirs()
-
-            # Shard
-            yield f"data: {json.dumps({'step': 'sharding', 'message': 'Splitting video into shards...', 'progress': 15})}\n\n"
-            num_shards = shard_video(movie['file_path'])
-            audit_log('SHARD', {'movie_id': movie_id, 'shards': num_shards})
-            yield f"data: {json.dumps({'step': 'sharding_done', 'message': f'Created {num_shards} shards', 'progress': 40})}\n\n"
-
-            # Encrypt
-            yield f"data: {json.dumps({'step': 'encrypting', 'message': 'Encrypting shards with AES...', 'progress': 55})}\n\n"
-            key = encrypt_shards()
-            movie['key'] = key.decode()
-            audit_log('ENCRYPT', {'movie_id': movie_id})
-            yield f"data: {json.dumps({'step': 'encrypting_done', 'message': 'All shards encrypted', 'progress': 75})}\n\n"
-
-            # Manifest
-            yield f"data: {json.dumps({'step': 'manifest', 'message': 'Generating secure manifest...', 'progress': 85})}\n\n"
-            theatre_id = movie.get('theatre_id', 'THEATRE_001')
-            manifest = generate_manifest(theatre_id=theatre_id)
-            audit_log('MANIFEST', {'movie_id': movie_id, 'theatre_id': theatre_id, 'shards': len(manifest['shards'])})
-            yield f"data: {json.dumps({'step': 'manifest_done', 'message': 'Manifest created with SHA-256 hashes', 'progress': 92})}\n\n"
-
-            # Cleanup uploaded file
-            if os.path.exists(movie['file_path']):
-                os.remove(movie['file_path'])
-
-            movie['status'] = 'ready'
-
-            # Add to history
-            upload_history.append({
-                'movie_id': movie_id,
-                'name': movie['name'],
-                'theatre_id': theatre_id,
-                'shards': len(manifest['shards']),
-                'processed_at': datetime.now(timezone.utc).isoformat(),
-                'key': movie['key']
-            })
+    The job runs in the background queue; disconnecting only ends this
+    subscription. EventSource reconnects resume from Last-Event-ID.
+    """
+    job_id, error = ensure_job(movie_id)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
 
-            audit_log('PIPELINE_COMPLETE', {'movie_id': movie_id})
-            yield f"data: {json.dumps({'step': 'done', 'message': 'Pipeline complete!', 'progress': 100, 'key': movie['key'], 'shards': len(manifest['shards'])})}\n\n"
+    last_id = request.headers.get('Last-Event-ID', request.args.get('since'))
+    since = int(last_id) + 1 if last_id and last_id.isdigit() else 0
 
-        except Exception as e:
-            movie['status'] = 'error'
-            yield f"data: {json.dumps({'step': 'error', 'message': str(e), 'progress': 0})}\n\n"
+    def generate():
+        for index, event in jobs.subscribe(job_id, since=since):
+            yield format_sse(index, event)
 
     return Response(
-        stream_with_context(generate()),
+        generate(),
         mimetype='text/event-stream',
         headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
     )
 
 
+@app.route('/api/jobs')
+def list_jobs():
+    """Recent pipeline jobs, newest first."""
+    return jsonify(jobs.list())
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/movies/<movie_id>/revoke', methods=['POST'])
+def revoke_movie(movie_id):
+    """Withdraw a movie: its key stops authenticating and open sessions end now."""
+    movie = catalog.get(movie_id)
+    if not movie:
+        return jsonify({'error': 'Movie not found'}), 404
+
+    catalog.update(movie_id, status='revoked')
+    with recent_keys_lock:
+        recent_keys.pop(movie_id, None)
+    tokens = [token for token, info in sessions.items() if info['movie_id'] == movie_id]
+    for token in tokens:
+        end_session(token, 'revoked', 'The producer has withdrawn this movie')
+    audit_log('REVOKE', {'movie_id': movie_id, 'theatre_id': movie['theatre_id'], 'sessions': len(tokens)})
+    refresh_status_feeds()
+    return jsonify({'success': True, 'sessions': len(tokens)})
+
+
 # ═══════════════════════════════════════════
 # THEATRE API
 # ═══════════════════════════════════════════
@@ -389,20 +1133,29 @@ def authenticate():
     """Validate the decryption key and prepare the video for streaming."""
     data = request.get_json()
     key = data.get('key', '').strip()
+    movie_id = (data.get('movie_id') or '').strip()
+    theatre_id = (data.get('theatre_id') or '').strip().upper() or None
 
     if not key:
         return jsonify({'error': 'Decryption key is required'}), 400
 
-    if not os.path.exists(MANIFEST_PATH):
+    if movie_id:
+        movie = catalog.get(movie_id)
+        candidates = [movie] if movie and movie['status'] == 'ready' else []
+    else:
+        candidates = catalog.list(theatre_id=theatre_id, status='ready')
+    if not candidates:
         return jsonify({'error': 'No movie available. Ask the producer to upload first.'}), 404
 
     try:
-        manifest = load_manifest()
+        movie, cached_manifest = match_key(key, candidates)
+        if not movie:
+            raise InvalidShardKey('Key does not match any available movie')
+        movie_id = movie['movie_id']
+        manifest = cached_manifest.manifest
 
         # Check playback window
-        window = manifest['playback_window']
-        start = parse_iso(window['start'])
-        end = parse_iso(window['end'])
+        start, end = cached_manifest.start, cached_manifest.end
         now = datetime.now(timezone.utc)
 
         if now < start:
@@ -412,46 +1165,61 @@ def authenticate():
         if now > end:
             return jsonify({'error': 'Playback window has expired. Contact producer.'}), 403
 
-        # Validate key by decrypting the first shard
-        fernet = Fernet(key.encode())
-        first_shard = manifest['shards'][0]
-        enc_path = os.path.join(ENCRYPTED_DIR, first_shard['id'])
-        with open(enc_path, 'rb') as f:
-            fernet.decrypt(f.read())
+        if len(sessions) >= MAX_SESSIONS:
+            return jsonify({'error': 'Too many active playback sessions. Try again later.'}), 503
 
-        # Prepare concatenated video
         token = uuid.uuid4().hex
-        output_path = os.path.join(TEMP_DIR, f'{token}.mp4')
-        prepare_video(key, output_path)
-        prepared_videos[token] = {
-            'filepath': output_path,
+        info = {
+            'mode': 'stream',
+            'movie_id': movie_id,
+            'key': key,
             'expires': end.isoformat()
         }
-
-        # Purge old prepared videos
-        for old_token in list(prepared_videos.keys()):
-            if old_token != token:
-                old_info = prepared_videos.pop(old_token, None)
-                if old_info and os.path.exists(old_info['filepath']):
-                    os.remove(old_info['filepath'])
-
+        if not (PLAYBACK_MODE == 'stream' and is_streamable(manifest)):
+            # Prepare (or reuse) the concatenated video shared by all
+            # sessions of this movie build; streaming sessions decrypt
+            # shards on demand in /api/stream instead
+            info['mode'] = 'prepare'
+            info['filepath'] = prepared_cache.acquire(
+                token, movie_id,
+                cached_manifest.sha256,
+                end,
+                lambda path: prepare_video(movie_id, key, path)
+            )
+        if not sessions.add(token, info):
+            prepared_cache.release(token)
+            return jsonify({'error': 'Too many active playback sessions. Try again later.'}), 503
+
+        schedule_session(token)
         time_remaining = max(0, int((end - now).total_seconds() / 60))
 
         audit_log('PLAYBACK_AUTH', {
+            'movie_id': movie_id,
             'theatre_id': manifest['theatre_id'],
             'time_remaining_min': time_remaining
         })
 
-        return jsonify({
+        response = {
             'success': True,
             'token': token,
+            'stream_url': f'/api/stream/{token}',
+            'events_url': f'/api/events?token={token}',
             'movie_info': {
+                'movie_id': movie_id,
+                'name': movie['name'],
                 'shards': len(manifest['shards']),
                 'theatre_id': manifest['theatre_id'],
                 'time_remaining': f'{time_remaining} min',
                 'window_end': end.isoformat()
             }
-        })
+        }
+        if info['mode'] == 'stream' and has_playlist(manifest):
+            response['hls_url'] = f'/api/hls/{token}/playlist.m3u8'
+        return jsonify(response)
+
+    except InvalidShardKey as e:
+        audit_log('PLAYBACK_FAILED', {'error': str(e)})
+        return jsonify({'error': 'Invalid decryption key'}), 401
 
     except Exception as e:
         err = str(e)
@@ -461,59 +1229,303 @@ def authenticate():
         return jsonify({'error': f'Decryption failed: {err}'}), 500
 
 
+def key_fingerprint(key):
+    """Keyed digest identifying a key in memory without holding the key."""
+    return hmac.new(KEY_FINGERPRINT_SECRET, key.encode(), hashlib.sha256).hexdigest()
+
+
+def key_opens_movie(key, movie_id, manifest):
+    """Check a key against one movie.
+
+    Uses the manifest's key-check value when present; older manifests fall
+    back to decrypting the first chunk of the smallest shard.
+    """
+    if manifest.get('key_check'):
+        return verify_key_check(key, movie_id, manifest['key_check'])
+    first_shard = manifest.get('init') or manifest['shards'][0]
+    enc_path = catalog.part_path(movie_id, first_shard)
+    try:
+        with open_shard(enc_path, part_key(key, first_shard)) as reader:
+            reader.read_chunk(0)
+    except InvalidShardKey:
+        return False
+    return True
+
+
+def match_key(key, candidates):
+    """Find the candidate movie the key belongs to.
+
+    Recently validated keys are answered from ``validated_keys`` as long as
+    the movie's manifest is unchanged. Returns ``(movie, cached_manifest)``
+    (see manifest_cache), or ``(None, None)`` if none matches.
+    """
+    fingerprint = key_fingerprint(key)
+    with validated_keys_lock:
+        cached = validated_keys.get(fingerprint)
+    if cached:
+        movie = next((m for m in candidates if m['movie_id'] == cached['movie_id']), None)
+        if movie:
+            entry = manifests.get(movie['movie_id'])
+            if entry.manifest.get('created_at') == cached['created_at']:
+                with validated_keys_lock:
+                    if fingerprint in validated_keys:
+                        validated_keys.move_to_end(fingerprint)
+                return movie, entry
+
+    for movie in candidates:
+        entry = manifests.get(movie['movie_id'])
+        if key_opens_movie(key, movie['movie_id'], entry.manifest):
+            with validated_keys_lock:
+                validated_keys[fingerprint] = {
+                    'movie_id': movie['movie_id'],
+                    'created_at': entry.manifest.get('created_at')
+                }
+                validated_keys.move_to_end(fingerprint)
+                while len(validated_keys) > KEY_CACHE_SIZE:
+                    validated_keys.popitem(last=False)
+            return movie, entry
+    return None, None
+
+
+def get_session(token):
+    """Look up a playback session, expiring it if its window has ended.
+
+    Returns ``(info, None)`` or ``(None, error_response)``.
+    """
+    info = sessions.get(token)
+    if not info:
+        return None, ('Video not found or session expired', 404)
+
+    # Normally ended by its timer; this covers the last tick's slack
+    expires = parse_iso(info['expires'])
+    if datetime.now(timezone.utc) > expires:
+        end_session(token, 'expired', 'Playback window ended')
+        return None, ('Playback window expired', 403)
+
+    if info['mode'] != 'stream' and not os.path.exists(info.get('filepath') or ''):
+        # Prepared files do not outlive the process; rebuild for a session
+        # restored after a restart
+        try:
+            filepath = prepared_cache.acquire(
+                token, info['movie_id'],
+                manifests.get(info['movie_id']).sha256,
+                expires,
+                lambda path: prepare_video(info['movie_id'], info['key'], path)
+            )
+        except Exception:
+            return None, ('Video not found or session expired', 404)
+        info = sessions.update(token, filepath=filepath) or info
+
+    return info, None
+
+
+def byte_span(byte_range, total):
+    """Resolve a parsed Range header against a ``total``-byte body.
+
+    Returns ``(start, end, status, headers)`` (end inclusive; 200 for the
+    whole body, 206 for a single satisfiable range), or None when the range
+    cannot be satisfied (416).
+    """
+    start, end = 0, total - 1
+    status = 200
+    if byte_range and byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+        span = byte_range.range_for_length(total)
+        if span is None:
+            return None
+        start, end = span[0], span[1] - 1
+        status = 206
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Content-Length': str(end - start + 1),
+        'Cache-Control': 'no-store'
+    }
+    if status == 206:
+        headers['Content-Range'] = f'bytes {start}-{end}/{total}'
+    return start, end, status, headers
+
+
 @app.route('/api/stream/<token>')
 def stream_video(token):
-    """Serve the prepared video with byte-range support for seeking."""
-    info = prepared_videos.get(token)
-    if not info or not os.path.exists(info['filepath']):
-        return 'Video not found or session expired', 404
+    """Serve the video with byte-range support for seeking.
+
+    Prepared sessions are served from disk; streaming sessions decrypt only
+    the shards covering the requested range.
+    """
+    info, error = get_session(token)
+    if error:
+        return error
+    streaming = info['mode'] == 'stream'
+
+    if not streaming:
+        response = send_file(info['filepath'], mimetype='video/mp4', conditional=True)
+        metrics.inc('stream_bytes_total', response.content_length or 0, mode='prepare')
+        return response
+
+    manifest = load_manifest(info['movie_id'])
+    parts = stream_parts(manifest)
+    total = sum(part['size'] for part in parts)
+    span = byte_span(request.range, total)
+    if span is None:
+        return Response(status=416, headers={'Content-Range': f'bytes */{total}'})
+    start, end, status, headers = span
 
-    # Check if session expired
-    if info.get('expires'):
-        expires = parse_iso(info['expires'])
-        if datetime.now(timezone.utc) > expires:
-            # Cleanup
-            if os.path.exists(info['filepath']):
-                os.remove(info['filepath'])
-            prepared_videos.pop(token, None)
-            audit_log('STREAM_EXPIRED', {'token': token[:8]})
-            return 'Playback window expired', 403
-
-    return send_file(info['filepath'], mimetype='video/mp4', conditional=True)
+    return Response(
+        generate_stream(
+            info['movie_id'], info['key'], parts, start, end,
+            manifest_verifier(manifest, info['key'])
+        ),
+        status=status,
+        mimetype='video/mp4',
+        headers=headers
+    )
 
 
-@app.route('/api/status')
-def system_status():
-    """Check whether a movie is ready for playback."""
-    has_manifest = os.path.exists(MANIFEST_PATH)
-    has_shards = (
-        os.path.exists(ENCRYPTED_DIR)
-        and any(f.endswith('.enc') for f in os.listdir(ENCRYPTED_DIR))
+@app.route('/api/hls/<token>/playlist.m3u8')
+def hls_playlist(token):
+    """HLS playlist for a streaming session, pointing at token-scoped segments."""
+    info, error = get_session(token)
+    if error:
+        return error
+    manifest = load_manifest(info['movie_id'])
+    if info['mode'] != 'stream' or not has_playlist(manifest):
+        return 'HLS not available for this session', 404
+
+    playlist = build_playlist(
+        manifest,
+        f'/api/hls/{token}/init.mp4',
+        lambda index, shard: f'/api/hls/{token}/{index}.m4s'
+    )
+    return Response(
+        playlist,
+        mimetype='application/vnd.apple.mpegurl',
+        headers={'Cache-Control': 'no-store'}
     )
 
-    if has_manifest and has_shards:
-        manifest = load_manifest()
-        window = manifest['playback_window']
-        start = parse_iso(window['start'])
-        end = parse_iso(window['end'])
-        now = datetime.now(timezone.utc)
 
-        return jsonify({
-            'ready': True,
+@app.route('/api/hls/<token>/init.mp4')
+@app.route('/api/hls/<token>/<int:index>.m4s')
+def hls_segment(token, index=None):
+    """Decrypt and serve a single HLS segment (or the init segment) on demand."""
+    info, error = get_session(token)
+    if error:
+        return error
+    manifest = load_manifest(info['movie_id'])
+    if info['mode'] != 'stream' or not is_streamable(manifest):
+        return 'HLS not available for this session', 404
+
+    if index is None:
+        part = manifest['init']
+    elif index < len(manifest['shards']):
+        part = manifest['shards'][index]
+    else:
+        return 'Segment not found', 404
+
+    data = decrypt_part(info['movie_id'], info['key'], part, manifest_verifier(manifest, info['key']))
+    metrics.inc('stream_bytes_total', len(data), mode='hls')
+    return Response(data, mimetype='video/mp4', headers={'Cache-Control': 'no-store'})
+
+
+def build_status(theatre_id):
+    """Render the /api/status payload for one theatre filter.
+
+    Returns the cache entry: the JSON body, its ETag, and what it was
+    derived from (catalog version, manifest generation, the time the next
+    playback window opens or closes).
+    """
+    now = datetime.now(timezone.utc)
+    catalog_version = catalog.version
+    ready, movie_ids, boundaries = [], [], []
+    for movie in catalog.list(theatre_id=theatre_id, status='ready'):
+        try:
+            cached_manifest = manifests.get(movie['movie_id'])
+        except (IOError, ValueError, KeyError):
+            continue
+        manifest = cached_manifest.manifest
+        movie_ids.append(movie['movie_id'])
+        # playback_active flips at start and just after end
+        boundaries += [t for t in (cached_manifest.start, cached_manifest.end + timedelta(microseconds=1)) if t > now]
+        ready.append({
+            'movie_id': movie['movie_id'],
+            'name': movie['name'],
             'shards': len(manifest['shards']),
             'theatre_id': manifest['theatre_id'],
-            'playback_active': start <= now <= end,
-            'playback_start': window['start'],
-            'playback_end': window['end']
+            'playback_active': cached_manifest.is_active(now),
+            'playback_start': manifest['playback_window']['start'],
+            'playback_end': manifest['playback_window']['end']
         })
 
-    return jsonify({'ready': False})
+    if ready:
+        current = next((m for m in ready if m['playback_active']), ready[0])
+        payload = dict(current, ready=True, movies=ready)
+    else:
+        payload = {'ready': False, 'movies': []}
+    body = json.dumps(payload, sort_keys=True).encode()
+    return {
+        'body': body,
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+        'catalog_version': catalog_version,
+        'manifest_generation': manifests.generation,
+        'movie_ids': movie_ids,
+        'valid_until': min(boundaries, default=datetime.max.replace(tzinfo=timezone.utc)),
+        'checked': time.monotonic()
+    }
+
+
+def status_payload(theatre_id):
+    """Cached /api/status payload, rebuilt only when something behind it changed.
+
+    A payload stays valid while the catalog index is unchanged and no
+    playback window has opened or closed since it was built; every
+    STATUS_RECHECK_SECONDS its manifests are also re-checked on disk.
+    """
+    with status_cache_lock:
+        entry = status_cache.get(theatre_id)
+    if (entry and entry['catalog_version'] == catalog.version
+            and datetime.now(timezone.utc) < entry['valid_until']):
+        if time.monotonic() - entry['checked'] < STATUS_RECHECK_SECONDS:
+            metrics.inc('status_cache_total', result='hit')
+            return entry
+        try:
+            for movie_id in entry['movie_ids']:
+                manifests.get(movie_id)
+            unchanged = manifests.generation == entry['manifest_generation']
+        except (IOError, ValueError, KeyError):
+            unchanged = False
+        if unchanged:
+            entry['checked'] = time.monotonic()
+            metrics.inc('status_cache_total', result='hit')
+            return entry
+
+    metrics.inc('status_cache_total', result='rebuild')
+    entry = build_status(theatre_id)
+    with status_cache_lock:
+        status_cache[theatre_id] = entry
+        status_cache.move_to_end(theatre_id)
+        while len(status_cache) > STATUS_CACHE_SIZE:
+            status_cache.popitem(last=False)
+    return entry
+
+
+@app.route('/api/status')
+def system_status():
+    """List the movies ready for playback, optionally for one theatre.
+
+    The top-level fields describe the newest movie whose window is open
+    (or the newest movie, if none is open). Served from a precomputed
+    payload; clients revalidating with If-None-Match get a 304.
+    """
+    theatre_id = request.args.get('theatre_id', '').strip().upper() or None
+    entry = status_payload(theatre_id)
+    response = Response(entry['body'], mimetype='application/json', headers={'Cache-Control': 'no-cache'})
+    response.set_etag(entry['etag'])
+    return response.make_conditional(request)
 
 
 @app.route('/api/check-expiry/<token>')
 def check_expiry(token):
     """Check if a playback token has expired."""
-    info = prepared_videos.get(token)
+    info = sessions.get(token)
     if not info:
         return jsonify({'expired': True, 'reason': 'Session not found'})
 
@@ -530,21 +1542,294 @@ def check_expiry(token):
 
 @app.route('/api/history')
 def get_history():
-    """Return upload processing history."""
-    return jsonify(upload_history[::-1])  # newest first
+    """Return upload processing history (the last HISTORY_SIZE processed movies).
+
+    Only movies still playable are listed (not revoked, window not over).
+    Keys are included only for movies processed since this process started.
+    """
+    processed = sorted(
+        (m for m in catalog.list(status='ready') if m.get('processed_at')),
+        key=lambda m: m['processed_at'], reverse=True
+    )
+    now = datetime.now(timezone.utc)
+    history = []
+    for movie in processed[:HISTORY_SIZE]:
+        try:
+            if manifests.get(movie['movie_id']).end < now:
+                continue
+        except (OSError, ValueError, KeyError):
+            continue
+        with recent_keys_lock:
+            key = recent_keys.get(movie['movie_id'])
+        history.append({
+            'movie_id': movie['movie_id'],
+            'name': movie['name'],
+            'theatre_id': movie['theatre_id'],
+            'shards': movie.get('shards'),
+            'status': movie['status'],
+            'processed_at': movie['processed_at'],
+            'key': key
+        })
+    return jsonify(history)  # newest first
 
 
 @app.route('/api/audit-log')
 def get_audit_log():
-    """Return audit trail."""
-    if not os.path.exists(AUDIT_LOG_PATH):
-        return jsonify([])
-    with open(AUDIT_LOG_PATH, 'r') as f:
-        log = json.load(f)
-    return jsonify(log[::-1])  # newest first
+    """Return audit trail, newest first.
+
+    Filters: action (comma-separated), movie_id, theatre_id, since/until
+    (ISO-8601). Paging: limit (max 1000), offset; X-Next-Offset is set
+    when more entries follow.
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', 100)), 1), 1000)
+        offset = max(int(args.get('offset', 0)), 0)
+        entries, more = audit.query(
+            actions=[a for a in args.get('action', '').split(',') if a] or None,
+            movie_id=args.get('movie_id'),
+            theatre_id=args.get('theatre_id'),
+            since=args.get('since'),
+            until=args.get('until'),
+            limit=limit,
+            offset=offset
+        )
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+    response = jsonify(entries)
+    if more:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response
 
 
 # ═══════════════════════════════════════════
+# THEATRE PUSH EVENTS
+# ═══════════════════════════════════════════
+#
+# One SSE channel per theatre screen replaces polling /api/status and
+# /api/check-expiry. Each playback session has a single pending timer on
+# the wheel: it pushes the remaining time and reschedules itself, and the
+# last one ends the session the moment its window closes.
+
+def session_topic(token):
+    return f'session:{token}'
+
+
+def end_session(token, event_type, message):
+    """End a playback session now and tell its screen why ('expired' or 'revoked')."""
+    info = sessions.pop(token)
+    timer = session_timers.pop(token, None)
+    if timer:
+        timer.cancel()
+    if info is None:
+        return
+    if info.get('mode') != 'stream':
+        prepared_cache.release(token)
+        prepared_cache.sweep()
+    audit_log('STREAM_EXPIRED' if event_type == 'expired' else 'STREAM_REVOKED', {
+        'token': token[:8],
+        'movie_id': info['movie_id']
+    })
+    topic = session_topic(token)
+    channels.publish(topic, {'type': event_type, 'message': message}, close=True)
+    # Keep the final event around for screens that are reconnecting
+    timer_wheel.schedule(SESSION_UPDATE_SECONDS, lambda: channels.discard(topic))
+
+
+def schedule_session(token):
+    """Push a session's remaining time and schedule its next update."""
+    info = sessions.get(token)
+    if not info:
+        return
+    remaining = (parse_iso(info['expires']) - datetime.now(timezone.utc)).total_seconds()
+    if remaining <= 0:
+        end_session(token, 'expired', 'Playback window ended')
+        return
+    channels.publish(session_topic(token), {'type': 'remaining', 'remaining_seconds': int(remaining)})
+    session_timers[token] = timer_wheel.schedule(
+        min(SESSION_UPDATE_SECONDS, remaining), lambda: schedule_session(token)
+    )
+
+
+def push_status(theatre_id, start=False):
+    """Publish a theatre's status if it changed and schedule the next check.
+
+    The next check is when a playback window opens or closes, or after
+    STATUS_PUSH_SECONDS at the latest. Feeds nobody listens to are dropped
+    (``start`` creates one for a new subscriber).
+    """
+    topic = f'status:{theatre_id or "*"}'
+    with status_feeds_lock:
+        feed = status_feeds.get(theatre_id)
+        if feed is None:
+            if not start:
+                return topic
+            feed = status_feeds[theatre_id] = {'timer': None, 'etag': None}
+        elif start:
+            return topic   # already running
+        else:
+            feed['timer'].cancel()
+            if not channels.subscribers(topic):
+                del status_feeds[theatre_id]
+                channels.discard(topic)
+                return topic
+
+        entry = status_payload(theatre_id)
+        if entry['etag'] != feed['etag']:
+            feed['etag'] = entry['etag']
+            channels.publish(topic, dict(json.loads(entry['body']), type='status'))
+        delay = (entry['valid_until'] - datetime.now(timezone.utc)).total_seconds()
+        feed['timer'] = timer_wheel.schedule(
+            max(0, min(STATUS_PUSH_SECONDS, delay)), lambda: push_status(theatre_id)
+        )
+    return topic
+
+
+def refresh_status_feeds():
+    """Re-check every status feed now (after a catalog change)."""
+    with status_feeds_lock:
+        subscribed = list(status_feeds)
+    for theatre_id in subscribed:
+        push_status(theatre_id)
+
+
+def sweep_sessions():
+    """End sessions whose window closed without their timer firing and
+    delete prepared files that nothing uses; runs every SESSION_SWEEP_SECONDS."""
+    try:
+        for token in sessions.expired():
+            end_session(token, 'expired', 'Playback window ended')
+        prepared_cache.sweep()
+        prepared_cache.remove_orphans()
+    finally:
+        timer_wheel.schedule(SESSION_SWEEP_SECONDS, sweep_sessions)
+
+
+def restore_sessions():
+    """Resume sessions persisted by a previous process.
+
+    Their keys are reloaded from the catalog (they are never written to the
+    session database), and prepared files are rebuilt on first use.
+    """
+    for token, info in sessions.items():
+        movie = catalog.get(info['movie_id'])
+        try:
+            if not movie or movie['status'] != 'ready':
+                raise FileNotFoundError(info['movie_id'])
+            sessions.update(token, key=catalog.load_key(info['movie_id']).decode())
+        except FileNotFoundError:
+            end_session(token, 'revoked', 'The movie is no longer available')
+            continue
+        schedule_session(token)
+
+
+SESSION_NOT_FOUND = {'type': 'expired', 'message': 'Session not found'}
+
+
+def events_topic(token=None, theatre_id=None):
+    """Channel topic behind /api/events, or None for an unknown session."""
+    if token:
+        topic = session_topic(token)
+        return topic if token in sessions or channels.exists(topic) else None
+    return push_status((theatre_id or '').strip().upper() or None, start=True)
+
+
+@app.route('/api/events')
+def theatre_events():
+    """SSE channel of a theatre screen.
+
+    Without a token: 'status' events carrying the /api/status payload,
+    whenever it changes (a movie becomes ready or is revoked, a window
+    opens or closes). With ``token`` of a playback session: 'remaining'
+    every SESSION_UPDATE_SECONDS, then one 'expired' or 'revoked' event
+    that ends the channel. Resumes from Last-Event-ID.
+    """
+    last_id = request.headers.get('Last-Event-ID')
+    since = int(last_id) + 1 if last_id and last_id.isdigit() else None
+
+    topic = events_topic(request.args.get('token'), request.args.get('theatre_id'))
+    if topic is None:
+        events = iter([(0, SESSION_NOT_FOUND)])
+    else:
+        events = channels.subscribe(topic, since=since)
+
+    def generate():
+        for index, event in events:
+            yield format_sse(index, event)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# ═══════════════════════════════════════════
+# METRICS
+# ═══════════════════════════════════════════
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    """Count and time every API request by route.
+
+    Streamed bodies (SSE, /api/stream) are timed up to their first byte;
+    their volume is counted by the stream itself.
+    """
+    endpoint = request.endpoint or 'unmatched'
+    if endpoint != 'static' and 'request_started' in g:
+        metrics.observe('http_request_seconds', time.perf_counter() - g.request_started, endpoint=endpoint)
+        metrics.inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition; ``?format=json`` for a JSON snapshot."""
+    if request.args.get('format') == 'json':
+        return jsonify(metrics.snapshot())
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# ═══════════════════════════════════════════
+# STARTUP
+# ═══════════════════════════════════════════
+
+startup_done = False
+
+
+def startup():
+    """Take over the state left by the previous server process.
+
+    Called by whatever serves the app (``python app.py``, asgi.py), never on
+    import: tools that import this module (benchmarks, pool workers) must
+    not touch live jobs, sessions or temp files. Safe to call twice.
+    """
+    global startup_done
+    if startup_done:
+        return
+    startup_done = True
+
+    atexit.register(lambda: shutil.rmtree(TEMP_DIR, ignore_errors=True))
+
+    # Movies whose job died with the last process go back to 'uploaded'
+    # (or 'error' if the upload is gone) so they can re-run
+    for stale_job in jobs.recover():
+        stale_movie = catalog.get(stale_job['movie_id'])
+        if stale_movie and stale_movie['status'] == 'processing':
+            uploaded = os.path.exists(stale_movie.get('file_path', ''))
+            catalog.update(stale_movie['movie_id'], status='uploaded' if uploaded else 'error')
+
+    # Restored sessions rebuild their prepared files on first use
+    prepared_cache.remove_stale()
+    restore_sessions()
+    sweep_sessions()
+
 
 if __name__ == '__main__':
     print('\n  \033[33m🎬  CinemaShield\033[0m')
@@ -553,4 +1838,8 @@ if __name__ == '__main__':
     print('  Producer : http://localhost:5000/producer')
     print('  Theatre  : http://localhost:5000/theatre')
     print('  ─────────────────────────────────\n')
+    # The debug reloader re-runs this file in a child that does the serving;
+    # the watching parent must not sweep or restore anything
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        startup()
     app.run(debug=True, threaded=True, port=5000)
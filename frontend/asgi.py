@@ -0,0 +1,322 @@
+"""ASGI entry point: long-lived responses without a thread each.
+
+Under Flask's threaded server every open /api/stream response and every
+SSE subscriber holds a server thread for as long as it stays connected.
+This module serves those routes on an asyncio loop instead and hands every
+other request to the Flask app unchanged:
+
+- /api/stream/<token>: prepared files go out through the server's zero-copy
+  extension (sendfile) when it offers one, otherwise in chunks read off the
+  loop. Streamed sessions decrypt one chunk at a time on a small thread
+  pool, so a thread is only busy while a chunk is being produced, not while
+  the client reads it.
+- /api/process/<movie_id> and /api/events: SSE fed by the async subscribers
+  of JobQueue and Channels; an idle connection is a pending future.
+- /api/status: the precomputed payload, revalidated with If-None-Match.
+
+ffmpeg never runs inside these requests (the pipeline runs in the job
+queue), apart from rebuilding a prepared file for a session restored after
+a restart, which happens on the thread pool.
+
+Run with an ASGI server that sends lifespan events (app.startup() runs on
+lifespan startup), e.g.
+
+    uvicorn asgi:application --app-dir frontend --port 5000
+
+Needs asgiref (for the Flask fallback) besides the server.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.http import parse_etags, parse_range_header, quote_etag
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError as e:
+    raise ImportError('The ASGI server needs asgiref: pip install asgiref uvicorn') from e
+
+import app as cinema
+from jobs import format_sse
+
+# Threads that decrypt chunks and read files for the loop; bounds the work
+# in flight, not the number of connections
+STREAM_WORKERS = 32
+FILE_CHUNK_SIZE = 256 * 1024
+
+SSE_HEADERS = {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+executor = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix='asgi-stream')
+flask_app = WsgiToAsgi(cinema.app)
+
+
+def run_sync(func, *args):
+    return asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+class Request:
+    """The parts of an HTTP scope the native routes use, plus a watch on
+    the client disconnecting."""
+
+    def __init__(self, scope, receive, send, endpoint):
+        self.scope = scope
+        self.endpoint = endpoint
+        self.method = scope['method']
+        self.headers = {
+            name.decode('latin-1'): value.decode('latin-1')
+            for name, value in scope['headers']
+        }
+        self.args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        self.disconnected = asyncio.Event()
+        self.send = send
+        self._receive = receive
+        self._started = time.perf_counter()
+        self._watcher = asyncio.ensure_future(self._watch())
+
+    async def _watch(self):
+        while True:
+            message = await self._receive()
+            if message['type'] == 'http.disconnect':
+                self.disconnected.set()
+                return
+
+    async def start(self, status, headers):
+        """Send the status line and headers; timed like Flask's record_request."""
+        cinema.metrics.observe('http_request_seconds', time.perf_counter() - self._started, endpoint=self.endpoint)
+        cinema.metrics.inc('http_requests_total', endpoint=self.endpoint, method=self.method, status=status)
+        await self.send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (name.lower().encode('latin-1'), str(value).encode('latin-1'))
+                for name, value in headers.items()
+            ]
+        })
+
+    async def body(self, data, more=False):
+        await self.send({'type': 'http.response.body', 'body': data, 'more_body': more})
+
+    async def respond(self, status, body=b'', headers=None, content_type='text/html; charset=utf-8'):
+        headers = dict(headers or {})
+        if body or status not in (204, 304):
+            headers.setdefault('Content-Type', content_type)
+            headers['Content-Length'] = len(body)
+        await self.start(status, headers)
+        await self.body(body)
+
+    async def next_or_disconnect(self, events):
+        """The next item of an async iterator; None once the client is gone."""
+        step = asyncio.ensure_future(events.__anext__())
+        gone = asyncio.ensure_future(self.disconnected.wait())
+        try:
+            await asyncio.wait((step, gone), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            gone.cancel()
+        if not step.done():
+            step.cancel()
+            # Let the iterator unwind before anyone closes it
+            await asyncio.wait((step,))
+            return None
+        return step.result()
+
+    def close(self):
+        self._watcher.cancel()
+
+
+# ═══════════════════════════════════════════
+# NATIVE ROUTES
+# ═══════════════════════════════════════════
+
+async def stream_video(request, token):
+    """Async counterpart of app.stream_video."""
+    info, error = await run_sync(cinema.get_session, token)
+    if error:
+        await request.respond(error[1], error[0].encode())
+        return
+
+    if info['mode'] == 'stream':
+        await send_decrypted(request, info)
+    else:
+        await send_prepared(request, info['filepath'])
+
+
+async def send_decrypted(request, info):
+    manifest = await run_sync(cinema.load_manifest, info['movie_id'])
+    parts = cinema.stream_parts(manifest)
+    total = sum(part['size'] for part in parts)
+    span = cinema.byte_span(parse_range_header(request.headers.get('range')), total)
+    if span is None:
+        await request.respond(416, headers={'Content-Range': f'bytes */{total}'})
+        return
+    start, end, status, headers = span
+
+    chunks = cinema.generate_stream(
+        info['movie_id'], info['key'], parts, start, end,
+        cinema.manifest_verifier(manifest, info['key'])
+    )
+    await request.start(status, dict(headers, **{'Content-Type': 'video/mp4'}))
+    step = None
+    try:
+        while not request.disconnected.is_set():
+            step = executor.submit(next, chunks, None)
+            chunk = await asyncio.wrap_future(step)
+            if chunk is None:
+                break
+            await request.body(chunk, more=True)
+        await request.body(b'')
+    finally:
+        # Runs generate_stream's cleanup (and its byte count) right away,
+        # unless the request was cancelled while a worker is still inside
+        # next(): closing a running generator raises ValueError, so that
+        # worker closes it once next() returns
+        if step is None or step.done():
+            chunks.close()
+        else:
+            step.add_done_callback(lambda _: chunks.close())
+
+
+async def send_prepared(request, path):
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        await request.respond(404, b'Video not found or session expired')
+        return
+    span = cinema.byte_span(parse_range_header(request.headers.get('range')), size)
+    if span is None:
+        await request.respond(416, headers={'Content-Range': f'bytes */{size}'})
+        return
+    start, end, status, headers = span
+    length = end - start + 1
+
+    with open(path, 'rb') as f:
+        await request.start(status, dict(headers, **{'Content-Type': 'video/mp4'}))
+        sent = 0
+        try:
+            if 'http.response.zerocopysend' in request.scope.get('extensions', {}):
+                await request.send({
+                    'type': 'http.response.zerocopysend',
+                    'file': f,
+                    'offset': start,
+                    'count': length
+                })
+                sent = length
+                return
+            while sent < length and not request.disconnected.is_set():
+                data = await run_sync(os.pread, f.fileno(), min(FILE_CHUNK_SIZE, length - sent), start + sent)
+                if not data:
+                    break
+                sent += len(data)
+                await request.body(data, more=True)
+            await request.body(b'')
+        finally:
+            cinema.metrics.inc('stream_bytes_total', sent, mode='prepare')
+
+
+async def send_events(request, events):
+    """Relay ``(index, event)`` pairs as SSE until they end or the client leaves."""
+    await request.start(200, SSE_HEADERS)
+    try:
+        while True:
+            try:
+                item = await request.next_or_disconnect(events)
+            except StopAsyncIteration:
+                break
+            if item is None:
+                return
+            await request.body(format_sse(*item).encode(), more=True)
+        await request.body(b'')
+    finally:
+        await events.aclose()
+
+
+async def process_movie(request, movie_id):
+    """Async counterpart of app.process_movie."""
+    job_id, error = await run_sync(cinema.ensure_job, movie_id)
+    if error:
+        body = json.dumps({'error': error[0]}).encode()
+        await request.respond(error[1], body, content_type='application/json')
+        return
+
+    last_id = request.headers.get('last-event-id', request.args.get('since'))
+    since = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+    await send_events(request, cinema.jobs.subscribe_async(job_id, since=since))
+
+
+async def single_event(index, event):
+    yield index, event
+
+
+async def theatre_events(request):
+    """Async counterpart of app.theatre_events."""
+    last_id = request.headers.get('last-event-id')
+    since = int(last_id) + 1 if last_id and last_id.isdigit() else None
+
+    topic = await run_sync(cinema.events_topic, request.args.get('token'), request.args.get('theatre_id'))
+    if topic is None:
+        events = single_event(0, cinema.SESSION_NOT_FOUND)
+    else:
+        events = cinema.channels.subscribe_async(topic, since=since)
+    await send_events(request, events)
+
+
+async def system_status(request):
+    """Async counterpart of app.system_status."""
+    theatre_id = request.args.get('theatre_id', '').strip().upper() or None
+    entry = await run_sync(cinema.status_payload, theatre_id)
+    headers = {'Cache-Control': 'no-cache', 'ETag': quote_etag(entry['etag'])}
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(entry['etag']):
+        await request.respond(304, headers=headers)
+    else:
+        await request.respond(200, entry['body'], headers, content_type='application/json')
+
+
+# Endpoint names match the Flask views so /metrics reads the same under both
+ROUTES = [
+    (re.compile(r'/api/stream/([^/]+)'), 'stream_video', stream_video),
+    (re.compile(r'/api/process/([^/]+)'), 'process_movie', process_movie),
+    (re.compile(r'/api/events'), 'theatre_events', theatre_events),
+    (re.compile(r'/api/status'), 'system_status', system_status),
+]
+
+
+# ═══════════════════════════════════════════
+# APPLICATION
+# ═══════════════════════════════════════════
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await run_sync(cinema.startup)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        for pattern, endpoint, handler in ROUTES:
+            match = pattern.fullmatch(scope['path'])
+            if match:
+                request = Request(scope, receive, send, endpoint)
+                try:
+                    await handler(request, *match.groups())
+                finally:
+                    request.close()
+                return
+
+    await flask_app(scope, receive, send)
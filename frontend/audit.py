@@ -0,0 +1,271 @@
+"""Append-only audit log stored as rotated JSONL segments.
+
+Callers only append to an in-memory buffer. A background thread writes
+the buffer out in batches, so an audit event costs no file I/O on the
+request path. The active segment rotates once it reaches a size limit.
+Each closed segment gets a small sidecar index (time range, actions,
+movie and theatre ids), so filtered queries can skip segments that cannot
+match. Old segments are dropped by total size and by age. Events are
+never silently truncated.
+
+    audit/
+        00000001.jsonl        closed segment
+        00000001.idx.json     its index
+        00000002.jsonl        active segment
+"""
+import os
+import json
+import atexit
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+def _parse_time(value):
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class _SegmentIndex:
+    """Summary of one segment: enough to rule it out of a query."""
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.first = data.get('first')
+        self.last = data.get('last')
+        self.count = data.get('count', 0)
+        self.actions = set(data.get('actions', []))
+        self.movie_ids = set(data.get('movie_ids', []))
+        self.theatre_ids = set(data.get('theatre_ids', []))
+
+    def add(self, entry):
+        details = entry.get('details') or {}
+        self.first = self.first or entry['timestamp']
+        self.last = entry['timestamp']
+        self.count += 1
+        self.actions.add(entry['action'])
+        if details.get('movie_id'):
+            self.movie_ids.add(details['movie_id'])
+        if details.get('theatre_id'):
+            self.theatre_ids.add(details['theatre_id'])
+
+    def may_match(self, actions, movie_id, theatre_id, since, until):
+        if not self.count:
+            return False
+        if actions and not self.actions & actions:
+            return False
+        if movie_id and movie_id not in self.movie_ids:
+            return False
+        if theatre_id and theatre_id not in self.theatre_ids:
+            return False
+        if since and _parse_time(self.last) < since:
+            return False
+        if until and _parse_time(self.first) > until:
+            return False
+        return True
+
+    def to_dict(self):
+        return {
+            'first': self.first,
+            'last': self.last,
+            'count': self.count,
+            'actions': sorted(self.actions),
+            'movie_ids': sorted(self.movie_ids),
+            'theatre_ids': sorted(self.theatre_ids),
+        }
+
+
+def _matches(entry, actions, movie_id, theatre_id, since, until):
+    details = entry.get('details') or {}
+    if actions and entry['action'] not in actions:
+        return False
+    if movie_id and details.get('movie_id') != movie_id:
+        return False
+    if theatre_id and details.get('theatre_id') != theatre_id:
+        return False
+    if since or until:
+        ts = _parse_time(entry['timestamp'])
+        if (since and ts < since) or (until and ts > until):
+            return False
+    return True
+
+
+class AuditLog:
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024,
+                 retain_bytes=256 * 1024 * 1024, retain_days=365,
+                 flush_interval=1.0, legacy_path=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.retain_bytes = retain_bytes
+        self.retain_days = retain_days
+        self.flush_interval = flush_interval
+
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._io_lock = threading.Lock()   # segment files and indexes
+        self._wake = threading.Event()
+        self._closed = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._indexes = {}
+        for seq in self._segments():
+            self._indexes[seq] = self._load_index(seq)
+        if not self._indexes:
+            self._indexes[1] = _SegmentIndex()
+            if legacy_path:
+                self._import_legacy(legacy_path)
+        self._active = max(self._indexes)
+
+        self._thread = threading.Thread(target=self._flusher, name='audit-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ─── Segments ────────────────────────────
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f'{seq:08d}.jsonl')
+
+    def _index_path(self, seq):
+        return os.path.join(self.directory, f'{seq:08d}.idx.json')
+
+    def _segments(self):
+        return sorted(
+            int(name[:-len('.jsonl')]) for name in os.listdir(self.directory)
+            if name.endswith('.jsonl') and name[:-len('.jsonl')].isdigit()
+        )
+
+    def _read_segment(self, seq):
+        entries = []
+        try:
+            with open(self._segment_path(seq), 'r') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue   # torn final line after a crash
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _load_index(self, seq):
+        try:
+            with open(self._index_path(seq), 'r') as f:
+                return _SegmentIndex(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Active segment (or a lost sidecar): rebuild from the lines
+            index = _SegmentIndex()
+            for entry in self._read_segment(seq):
+                index.add(entry)
+            return index
+
+    def _import_legacy(self, legacy_path):
+        """Seed the first segment from the old whole-file audit_log.json."""
+        try:
+            with open(legacy_path, 'r') as f:
+                legacy = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self._write_entries(legacy, 1)
+
+    def _write_entries(self, entries, seq):
+        lines = ''.join(json.dumps(e) + '\n' for e in entries)
+        with open(self._segment_path(seq), 'a') as f:
+            f.write(lines)
+        for entry in entries:
+            self._indexes[seq].add(entry)
+
+    def _rotate(self):
+        with open(self._index_path(self._active), 'w') as f:
+            json.dump(self._indexes[self._active].to_dict(), f)
+        self._active += 1
+        self._indexes[self._active] = _SegmentIndex()
+        self._apply_retention()
+
+    def _apply_retention(self):
+        """Drop the oldest closed segments beyond the size or age limit."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retain_days)
+        closed = sorted(seq for seq in self._indexes if seq != self._active)
+        sizes = {seq: os.path.getsize(self._segment_path(seq))
+                 for seq in self._indexes if os.path.exists(self._segment_path(seq))}
+        total = sum(sizes.values())
+        for seq in closed:
+            last = self._indexes[seq].last
+            expired = last is not None and _parse_time(last) < cutoff
+            if total <= self.retain_bytes and not expired:
+                break
+            total -= sizes.get(seq, 0)
+            for path in (self._segment_path(seq), self._index_path(seq)):
+                if os.path.exists(path):
+                    os.remove(path)
+            del self._indexes[seq]
+
+    # ─── Writing ─────────────────────────────
+
+    def append(self, entry):
+        """Buffer one entry; the flusher thread writes it shortly after."""
+        with self._buffer_lock:
+            self._buffer.append(entry)
+        return entry
+
+    def flush(self):
+        """Write all buffered entries to the active segment now."""
+        with self._io_lock:
+            with self._buffer_lock:
+                pending, self._buffer = self._buffer, []
+            path = self._segment_path(self._active)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            batch = []
+            for entry in pending:
+                batch.append(entry)
+                size += len(json.dumps(entry)) + 1
+                if size >= self.segment_bytes:
+                    self._write_entries(batch, self._active)
+                    self._rotate()
+                    batch, size = [], 0
+            if batch:
+                self._write_entries(batch, self._active)
+
+    def _flusher(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError:
+                pass   # disk trouble: keep the buffer growing and retry
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    # ─── Reading ─────────────────────────────
+
+    def query(self, actions=None, movie_id=None, theatre_id=None,
+              since=None, until=None, limit=100, offset=0):
+        """Return ``(entries, more)``: matching entries, newest first.
+
+        ``actions`` is a set of action names. ``since`` and ``until`` are
+        ISO-8601 strings (inclusive). ``more`` tells whether another page
+        exists after ``offset + limit``.
+        """
+        actions = set(actions) if actions else None
+        since = _parse_time(since) if since else None
+        until = _parse_time(until) if until else None
+
+        self.flush()
+        results = []
+        skipped = 0
+        with self._io_lock:
+            for seq in sorted(self._indexes, reverse=True):
+                if not self._indexes[seq].may_match(actions, movie_id, theatre_id, since, until):
+                    continue
+                for entry in reversed(self._read_segment(seq)):
+                    if not _matches(entry, actions, movie_id, theatre_id, since, until):
+                        continue
+                    if skipped < offset:
+                        skipped += 1
+                        continue
+                    if len(results) == limit:
+                        return results, True
+                    results.append(entry)
+        return results, False
@@ -0,0 +1,270 @@
+"""Background job queue for the ingest pipeline.
+
+Jobs run on a bounded worker pool, independently of any HTTP request, and
+their state is kept in a small SQLite table so it survives restarts. Each
+job also keeps its progress events in memory, so any number of SSE
+clients can subscribe, disconnect, and resume from the last event seen,
+either from a thread (subscribe) or from an asyncio loop (subscribe_async).
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+TERMINAL_STEPS = ('done', 'error')
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def wake(waiters):
+    """Resolve the futures of asyncio subscribers, from any thread."""
+    for loop, future in waiters:
+        loop.call_soon_threadsafe(_resolve, future)
+    waiters.clear()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def wait_async(cond, waiters, timeout):
+    """Await the next wake(waiters) under ``cond``, at most ``timeout`` s.
+
+    Must be called with ``cond`` held, like Condition.wait(), and returns
+    with it held again. False on timeout.
+    """
+    future = asyncio.get_running_loop().create_future()
+    waiter = (asyncio.get_running_loop(), future)
+    waiters.append(waiter)
+    cond.release()
+    try:
+        await asyncio.wait_for(future, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        cond.acquire()
+        if waiter in waiters:
+            waiters.remove(waiter)
+
+
+class Job:
+    """In-memory view of one pipeline run: its event log, and a condition
+    and future list that thread and asyncio subscribers wait on."""
+
+    def __init__(self, job_id, movie_id):
+        self.job_id = job_id
+        self.movie_id = movie_id
+        self.events = []
+        self.finished = False
+        self.cond = threading.Condition()
+        self.waiters = []
+
+
+class JobQueue:
+    def __init__(self, db_path, max_workers=2, retain=100):
+        self.db_path = db_path
+        self.retain = retain
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        with self._connect() as db:
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id     TEXT PRIMARY KEY,
+                    movie_id   TEXT NOT NULL,
+                    status     TEXT NOT NULL,
+                    step       TEXT,
+                    progress   INTEGER DEFAULT 0,
+                    message    TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_movie ON jobs (movie_id)')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _write(self, sql, params):
+        with self._db_lock, self._connect() as db:
+            db.execute(sql, params)
+
+    def _query(self, sql, params=()):
+        with self._connect() as db:
+            db.row_factory = sqlite3.Row
+            return [dict(row) for row in db.execute(sql, params)]
+
+    # ─── Lifecycle ───────────────────────────
+
+    def recover(self):
+        """Mark jobs left active by a previous process as interrupted.
+
+        Returns the affected job rows so the caller can reset their movies.
+        """
+        stale = self._query(
+            'SELECT * FROM jobs WHERE status IN (?, ?)', ACTIVE_STATUSES
+        )
+        now = datetime.now(timezone.utc).isoformat()
+        for row in stale:
+            self._write(
+                'UPDATE jobs SET status = ?, message = ?, updated_at = ? WHERE job_id = ?',
+                ('interrupted', 'Server restarted while the job was running', now, row['job_id'])
+            )
+        return stale
+
+    def submit(self, movie_id, func):
+        """Queue ``func(emit)`` for ``movie_id`` and return the job id.
+
+        ``func`` reports progress by calling ``emit(event)`` with SSE event
+        dicts; an event whose ``step`` is 'done' or 'error' ends the job.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = datetime.now(timezone.utc).isoformat()
+        job = Job(job_id, movie_id)
+        with self._lock:
+            # Drop the event logs of the oldest finished jobs
+            finished = [j for j in self._jobs.values() if j.finished]
+            for old in finished[:max(0, len(finished) - self.retain)]:
+                del self._jobs[old.job_id]
+            self._jobs[job_id] = job
+        self._write(
+            'INSERT INTO jobs (job_id, movie_id, status, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (job_id, movie_id, 'queued', now, now)
+        )
+        self._pool.submit(self._run, job, func)
+        return job_id
+
+    def _run(self, job, func):
+        self._write(
+            'UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?',
+            ('running', datetime.now(timezone.utc).isoformat(), job.job_id)
+        )
+        try:
+            func(lambda event: self._emit(job, event))
+        except Exception as e:
+            self._emit(job, {'step': 'error', 'message': str(e), 'progress': 0})
+        finally:
+            if not job.finished:
+                self._emit(job, {'step': 'error', 'message': 'Job ended unexpectedly', 'progress': 0})
+
+    def _emit(self, job, event):
+        if job.finished:
+            return
+        step = event.get('step')
+        if step in TERMINAL_STEPS:
+            status = 'done' if step == 'done' else 'failed'
+        else:
+            status = 'running'
+
+        # The key in the final event is for the live producer only
+        persisted = {k: v for k, v in event.items() if k != 'key'}
+        self._write(
+            'UPDATE jobs SET status = ?, step = ?, progress = ?, message = ?, updated_at = ? '
+            'WHERE job_id = ?',
+            (status, step, persisted.get('progress', 0), persisted.get('message'),
+             datetime.now(timezone.utc).isoformat(), job.job_id)
+        )
+        with job.cond:
+            job.events.append(event)
+            job.finished = step in TERMINAL_STEPS
+            job.cond.notify_all()
+            wake(job.waiters)
+
+    # ─── Queries ─────────────────────────────
+
+    def get(self, job_id):
+        rows = self._query('SELECT * FROM jobs WHERE job_id = ?', (job_id,))
+        return rows[0] if rows else None
+
+    def latest_for_movie(self, movie_id):
+        rows = self._query(
+            'SELECT * FROM jobs WHERE movie_id = ? ORDER BY created_at DESC LIMIT 1',
+            (movie_id,)
+        )
+        return rows[0] if rows else None
+
+    def list(self, limit=50):
+        return self._query('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,))
+
+    def subscribe(self, job_id, since=0, heartbeat=15):
+        """Yield ``(index, event)`` from event ``since`` until the job ends.
+
+        Yields ``(None, None)`` every ``heartbeat`` seconds of silence so
+        callers can keep idle connections alive. Jobs that are no longer in
+        memory (e.g. from before a restart) replay their persisted state as
+        a single event.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        if job is None:
+            row = self.get(job_id)
+            if row:
+                step = row['step'] if row['status'] in ('done', 'failed') else 'error'
+                yield 0, {'step': step, 'message': row['message'], 'progress': row['progress']}
+            return
+
+        index = since
+        while True:
+            with job.cond:
+                while index >= len(job.events) and not job.finished:
+                    if not job.cond.wait(timeout=heartbeat):
+                        break
+                pending = job.events[index:]
+                finished = job.finished
+
+            if not pending and not finished:
+                yield None, None
+                continue
+            for event in pending:
+                yield index, event
+                index += 1
+            if finished and index >= len(job.events):
+                return
+
+    async def subscribe_async(self, job_id, since=0, heartbeat=15):
+        """Async iterator form of subscribe(), for an asyncio server.
+
+        Waiting costs a future on the loop rather than a thread.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        if job is None:
+            row = await asyncio.get_running_loop().run_in_executor(None, self.get, job_id)
+            if row:
+                step = row['step'] if row['status'] in ('done', 'failed') else 'error'
+                yield 0, {'step': step, 'message': row['message'], 'progress': row['progress']}
+            return
+
+        index = since
+        while True:
+            with job.cond:
+                while index >= len(job.events) and not job.finished:
+                    if not await wait_async(job.cond, job.waiters, heartbeat):
+                        break
+                pending = job.events[index:]
+                finished = job.finished
+
+            if not pending and not finished:
+                yield None, None
+                continue
+            for event in pending:
+                yield index, event
+                index += 1
+            if finished and index >= len(job.events):
+                return
+
+
+def format_sse(index, event):
+    """Render one SSE frame; the id lets EventSource resume after a drop."""
+    if event is None:
+        return ': keep-alive\n\n'
+    return f"id: {index}\ndata: {json.dumps(event)}\n\n"
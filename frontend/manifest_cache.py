@@ -0,0 +1,78 @@
+"""In-memory cache of parsed manifests.
+
+Each entry remembers the identity of the manifest file it was parsed from
+(inode, size, mtime). A lookup costs one stat: the file is only read and
+parsed again when that identity changed, so rewritten or replaced
+manifests are picked up by the next request without explicit
+invalidation. Entries also carry what request handlers used to derive
+from the manifest every time: the playback window as datetimes and the
+digest of the file (the prepared-cache key).
+
+Manifests handed out are shared between requests and must not be modified.
+"""
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+
+def parse_iso(s):
+    """Parse an ISO timestamp, handling both +00:00 and Z suffixes."""
+    s = s.rstrip('Z')
+    dt = datetime.fromisoformat(s)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _identity(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class CachedManifest:
+    def __init__(self, manifest, identity, sha256):
+        self.manifest = manifest
+        self.identity = identity
+        self.sha256 = sha256
+        window = manifest['playback_window']
+        self.start = parse_iso(window['start'])
+        self.end = parse_iso(window['end'])
+
+    def is_active(self, now):
+        return self.start <= now <= self.end
+
+
+class ManifestCache:
+    def __init__(self, path_for):
+        """``path_for(movie_id)`` gives the manifest file of a movie."""
+        self._path_for = path_for
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Bumped whenever an entry is (re)loaded or dropped, so derived
+        # payloads can tell whether any manifest behind them changed
+        self.generation = 0
+
+    def get(self, movie_id):
+        """The movie's parsed manifest; raises OSError if it has none."""
+        path = self._path_for(movie_id)
+        # Stat before reading: a file replaced in between is re-read next time
+        identity = _identity(path)
+        with self._lock:
+            entry = self._entries.get(movie_id)
+        if entry is not None and entry.identity == identity:
+            return entry
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        entry = CachedManifest(json.loads(data), identity, hashlib.sha256(data).hexdigest())
+        with self._lock:
+            self._entries[movie_id] = entry
+            self.generation += 1
+        return entry
+
+    def invalidate(self, movie_id):
+        with self._lock:
+            if self._entries.pop(movie_id, None) is not None:
+                self.generation += 1
@@ -0,0 +1,212 @@
+"""In-process counters, gauges and timing histograms.
+
+Pipeline stages and API routes record into one Metrics registry, which
+/metrics renders in the Prometheus text format (or as JSON). A series is a
+name plus keyword labels:
+
+    metrics.inc('stream_bytes_total', len(chunk), mode='stream')
+
+    with metrics.timer('pipeline_stage_seconds', stage='manifest') as t:
+        ...
+    t.elapsed   # also reported in the job's SSE events
+
+    @metrics.timed('ffprobe_seconds', probe='duration')
+    def get_video_duration(path): ...
+
+Gauges are callbacks sampled when the registry is read, so they cost
+nothing in between. Everything lives in this process only: ProcessPool
+workers report their timings back to the parent instead, by running their
+task through timed_call.
+"""
+import bisect
+import functools
+import math
+import threading
+import time
+
+# Seconds; covers a cached status lookup up to a long transcode
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+
+
+def _series(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format(name, labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return name
+    escaped = (
+        (k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return name + '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def timed_call(func, *args, **kwargs):
+    """Run ``func`` and return ``(result, seconds)``.
+
+    A pool target (with ``func``) for worker processes: it only needs this
+    module and ``func``'s to be importable there.
+    """
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return round(min(bound, self.max), 6)
+        return round(self.max, 6)
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'max': round(self.max, 6),
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Timer:
+    """Times a block into a histogram; ``elapsed`` holds the duration (s)."""
+
+    def __init__(self, metrics, name, labels):
+        self._metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.elapsed = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        self._metrics.observe(self.name, self.elapsed, **self.labels)
+        if exc_type is not None:
+            self._metrics.inc(f'{self.name}_errors_total', **self.labels)
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    # ─── Recording ───────────────────────────
+
+    def inc(self, name, value=1, **labels):
+        key = _series(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _series(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def timer(self, name, **labels):
+        return Timer(self, name, labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of timer()."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def gauge(self, name, func, **labels):
+        """Report ``func()`` as the gauge's value whenever metrics are read."""
+        with self._lock:
+            self._gauges[_series(name, labels)] = func
+
+    # ─── Reading ─────────────────────────────
+
+    def _read(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (list(h.counts), h.count, h.sum, h.snapshot())
+                for key, h in self._histograms.items()
+            }
+            gauges = dict(self._gauges)
+        values = {}
+        for key, func in gauges.items():
+            try:
+                values[key] = func()
+            except Exception:
+                values[key] = math.nan
+        return counters, histograms, values
+
+    def snapshot(self):
+        """All series as JSON-ready dicts keyed by their rendered name."""
+        counters, histograms, gauges = self._read()
+        return {
+            'counters': {_format(*key): value for key, value in sorted(counters.items())},
+            'gauges': {_format(*key): value for key, value in sorted(gauges.items())},
+            'histograms': {_format(*key): h[3] for key, h in sorted(histograms.items())},
+        }
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        counters, histograms, gauges = self._read()
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(counters.items()):
+            declare(name, 'counter')
+            lines.append(f'{_format(name, labels)} {value}')
+        for (name, labels), value in sorted(gauges.items()):
+            declare(name, 'gauge')
+            lines.append(f'{_format(name, labels)} {value}')
+        for (name, labels), (counts, count, total, _) in sorted(histograms.items()):
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{_format(name + "_bucket", labels, [("le", repr(float(bound)))])} {cumulative}')
+            lines.append(f'{_format(name + "_bucket", labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{_format(name + "_sum", labels)} {total}')
+            lines.append(f'{_format(name + "_count", labels)} {count}')
+        return '\n'.join(lines) + '\n'
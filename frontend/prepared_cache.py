@@ -0,0 +1,155 @@
+"""Shared cache of prepared (decrypted + concatenated) movies.
+
+Outputs are content-addressed by ``(movie_id, manifest hash)``, so every
+session of the same movie build reuses one file instead of decrypting it
+again. Each entry counts the session tokens that reference it.
+Unreferenced entries are evicted least recently used first once the disk
+budget is exceeded. Every entry is removed when its playback window ends.
+"""
+import os
+import threading
+from datetime import datetime, timezone
+
+
+class _Entry:
+    def __init__(self, path, expires):
+        self.path = path
+        self.expires = expires
+        self.size = 0
+        self.tokens = set()
+        self.last_used = 0.0
+        self.ready = False
+        self.build_lock = threading.Lock()
+
+
+class PreparedCache:
+    def __init__(self, directory, budget_bytes):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self._entries = {}
+        self._created = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def acquire(self, token, movie_id, manifest_hash, expires, build):
+        """Return the prepared file for a movie build, referenced by ``token``.
+
+        ``build(output_path)`` writes the file on a miss, or when a cached
+        file is no longer on disk; concurrent misses for the same key wait
+        for a single build. ``expires`` is an aware datetime (the playback
+        window end).
+        """
+        key = (movie_id, manifest_hash)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    path = os.path.join(self.directory, f'{movie_id}-{manifest_hash[:16]}.mp4')
+                    entry = self._entries[key] = _Entry(path, expires)
+                    self._created.update((path, path + '.part'))
+                entry.tokens.add(token)
+                entry.last_used = datetime.now(timezone.utc).timestamp()
+
+            with entry.build_lock:
+                with self._lock:
+                    current = self._entries.get(key) is entry
+                if not current:
+                    # The build we waited for failed and dropped the entry;
+                    # building into it would leave an untracked file
+                    continue
+                # A ready file can still vanish (deleted by hand, a sweep of
+                # another process); rebuild it like a miss
+                if not (entry.ready and os.path.exists(entry.path)):
+                    try:
+                        tmp_path = entry.path + '.part'
+                        build(tmp_path)
+                        os.replace(tmp_path, entry.path)
+                    except Exception:
+                        with self._lock:
+                            if self._entries.get(key) is entry:
+                                del self._entries[key]
+                        raise
+                    entry.size = os.path.getsize(entry.path)
+                    entry.ready = True
+            break
+
+        self.sweep()
+        return entry.path
+
+    def release(self, token):
+        """Drop ``token``'s reference; the file stays cached until evicted."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.tokens.discard(token)
+
+    def sweep(self):
+        """Remove expired entries, then evict idle ones over the budget.
+
+        Files are deleted under the lock: once it is released, an acquire
+        may create a new entry (and file) at the same path.
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            doomed = []
+            for key, entry in list(self._entries.items()):
+                if entry.ready and entry.expires <= now:
+                    doomed.append(self._entries.pop(key))
+
+            total = sum(e.size for e in self._entries.values())
+            idle = sorted(
+                (item for item in self._entries.items() if item[1].ready and not item[1].tokens),
+                key=lambda item: item[1].last_used
+            )
+            for key, entry in idle:
+                if total <= self.budget_bytes:
+                    break
+                total -= entry.size
+                doomed.append(self._entries.pop(key))
+
+            for entry in doomed:
+                if os.path.exists(entry.path):
+                    os.remove(entry.path)
+
+    def remove_orphans(self):
+        """Delete files this cache wrote that no entry owns any more, e.g. a
+        failed build's partial output. Files it did not write are left alone:
+        another process (a reloader child, a second server) may be serving
+        them."""
+        with self._lock:
+            owned = set()
+            for entry in self._entries.values():
+                owned.update((entry.path, entry.path + '.part'))
+            orphans = [path for path in self._created - owned if os.path.isfile(path)]
+            self._created &= owned
+        for path in orphans:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return len(orphans)
+
+    def remove_stale(self):
+        """Delete prepared files left in the directory by an earlier process.
+
+        Only for server startup, before any session is served: it cannot tell
+        a stale file from one another live process is using.
+        """
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(('.mp4', '.mp4.part')) and os.path.isfile(path):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(e.size for e in self._entries.values()),
+                'budget_bytes': self.budget_bytes,
+                'sessions': sum(len(e.tokens) for e in self._entries.values())
+            }
@@ -0,0 +1,211 @@
+"""Server-pushed events for theatre screens.
+
+Instead of every screen polling for its session's expiry and the theatre
+status, the server schedules what it knows will happen and pushes it:
+
+- TimerWheel runs scheduled callbacks on one thread. Scheduling and
+  cancelling are O(1) and cost nothing until the timer fires, so each
+  session keeps exactly one pending timer (its next update) however many
+  sessions there are.
+- Channels fans events out to SSE subscribers per topic (a session token,
+  or a theatre's status feed). Like jobs.JobQueue, every event has an
+  index so a reconnecting EventSource resumes from Last-Event-ID.
+"""
+import math
+import threading
+import time
+
+from jobs import wait_async, wake
+
+
+class Timer:
+    __slots__ = ('callback', 'rounds', 'cancelled')
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.rounds = 0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """Hashed timer wheel with ``tick`` (seconds) resolution.
+
+    A timer lands in the slot ``delay / tick`` ahead of the cursor and
+    counts down one round each time the cursor passes it; the thread only
+    wakes once per tick. Callbacks run on the wheel thread and must be
+    quick.
+    """
+
+    def __init__(self, tick=1.0, slots=512):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def schedule(self, delay, callback):
+        """Run ``callback()`` after ``delay`` seconds; returns a cancellable Timer."""
+        ticks = max(1, math.ceil(delay / self.tick))
+        timer = Timer(callback)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='timer-wheel', daemon=True)
+                self._thread.start()
+            timer.rounds = (ticks - 1) // len(self._slots)
+            self._slots[(self._cursor + ticks) % len(self._slots)].append(timer)
+        return timer
+
+    def _advance(self):
+        with self._lock:
+            self._cursor = (self._cursor + 1) % len(self._slots)
+            slot = self._slots[self._cursor]
+            due = [t for t in slot if not t.cancelled and t.rounds == 0]
+            waiting = [t for t in slot if not t.cancelled and t.rounds > 0]
+            for t in waiting:
+                t.rounds -= 1
+            self._slots[self._cursor] = waiting
+        for timer in due:
+            try:
+                timer.callback()
+            except Exception:
+                pass   # one failing callback must not stop the wheel
+
+    def _run(self):
+        next_tick = time.monotonic() + self.tick
+        while not self._closed:
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._advance()
+            next_tick += self.tick
+
+    def close(self):
+        self._closed = True
+
+
+class _Topic:
+    def __init__(self, retain):
+        self.events = []
+        self.base = 0          # index of events[0]; older ones were dropped
+        self.retain = retain
+        self.closed = False
+        self.subscribers = 0
+        self.cond = threading.Condition()
+        self.waiters = []      # futures of asyncio subscribers
+
+
+class Channels:
+    def __init__(self, retain=64):
+        self.retain = retain
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def _topic(self, name):
+        with self._lock:
+            topic = self._topics.get(name)
+            if topic is None:
+                topic = self._topics[name] = _Topic(self.retain)
+            return topic
+
+    def publish(self, name, event, close=False):
+        """Append ``event`` to a topic; ``close`` ends it after this event."""
+        topic = self._topic(name)
+        with topic.cond:
+            if topic.closed:
+                return
+            topic.events.append(event)
+            if len(topic.events) > topic.retain:
+                drop = len(topic.events) - topic.retain
+                del topic.events[:drop]
+                topic.base += drop
+            topic.closed = close
+            topic.cond.notify_all()
+            wake(topic.waiters)
+
+    def subscribers(self, name):
+        with self._lock:
+            topic = self._topics.get(name)
+        return topic.subscribers if topic else 0
+
+    def exists(self, name):
+        with self._lock:
+            return name in self._topics
+
+    def discard(self, name):
+        """Forget a topic that has ended or that nobody is subscribed to.
+
+        Current subscribers of a closed topic still finish reading it.
+        """
+        with self._lock:
+            topic = self._topics.get(name)
+            if topic and (topic.closed or not topic.subscribers):
+                del self._topics[name]
+
+    def subscribe(self, name, since=None, heartbeat=15):
+        """Yield ``(index, event)`` from event ``since`` until the topic closes.
+
+        ``since=None`` starts at the latest event, i.e. the current state.
+        Yields ``(None, None)`` after ``heartbeat`` seconds of silence, so
+        callers can keep idle connections alive.
+        """
+        topic = self._topic(name)
+        with topic.cond:
+            topic.subscribers += 1
+            if since is None:
+                since = topic.base + max(0, len(topic.events) - 1)
+        try:
+            index = since
+            while True:
+                with topic.cond:
+                    while index >= topic.base + len(topic.events) and not topic.closed:
+                        if not topic.cond.wait(timeout=heartbeat):
+                            break
+                    index = max(index, topic.base)
+                    pending = topic.events[index - topic.base:]
+                    closed = topic.closed
+
+                if not pending and not closed:
+                    yield None, None
+                    continue
+                for event in pending:
+                    yield index, event
+                    index += 1
+                if closed:
+                    return
+        finally:
+            with topic.cond:
+                topic.subscribers -= 1
+
+    async def subscribe_async(self, name, since=None, heartbeat=15):
+        """Async iterator form of subscribe(), for an asyncio server."""
+        topic = self._topic(name)
+        with topic.cond:
+            topic.subscribers += 1
+            if since is None:
+                since = topic.base + max(0, len(topic.events) - 1)
+        try:
+            index = since
+            while True:
+                with topic.cond:
+                    while index >= topic.base + len(topic.events) and not topic.closed:
+                        if not await wait_async(topic.cond, topic.waiters, heartbeat):
+                            break
+                    index = max(index, topic.base)
+                    pending = topic.events[index - topic.base:]
+                    closed = topic.closed
+
+                if not pending and not closed:
+                    yield None, None
+                    continue
+                for event in pending:
+                    yield index, event
+                    index += 1
+                if closed:
+                    return
+        finally:
+            with topic.cond:
+                topic.subscribers -= 1
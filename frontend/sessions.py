@@ -0,0 +1,101 @@
+"""Playback sessions by token, in memory and optionally in SQLite.
+
+Sessions are plain dicts with at least ``movie_id`` and ``expires`` (ISO
+timestamp). With a database path every change is written through, so
+sessions outlive a restart; fields listed in ``private`` (decryption
+keys, paths of files that do not survive a restart) stay in memory only
+and are for the caller to restore. The store holds at most
+``max_sessions``; add() refuses more rather than dropping a live one.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from manifest_cache import parse_iso
+
+
+class SessionStore:
+    def __init__(self, db_path=None, max_sessions=10000, private=()):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.private = set(private)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        if db_path:
+            with self._connect() as db:
+                db.execute('''
+                    CREATE TABLE IF NOT EXISTS sessions (
+                        token   TEXT PRIMARY KEY,
+                        expires TEXT NOT NULL,
+                        data    TEXT NOT NULL
+                    )
+                ''')
+                rows = db.execute('SELECT token, data FROM sessions').fetchall()
+            self._sessions = {token: json.loads(data) for token, data in rows}
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _persist(self, token, info):
+        if not self.db_path:
+            return
+        with self._db_lock, self._connect() as db:
+            if info is None:
+                db.execute('DELETE FROM sessions WHERE token = ?', (token,))
+            else:
+                public = {k: v for k, v in info.items() if k not in self.private}
+                db.execute(
+                    'INSERT OR REPLACE INTO sessions (token, expires, data) VALUES (?, ?, ?)',
+                    (token, info['expires'], json.dumps(public))
+                )
+
+    def add(self, token, info):
+        """Store a new session; False if the store is full."""
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                return False
+            self._sessions[token] = dict(info)
+        self._persist(token, info)
+        return True
+
+    def update(self, token, **fields):
+        with self._lock:
+            info = self._sessions.get(token)
+            if info is None:
+                return None
+            info.update(fields)
+            info = dict(info)
+        self._persist(token, info)
+        return info
+
+    def get(self, token):
+        with self._lock:
+            info = self._sessions.get(token)
+            return dict(info) if info else None
+
+    def pop(self, token):
+        with self._lock:
+            info = self._sessions.pop(token, None)
+        if info is not None:
+            self._persist(token, None)
+        return info
+
+    def items(self):
+        with self._lock:
+            return [(token, dict(info)) for token, info in self._sessions.items()]
+
+    def expired(self, now=None):
+        """Tokens whose playback window has ended."""
+        now = now or datetime.now(timezone.utc)
+        return [token for token, info in self.items() if parse_iso(info['expires']) <= now]
+
+    def __contains__(self, token):
+        with self._lock:
+            return token in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
@@ -78,53 +78,119 @@ function formatSize(bytes) {
 }
 
 // ── Upload with Progress ────────────────
+//
+// Files are sent in chunks to /api/uploads, several at a time. The upload
+// id is remembered per file, so a retry (or a page reload) only sends the
+// chunks the server has not received yet.
 
-uploadBtn.addEventListener("click", () => {
+const PARALLEL_CHUNKS = 4;
+const CHUNK_RETRIES = 3;
+
+uploadBtn.addEventListener("click", async () => {
   if (!selectedFile) return;
 
   uploadBtn.disabled = true;
   uploadBtn.textContent = "Uploading…";
   uploadProgress.classList.remove("hidden");
 
-  const form = new FormData();
-  form.append("file", selectedFile);
-  form.append("theatre_id", theatreIdInput.value.trim() || "THEATRE_001");
-
-  const xhr = new XMLHttpRequest();
-  xhr.open("POST", "/api/upload");
-
-  xhr.upload.onprogress = (e) => {
-    if (e.lengthComputable) {
-      const pct = Math.round((e.loaded / e.total) * 100);
-      uploadBar.style.width = pct + "%";
-      uploadPercent.textContent = `Uploading ${pct}%`;
-    }
-  };
-
-  xhr.onload = () => {
-    const data = JSON.parse(xhr.responseText);
-    if (xhr.status !== 200) {
-      alert(data.error || "Upload failed");
-      uploadBtn.disabled = false;
-      uploadBtn.textContent = "Upload & Process";
-      uploadProgress.classList.add("hidden");
-      return;
-    }
+  try {
+    const data = await uploadResumable(selectedFile, theatreIdInput.value.trim() || "THEATRE_001");
     uploadPercent.textContent = "Upload complete!";
     document.getElementById("upload-section").classList.add("hidden");
     pipelineSec.classList.remove("hidden");
     runPipeline(data.movie_id);
-  };
-
-  xhr.onerror = () => {
-    alert("Upload error. Check your connection.");
+  } catch (err) {
+    alert((err && err.message) || "Upload error. Check your connection.");
     uploadBtn.disabled = false;
     uploadBtn.textContent = "Upload & Process";
     uploadProgress.classList.add("hidden");
+  }
+});
+
+async function apiJSON(url, options = {}) {
+  const res = await fetch(url, options);
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) {
+    const err = new Error(data.error || `Request failed (${res.status})`);
+    err.status = res.status;
+    throw err;
+  }
+  return data;
+}
+
+async function startUpload(file, theatreId) {
+  const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}:${theatreId}`;
+  const saved = localStorage.getItem(resumeKey);
+  if (saved) {
+    try {
+      return { resumeKey, upload: await apiJSON(`/api/uploads/${saved}`) };
+    } catch {
+      localStorage.removeItem(resumeKey);
+    }
+  }
+  const upload = await apiJSON("/api/uploads", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ filename: file.name, size: file.size, theatre_id: theatreId }),
+  });
+  localStorage.setItem(resumeKey, upload.upload_id);
+  return { resumeKey, upload };
+}
+
+async function sha256Hex(blob) {
+  if (!window.crypto || !crypto.subtle) return null; // insecure context: skip
+  const digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+async function putChunk(uploadId, file, index, chunkSize) {
+  const start = index * chunkSize;
+  const blob = file.slice(start, Math.min(start + chunkSize, file.size));
+  const checksum = await sha256Hex(blob);
+  const headers = { "Content-Type": "application/octet-stream" };
+  if (checksum) headers["X-Chunk-SHA256"] = checksum;
+
+  for (let attempt = 0; ; attempt++) {
+    try {
+      await apiJSON(`/api/uploads/${uploadId}?offset=${start}`, { method: "PUT", headers, body: blob });
+      return blob.size;
+    } catch (err) {
+      if (attempt >= CHUNK_RETRIES || (err.status && err.status < 500 && err.status !== 422)) throw err;
+      await new Promise((r) => setTimeout(r, 500 * 2 ** attempt));
+    }
+  }
+}
+
+async function uploadResumable(file, theatreId) {
+  const { resumeKey, upload } = await startUpload(file, theatreId);
+  const received = new Set(upload.received);
+  const pending = [];
+  for (let i = 0; i < upload.chunk_count; i++) {
+    if (!received.has(i) && file.size > 0) pending.push(i);
+  }
+
+  let done = file.size - pending.reduce(
+    (sum, i) => sum + Math.min(upload.chunk_size, file.size - i * upload.chunk_size), 0);
+  const report = () => {
+    const pct = file.size ? Math.round((done / file.size) * 100) : 100;
+    uploadBar.style.width = pct + "%";
+    uploadPercent.textContent = `Uploading ${pct}%`;
   };
+  report();
 
-  xhr.send(form);
-});
+  const worker = async () => {
+    while (pending.length) {
+      const index = pending.shift();
+      done += await putChunk(upload.upload_id, file, index, upload.chunk_size);
+      report();
+    }
+  };
+  await Promise.all(Array.from({ length: PARALLEL_CHUNKS }, worker));
+
+  const result = await apiJSON(`/api/uploads/${upload.upload_id}/finalize`, { method: "POST" });
+  localStorage.removeItem(resumeKey);
+  return result;
+}
 
 // ── Pipeline with Animated Stepper ──────
 
@@ -176,10 +242,15 @@ function runPipeline(movieId) {
     }
   };
 
+  // The job keeps running server-side; EventSource reconnects on its own
+  // and resumes from the last event id it received.
   source.onerror = () => {
-    source.close();
-    statusText.textContent = "❌ Connection lost";
-    statusText.style.color = "#ff4e6a";
+    if (source.readyState === EventSource.CLOSED) {
+      statusText.textContent = "❌ Connection lost";
+      statusText.style.color = "#ff4e6a";
+    } else {
+      statusText.textContent = "Reconnecting to pipeline...";
+    }
   };
 }
 
@@ -241,9 +312,19 @@ async function loadHistory() {
           <span class="h-name">🎬 ${h.name}</span>
           <span class="h-meta"> — ${h.shards} shards — ${h.theatre_id}</span>
         </div>
-        <span class="h-key" title="Click to copy key" onclick="navigator.clipboard.writeText('${h.key}')">${h.key}</span>
+        ${h.key
+          ? `<span class="h-key" title="Click to copy key"></span>`
+          : `<span class="h-meta">key shown at processing only</span>`}
       </div>
     `).join("");
+
+    // Keys go in as text, never into markup or inline handlers
+    list.querySelectorAll(".history-item").forEach((item, i) => {
+      const keyEl = item.querySelector(".h-key");
+      if (!keyEl) return;
+      keyEl.textContent = data[i].key;
+      keyEl.addEventListener("click", () => navigator.clipboard.writeText(data[i].key));
+    });
   } catch {
     // silently ignore
   }
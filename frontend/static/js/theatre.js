@@ -14,39 +14,59 @@ const playerSec = document.getElementById("player-section");
 const videoPlayer = document.getElementById("video-player");
 
 let currentToken = null;
-let expiryTimer = null;
+let statusEvents = null;
+let sessionEvents = null;
 let countdownTimer = null;
 let windowEnd = null;
+let hls = null;
 
-// ── Check System Status ──────────────────
+// ── System Status ────────────────────────
+
+// The server pushes the status whenever it changes (a movie becomes
+// ready, a playback window opens or closes).
+function watchStatus() {
+  if (!window.EventSource) {
+    checkStatus();
+    setInterval(checkStatus, 30000);
+    return;
+  }
+  statusEvents = new EventSource("/api/events");
+  statusEvents.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === "status") showStatus(msg);
+  };
+}
 
 async function checkStatus() {
   try {
     const res = await fetch("/api/status");
-    const data = await res.json();
-
-    if (!data.ready) {
-      statusBanner.classList.remove("hidden");
-      statusBanner.className = "banner banner-warn";
-      statusText.textContent =
-        "⚠ No movie available yet. Ask the producer to upload a movie first.";
-      authBtn.disabled = true;
-    } else if (!data.playback_active) {
-      statusBanner.classList.remove("hidden");
-      statusBanner.className = "banner banner-warn";
-      statusText.textContent = `⚠ Playback window is not active. Window: ${formatUTC(data.playback_start)} — ${formatUTC(data.playback_end)}`;
-      authBtn.disabled = true;
-    } else {
-      statusBanner.classList.remove("hidden");
-      statusBanner.className = "banner banner-info";
-      statusText.textContent = `✅ Movie ready — ${data.shards} shards | Theatre: ${data.theatre_id} | Window ends ${formatUTC(data.playback_end)}`;
-      authBtn.disabled = false;
-    }
+    showStatus(await res.json());
   } catch {
     statusBanner.classList.add("hidden");
   }
 }
 
+function showStatus(data) {
+  if (!data.ready) {
+    statusBanner.classList.remove("hidden");
+    statusBanner.className = "banner banner-warn";
+    statusText.textContent =
+      "⚠ No movie available yet. Ask the producer to upload a movie first.";
+    authBtn.disabled = true;
+  } else if (!data.playback_active) {
+    statusBanner.classList.remove("hidden");
+    statusBanner.className = "banner banner-warn";
+    statusText.textContent = `⚠ Playback window is not active. Window: ${formatUTC(data.playback_start)} — ${formatUTC(data.playback_end)}`;
+    authBtn.disabled = true;
+  } else {
+    statusBanner.classList.remove("hidden");
+    statusBanner.className = "banner banner-info";
+    const others = (data.movies || []).length > 1 ? ` (+${data.movies.length - 1} more)` : "";
+    statusText.textContent = `✅ ${data.name || "Movie"} ready${others} — ${data.shards} shards | Theatre: ${data.theatre_id} | Window ends ${formatUTC(data.playback_end)}`;
+    authBtn.disabled = false;
+  }
+}
+
 function formatUTC(iso) {
   const d = new Date(iso);
   return (
@@ -56,8 +76,7 @@ function formatUTC(iso) {
   );
 }
 
-checkStatus();
-setInterval(checkStatus, 30000);
+watchStatus();
 
 // ── Authentication ───────────────────────
 
@@ -88,6 +107,7 @@ authForm.addEventListener("submit", async (e) => {
     }
 
     // Success — show the player
+    if (statusEvents) statusEvents.close();
     authLoading.classList.add("hidden");
     authSection.classList.add("hidden");
     statusBanner.classList.add("hidden");
@@ -104,15 +124,14 @@ authForm.addEventListener("submit", async (e) => {
     const watermark = document.getElementById("drm-watermark");
     watermark.setAttribute("data-watermark", `${data.movie_info.theatre_id} • PROTECTED`);
 
-    videoPlayer.src = `/api/stream/${data.token}`;
-    videoPlayer.load();
+    attachSource(data);
     videoPlayer.play().catch(() => {});
 
     // Enable screen protection
     enableScreenProtection();
 
     // Start expiry countdown
-    startExpiryCountdown();
+    startExpiryCountdown(data.events_url);
 
   } catch (err) {
     authError.textContent = "Connection error: " + err.message;
@@ -122,6 +141,21 @@ authForm.addEventListener("submit", async (e) => {
   }
 });
 
+// Prefer HLS (per-segment fetch, seek and buffer); fall back to the
+// single progressive stream when HLS is unavailable.
+function attachSource(data) {
+  if (data.hls_url && window.Hls && Hls.isSupported()) {
+    hls = new Hls();
+    hls.loadSource(data.hls_url);
+    hls.attachMedia(videoPlayer);
+  } else if (data.hls_url && videoPlayer.canPlayType("application/vnd.apple.mpegurl")) {
+    videoPlayer.src = data.hls_url;
+  } else {
+    videoPlayer.src = data.stream_url || `/api/stream/${data.token}`;
+    videoPlayer.load();
+  }
+}
+
 // ═══════════════════════════════════════════
 // SCREEN CAPTURE PROTECTION
 // ═══════════════════════════════════════════
@@ -170,7 +204,7 @@ function onVisibilityChange() {
 // SESSION AUTO-EXPIRY
 // ═══════════════════════════════════════════
 
-function startExpiryCountdown() {
+function startExpiryCountdown(eventsUrl) {
   const timeBadge = document.getElementById("time-badge");
   const infoTime = document.getElementById("info-time");
   const expiryWarning = document.getElementById("expiry-warning");
@@ -202,25 +236,34 @@ function startExpiryCountdown() {
     }
   }, 10000);
 
-  // Also check with server every 60s
-  expiryTimer = setInterval(async () => {
-    if (!currentToken) return;
-    try {
-      const res = await fetch(`/api/check-expiry/${currentToken}`);
-      const data = await res.json();
-      if (data.expired) {
-        clearInterval(expiryTimer);
-        clearInterval(countdownTimer);
-        expireSession();
-      }
-    } catch {
-      // ignore
+  // The server pushes the remaining time, and ends the session (expired
+  // or revoked by the producer) the moment it is over
+  sessionEvents = new EventSource(eventsUrl || `/api/events?token=${currentToken}`);
+  sessionEvents.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === "remaining") {
+      windowEnd = new Date(Date.now() + msg.remaining_seconds * 1000);
+    } else if (msg.type === "expired" || msg.type === "revoked") {
+      clearInterval(countdownTimer);
+      expireSession(msg);
     }
-  }, 60000);
+  };
 }
 
-function expireSession() {
+function expireSession(msg) {
+  if (sessionEvents) {
+    sessionEvents.close();
+    sessionEvents = null;
+  }
+  if (msg && msg.type === "revoked") {
+    document.querySelector("#expired-overlay h2").textContent = "Playback Revoked";
+    document.querySelector("#expired-overlay p").textContent = msg.message;
+  }
   videoPlayer.pause();
+  if (hls) {
+    hls.destroy();
+    hls = null;
+  }
   videoPlayer.src = "";
   document.getElementById("expired-overlay").classList.remove("hidden");
 
@@ -0,0 +1,205 @@
+"""Resumable chunked uploads.
+
+A client declares an upload (file name and size), then PUTs fixed-size
+chunks at their byte offsets, in any order and in parallel, and finally
+asks for it to be finalized. Each chunk is streamed straight into its place
+in a preallocated file and hashed on the way in, so nothing is buffered
+whole in memory and no request ever carries the full movie. Upload state
+is kept next to the data, so after a dropped connection or a server
+restart, the client asks which chunks arrived and sends only the rest.
+
+    uploads/.partial/<upload_id>/
+        state.json      name, size, chunk size, received chunk hashes
+        data            the file being assembled
+
+The source checksum is SHA-256 over the ordered chunk SHA-256s (a hash
+list), which can be computed while chunks arrive out of order.
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+COPY_BLOCK = 1024 * 1024
+
+
+def file_digest(path, chunk_size):
+    """Source checksum of a file already on disk, as finalize() computes it."""
+    digests = []
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digests.append(hashlib.sha256(block).digest())
+    return hashlib.sha256(b''.join(digests)).hexdigest()
+
+
+class UploadError(ValueError):
+    """Rejected upload request; ``status`` is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadStore:
+    def __init__(self, root, chunk_size=8 * 1024 * 1024, max_size=None, ttl_hours=48):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = timedelta(hours=ttl_hours)
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, upload_id):
+        if not upload_id.isalnum():
+            raise UploadError('Upload not found', 404)
+        return os.path.join(self.root, upload_id)
+
+    def _load(self, upload_id):
+        try:
+            with open(os.path.join(self._dir(upload_id), 'state.json'), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            raise UploadError('Upload not found', 404)
+
+    def _save(self, state):
+        path = os.path.join(self._dir(state['upload_id']), 'state.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+    def chunk_count(self, state):
+        return max(1, -(-state['size'] // state['chunk_size']))
+
+    def describe(self, state):
+        received = sorted(int(i) for i in state['chunks'])
+        return {
+            'upload_id': state['upload_id'],
+            'filename': state['filename'],
+            'size': state['size'],
+            'chunk_size': state['chunk_size'],
+            'chunk_count': self.chunk_count(state),
+            'received': received,
+            'complete': len(received) == self.chunk_count(state)
+        }
+
+    # ─── Protocol ────────────────────────────
+
+    def create(self, filename, size, **meta):
+        """Start an upload of ``size`` bytes; returns its description."""
+        if size < 0:
+            raise UploadError('Invalid size')
+        if self.max_size and size > self.max_size:
+            raise UploadError('File too large', 413)
+        if shutil.disk_usage(self.root).free < size:
+            raise UploadError('Not enough disk space for this upload', 507)
+        self.sweep()
+
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._dir(upload_id))
+        with open(os.path.join(self._dir(upload_id), 'data'), 'wb') as f:
+            f.truncate(size)
+        state = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'chunks': {},
+            'meta': meta,
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+        self._save(state)
+        return self.describe(state)
+
+    def status(self, upload_id):
+        return self.describe(self._load(upload_id))
+
+    def write_chunk(self, upload_id, offset, stream, length, expected_sha256=None):
+        """Stream ``length`` bytes from ``stream`` into the chunk at ``offset``.
+
+        Chunks may arrive concurrently and in any order; a repeated chunk
+        overwrites the earlier copy, which stops counting as received until
+        the new one has arrived whole and verified.
+        """
+        state = self._load(upload_id)
+        chunk_size = state['chunk_size']
+        if offset < 0 or offset % chunk_size or offset >= max(state['size'], 1):
+            raise UploadError('Offset must be a chunk boundary inside the file')
+        index = offset // chunk_size
+        if length != min(chunk_size, state['size'] - offset):
+            raise UploadError(f'Chunk {index} must be {min(chunk_size, state["size"] - offset)} bytes')
+
+        # The bytes on disk are about to change: forget the old digest first,
+        # so a failed or interrupted write cannot finalize as received
+        with self._lock:
+            state = self._load(upload_id)
+            if state['chunks'].pop(str(index), None) is not None:
+                self._save(state)
+
+        h = hashlib.sha256()
+        fd = os.open(os.path.join(self._dir(upload_id), 'data'), os.O_WRONLY)
+        try:
+            written = 0
+            while written < length:
+                block = stream.read(min(COPY_BLOCK, length - written))
+                if not block:
+                    raise UploadError('Chunk body ended early')
+                h.update(block)
+                view = memoryview(block)
+                while view:
+                    n = os.pwrite(fd, view, offset + written)
+                    view = view[n:]
+                    written += n
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        digest = h.hexdigest()
+        if expected_sha256 and digest != expected_sha256.lower():
+            raise UploadError(f'Chunk {index} checksum mismatch', 422)
+
+        with self._lock:
+            state = self._load(upload_id)
+            state['chunks'][str(index)] = digest
+            self._save(state)
+        return self.describe(state)
+
+    def finalize(self, upload_id, dest_path):
+        """Move a complete upload to ``dest_path``.
+
+        Returns ``(state, source_sha256)``.
+        """
+        with self._lock:
+            state = self._load(upload_id)
+            count = self.chunk_count(state)
+            missing = [i for i in range(count) if str(i) not in state['chunks']]
+            if state['size'] and missing:
+                raise UploadError(f'Missing chunks: {missing[:20]}', 409)
+
+            digests = b''.join(
+                bytes.fromhex(state['chunks'][str(i)])
+                for i in range(count) if str(i) in state['chunks']
+            )
+            source_sha256 = hashlib.sha256(digests).hexdigest()
+
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            os.replace(os.path.join(self._dir(upload_id), 'data'), dest_path)
+            shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+        return state, source_sha256
+
+    def abort(self, upload_id):
+        self._load(upload_id)
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+    def sweep(self):
+        """Remove uploads untouched for longer than the TTL."""
+        cutoff = (datetime.now(timezone.utc) - self.ttl).timestamp()
+        for upload_id in os.listdir(self.root):
+            state_path = os.path.join(self.root, upload_id, 'state.json')
+            try:
+                if os.path.getmtime(state_path) < cutoff:
+                    shutil.rmtree(os.path.join(self.root, upload_id), ignore_errors=True)
+            except FileNotFoundError:
+                continue
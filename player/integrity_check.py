@@ -1,5 +1,8 @@
 import hashlib
 
-def verify_sha256(data: bytes, expected_hash: str) -> bool:
+def verify_sha256(data, expected_hash: str) -> bool:
+    """Hash bytes or a MappedShard (read through its mapping, no copy)."""
+    if hasattr(data, "sha256"):
+        return data.sha256() == expected_hash
     actual_hash = hashlib.sha256(data).hexdigest()
     return actual_hash == expected_hash
@@ -1,9 +1,35 @@
-from cryptography.fernet import Fernet
+import os
+import sys
 
-def decrypt_shard(encrypted_data, key):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from shard_crypto import decrypt_bytes, open_buffer  # noqa: E402
+from mp4_pipe import faststart  # noqa: E402
+
+
+def decrypt_shard(encrypted_data, key, shard_id):
     """
-    Decrypt a shard using Fernet.
+    Decrypt a shard (chunked AEAD, or legacy Fernet token).
     Decrypted data exists only in memory.
     """
-    fernet = Fernet(key)
-    return fernet.decrypt(encrypted_data)
+    return decrypt_bytes(encrypted_data, key, shard_id)
+
+
+def iter_decrypted(encrypted_data, key, shard_id, verifier=None):
+    """
+    Decrypt a shard chunk by chunk, so only one chunk of plaintext is
+    resident at a time. ``encrypted_data`` may be bytes or a MappedShard.
+    With a Merkle ``verifier`` each chunk is verified just before it is
+    decrypted.
+    """
+    with open_buffer(encrypted_data, key, shard_id, verifier=verifier) as reader:
+        yield from reader.iter_chunks()
+
+
+def iter_faststart(encrypted_data, key, shard_id, verifier=None):
+    """
+    Like iter_decrypted, for a whole-file MP4 shard: its moov index is
+    read first and sent ahead of the media data, so the result can be
+    read from a pipe (see mp4_pipe.faststart).
+    """
+    with open_buffer(encrypted_data, key, shard_id, verifier=verifier) as reader:
+        yield from faststart(reader)
@@ -1,7 +1,27 @@
-def request_key():
+import os
+
+from manifest_reader import Catalog
+from kms_client import KMSClient
+
+KMS_URL = os.environ.get("CINEMASHIELD_KMS_URL")
+
+
+def request_key(movie_id=None):
     """
     Prototype: securely load Fernet key.
     Production: this comes from authenticated KMS API.
     """
+    if movie_id:
+        return Catalog().load_key(movie_id)
     with open("../backend/secret.key", "rb") as f:
         return f.read()
+
+
+def kms_client(theatre_id):
+    """
+    KMS client when CINEMASHIELD_KMS_URL is set, else None
+    (keys are then read locally by request_key).
+    """
+    if not KMS_URL:
+        return None
+    return KMSClient(KMS_URL, theatre_id, token=os.environ.get("CINEMASHIELD_KMS_TOKEN"))
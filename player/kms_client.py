@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from shard_crypto import ShardKey  # noqa: E402
+
+
+class KMSClientError(Exception):
+    pass
+
+
+class KMSClient:
+    """
+    Client for the local KMS (backend/kms.py).
+    One client holds one playback session.
+    """
+
+    def __init__(self, base_url, theatre_id, token=None, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.theatre_id = theatre_id
+        self.token = token
+        self.timeout = timeout
+        self.session = None
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.load(e).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise KMSClientError(f"KMS {e.code}: {message}") from None
+        except urllib.error.URLError as e:
+            raise KMSClientError(f"KMS unreachable: {e.reason}") from None
+
+    def open_session(self, movie_id):
+        """Open a playback session; returns the session (incl. manifest_key)."""
+        self.session = self._post("/v1/sessions", {
+            "movie_id": movie_id,
+            "theatre_id": self.theatre_id
+        })
+        return self.session
+
+    def fetch_keys(self, shard_ids):
+        """
+        Fetch keys for a batch of shards.
+        Returns {shard_id: ShardKey, or the movie key for legacy shards}.
+        """
+        result = self._post("/v1/keys", {
+            "session": self.session["session"],
+            "shard_ids": list(shard_ids)
+        })
+        return {
+            shard_id: ShardKey(issued["key"]) if issued["scope"] == "shard" else issued["key"].encode()
+            for shard_id, issued in result["keys"].items()
+        }
+
+
+class KeyPrefetcher:
+    """
+    Fetches shard keys in batches ahead of playback.
+
+    Asking for the key of shard i also requests the batches covering the
+    next ``lookahead`` shards, so by the time playback reaches them their
+    keys are already here. Batches behind playback are dropped.
+    """
+
+    def __init__(self, client, shard_ids, lookahead=8, batch_size=4):
+        self.client = client
+        self.shard_ids = list(shard_ids)
+        self.lookahead = lookahead
+        self.batch_size = batch_size
+        self._position = {shard_id: i for i, shard_id in enumerate(self.shard_ids)}
+        self._batches = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2)
+
+    def _batch(self, index):
+        # Called with the lock held
+        number = index // self.batch_size
+        if number not in self._batches:
+            ids = self.shard_ids[number * self.batch_size:(number + 1) * self.batch_size]
+            self._batches[number] = self._pool.submit(self.client.fetch_keys, ids)
+        return self._batches[number]
+
+    def key_for(self, shard_id):
+        """Key of ``shard_id``; blocks only if it has not arrived yet."""
+        index = self._position[shard_id]
+        with self._lock:
+            future = self._batch(index)
+            for ahead in range(index + 1, min(index + 1 + self.lookahead, len(self.shard_ids))):
+                self._batch(ahead)
+            # Batches entirely behind playback are no longer needed
+            for number in [n for n in self._batches if (n + 1) * self.batch_size <= index]:
+                del self._batches[number]
+        return future.result()[shard_id]
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
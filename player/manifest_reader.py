@@ -1,12 +1,20 @@
+import os
+import sys
 import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from catalog import Catalog  # noqa: E402
+
 MANIFEST_PATH = "../backend/manifest.json"
 
-def load_manifest():
+def load_manifest(movie_id=None):
+    """Catalog manifest for movie_id, or the legacy single manifest."""
+    if movie_id:
+        return Catalog().load_manifest(movie_id)
     with open(MANIFEST_PATH, "r") as f:
         return json.load(f)
 
 if __name__ == "__main__":
-    manifest = load_manifest()
+    manifest = load_manifest(sys.argv[1] if len(sys.argv) > 1 else None)
     print("Movie ID:", manifest.get("movie_id"))
     print("Total shards:", len(manifest["shards"]))
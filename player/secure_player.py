@@ -1,90 +1,282 @@
 import os
+import time
+import argparse
 import subprocess
 import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from manifest_reader import load_manifest
-from shard_loader import load_encrypted_shard
-from key_request import request_key
-from jit_decrypt import decrypt_shard
+from shard_loader import open_encrypted_shard
+from key_request import request_key, kms_client
+from kms_client import KeyPrefetcher, KMSClientError
+from jit_decrypt import iter_decrypted, iter_faststart
 from integrity_check import verify_sha256
+from merkle import ManifestVerifier, is_merkle
+from mp4_pipe import PipeConcat
+from shard_crypto import part_key
+from shard_io import ShardIntegrityError
+from verify_cache import VerificationCache
 
 
 THEATRE_ID = "THEATRE_001"
 
+# Streaming mode: shards decrypted ahead of the one being played, and the
+# cap on decrypted bytes held while they wait for the pipe
+READ_AHEAD = 4
+MAX_BUFFER_BYTES = 256 * 1024 * 1024
 
-def verify_all_shards(manifest):
+
+def open_decryptor(manifest, movie_id, parts, mapped, cache):
     """
-    Verify integrity of all encrypted shards BEFORE playback.
-    If any shard is tampered, playback is blocked.
+    Get the keys and verifier for playback; returns ``(decrypted, prefetcher)``
+    where ``decrypted(shard, encrypted)`` yields plaintext chunks (pass
+    ``pipeable=True`` for a whole-file MP4 shard that will be read from a
+    pipe).
+
+    v1 manifests are verified in full here; v2 (Merkle) manifests are
+    authenticated with the key and each chunk is verified just before it
+    is decrypted (shards verified before and unchanged since are skipped).
+    With a KMS configured, the player never sees the movie key: it gets
+    the manifest MAC key with its session, and each shard's own key is
+    prefetched in batches ahead of playback.
     """
-    print(">>> Verifying integrity of all shards...")
-    for shard in manifest["shards"]:
-        shard_id = shard["id"]
-        expected_hash = shard["sha256"]
+    client = kms_client(THEATRE_ID) if movie_id else None
+    prefetcher = None
+    if client:
+        session = client.open_session(movie_id)
+        prefetcher = KeyPrefetcher(client, session["shards"])
+        key_for = lambda shard: prefetcher.key_for(shard["id"])  # noqa: E731
+    else:
+        key = request_key(movie_id)
+        key_for = lambda shard: part_key(key, shard)  # noqa: E731
 
-        encrypted = load_encrypted_shard(shard_id)
-        if not verify_sha256(encrypted, expected_hash):
-            print(f"❌ Integrity check FAILED for {shard_id}")
-            return False
+    verifier = None
+    try:
+        if is_merkle(manifest):
+            if client:
+                verifier = ManifestVerifier(manifest, root_key=session["manifest_key"])
+            else:
+                verifier = ManifestVerifier(manifest, key)
+        else:
+            for shard, encrypted in zip(parts, mapped):
+                if cache.is_verified(encrypted.path, shard["sha256"]):
+                    continue
+                if not verify_sha256(encrypted, shard["sha256"]):
+                    raise ShardIntegrityError(f"Integrity check failed: {shard['id']}")
+                cache.mark_verified(encrypted.path, shard["sha256"])
+    except Exception:
+        if prefetcher:
+            prefetcher.close()
+        raise
 
-    print("✅ All shards passed integrity verification")
-    return True
+    def decrypted(shard, encrypted, pipeable=False):
+        part_verifier = None
+        if verifier and not cache.is_verified(encrypted.path, shard["sha256"]):
+            part_verifier = verifier.for_part(
+                shard["id"],
+                on_complete=lambda: cache.mark_verified(encrypted.path, shard["sha256"])
+            )
+        iterate = iter_faststart if pipeable else iter_decrypted
+        return iterate(encrypted, key_for(shard), shard["id"], part_verifier)
 
+    return decrypted, prefetcher
 
-def play_secure_tempfile():
+
+def play_secure_tempfile(movie_id=None, full_verify=False):
     print(">>> Secure theatre player started")
 
-    manifest = load_manifest()
-
-    # 1️⃣ Verify integrity first
-    for shard in manifest["shards"]:
-        encrypted = load_encrypted_shard(shard["id"])
-        if not verify_sha256(encrypted, shard["sha256"]):
-            print("❌ Integrity check failed:", shard["id"])
-            return
-
-    key = request_key()
-
-    # 2️⃣ Create temp folder for decrypted shards
-    with tempfile.TemporaryDirectory() as tmpdir:
-        decrypted_files = []
-
-        # 3️⃣ Decrypt each shard to temp file
-        for idx, shard in enumerate(manifest["shards"]):
-            encrypted = load_encrypted_shard(shard["id"])
-            decrypted = decrypt_shard(encrypted, key)
-
-            shard_path = os.path.join(tmpdir, f"dec_{idx}.mp4")
-            with open(shard_path, "wb") as f:
-                f.write(decrypted)
-
-            decrypted_files.append(shard_path)
-            del decrypted
-
-        # 4️⃣ Create concat list
-        concat_file = os.path.join(tmpdir, "list.txt")
-        with open(concat_file, "w") as f:
-            for path in decrypted_files:
-                f.write(f"file '{path}'\n")
-
-        # 5️⃣ Re-mux correctly and play
-        output_path = os.path.join(tmpdir, "final.mp4")
-        subprocess.run([
-            "ffmpeg",
-            "-f", "concat",
-            "-safe", "0",
-            "-i", concat_file,
-            "-c", "copy",
-            output_path
-        ], check=True)
-
-        subprocess.run([
+    manifest = load_manifest(movie_id)
+
+    # Fragmented-MP4 movies carry an init segment ahead of the shards
+    parts = ([manifest["init"]] if manifest.get("init") else []) + manifest["shards"]
+
+    # 1️⃣ Map every shard once, then verify and get keys
+    cache = VerificationCache(force=full_verify)
+    mapped = [open_encrypted_shard(shard, movie_id) for shard in parts]
+    prefetcher = None
+    try:
+        decrypted, prefetcher = open_decryptor(manifest, movie_id, parts, mapped, cache)
+
+        # 2️⃣ Create temp folder for the playable file
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "final.mp4")
+
+            if manifest.get("init"):
+                # 3️⃣ Init + fragments concatenate into a playable file as-is
+                with open(output_path, "wb") as out:
+                    for shard, encrypted in zip(parts, mapped):
+                        for chunk in decrypted(shard, encrypted):
+                            out.write(chunk)
+            else:
+                # 3️⃣ Stream each decrypted shard into one ffmpeg concat
+                #    through a pipe; final.mp4 is the only plaintext on disk
+                concat = PipeConcat(
+                    [lambda s=shard, e=encrypted: decrypted(s, e, pipeable=True)
+                     for shard, encrypted in zip(parts, mapped)],
+                    ["-c", "copy", output_path]
+                )
+                concat.wait()
+
+            subprocess.run([
+                "ffplay",
+                "-autoexit",
+                "-loglevel", "quiet",
+                output_path
+            ])
+    except (ShardIntegrityError, KMSClientError) as e:
+        print("❌", e)
+        return
+    finally:
+        if prefetcher:
+            prefetcher.close()
+        for encrypted in mapped:
+            encrypted.close()
+
+    print(">>> Playback finished, all temp files deleted")
+
+
+def play_secure_stream(movie_id=None, full_verify=False, read_ahead=READ_AHEAD,
+                       max_buffer=MAX_BUFFER_BYTES, workers=None):
+    """
+    Stream decrypted shards into ffplay over a pipe; nothing is written to disk.
+
+    A thread pool reads, verifies and decrypts the shards after N while
+    shard N is written to ffplay, so playback starts after the first shard.
+    At most ``read_ahead`` shards and ``max_buffer`` bytes are in flight or
+    held at once, counting shard N (always at least one shard). Whole-file
+    MP4 shards are instead remuxed on the fly by one ffmpeg concat fed
+    through pipes (see play_concat_stream).
+    """
+    manifest = load_manifest(movie_id)
+    if not manifest.get("init"):
+        return play_concat_stream(manifest, movie_id, full_verify)
+
+    print(">>> Secure theatre player started (streaming)")
+    started = time.monotonic()
+    parts = [manifest["init"]] + manifest["shards"]
+
+    cache = VerificationCache(force=full_verify)
+    mapped = [open_encrypted_shard(shard, movie_id) for shard in parts]
+    prefetcher = None
+    pool = ThreadPoolExecutor(max_workers=workers or max(1, min(read_ahead, os.cpu_count() or 1)))
+    pending = deque()
+    player = None
+    try:
+        decrypted, prefetcher = open_decryptor(manifest, movie_id, parts, mapped, cache)
+
+        def decrypt_part(index):
+            return b"".join(decrypted(parts[index], mapped[index]))
+
+        player = subprocess.Popen([
             "ffplay",
             "-autoexit",
             "-loglevel", "quiet",
-            output_path
-        ])
+            "-"
+        ], stdin=subprocess.PIPE)
+
+        next_index, buffered = 0, 0
+        while next_index < len(parts) or pending:
+            # Keep the read-ahead window full, within the memory cap
+            # (decrypted size is close to the encrypted size)
+            while next_index < len(parts) and (not pending or (
+                    len(pending) < read_ahead and buffered + mapped[next_index].size <= max_buffer)):
+                size = mapped[next_index].size
+                pending.append((size, pool.submit(decrypt_part, next_index)))
+                buffered += size
+                next_index += 1
+
+            size, future = pending.popleft()
+            data = future.result()
+            if started is not None:
+                print(f">>> Playback started after {time.monotonic() - started:.2f}s")
+                started = None
+            try:
+                player.stdin.write(data)
+            except BrokenPipeError:
+                # Playback was closed early
+                break
+            buffered -= size
+
+        try:
+            player.stdin.close()
+        except BrokenPipeError:
+            pass
+        player.wait()
+    except (ShardIntegrityError, KMSClientError) as e:
+        print("❌", e)
+        return
+    finally:
+        for _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+        if player and player.poll() is None:
+            player.kill()
+            player.wait()
+        if prefetcher:
+            prefetcher.close()
+        for encrypted in mapped:
+            encrypted.close()
+
+    print(">>> Playback finished, nothing was written to disk")
+
+
+def play_concat_stream(manifest, movie_id=None, full_verify=False):
+    """
+    Stream a movie of whole-file MP4 shards into ffplay without temp files:
+    shards are decrypted into an ffmpeg concat through pipes, which remuxes
+    them to fragmented MP4 on its stdout, read by ffplay.
+    """
+    print(">>> Secure theatre player started (streaming, concat)")
+    parts = manifest["shards"]
+    cache = VerificationCache(force=full_verify)
+    mapped = [open_encrypted_shard(shard, movie_id) for shard in parts]
+    prefetcher = None
+    concat = None
+    try:
+        decrypted, prefetcher = open_decryptor(manifest, movie_id, parts, mapped, cache)
+        concat = PipeConcat(
+            [lambda s=shard, e=encrypted: decrypted(s, e, pipeable=True)
+             for shard, encrypted in zip(parts, mapped)],
+            ["-c", "copy", "-f", "mp4", "-movflags", "frag_keyframe+empty_moov", "pipe:1"],
+            stdout=subprocess.PIPE
+        )
+        player = subprocess.Popen([
+            "ffplay",
+            "-autoexit",
+            "-loglevel", "quiet",
+            "-"
+        ], stdin=concat.stdout)
+        concat.stdout.close()
+        player.wait()
+        try:
+            concat.wait()
+        except subprocess.CalledProcessError:
+            # ffmpeg loses its reader when playback is closed early
+            pass
+    except (ShardIntegrityError, KMSClientError) as e:
+        print("❌", e)
+        return
+    finally:
+        if concat:
+            concat.kill()
+        if prefetcher:
+            prefetcher.close()
+        for encrypted in mapped:
+            encrypted.close()
+
+    print(">>> Playback finished, nothing was written to disk")
 
-    print(">>> Playback finished, all temp files deleted")
 
 if __name__ == "__main__":
-    play_secure_tempfile()
+    parser = argparse.ArgumentParser(description="Secure theatre player")
+    parser.add_argument("movie_id", nargs="?", help="catalog movie (default: legacy single movie)")
+    parser.add_argument("--full-verify", action="store_true", help="ignore the verification cache")
+    parser.add_argument("--stream", action="store_true", help="pipe shards to ffplay as they are decrypted")
+    parser.add_argument("--read-ahead", type=int, default=READ_AHEAD, help="shards decrypted ahead (--stream)")
+    parser.add_argument("--max-buffer-mb", type=int, default=MAX_BUFFER_BYTES // (1024 * 1024),
+                        help="cap on decrypted data held in memory (--stream)")
+    args = parser.parse_args()
+    if args.stream:
+        play_secure_stream(args.movie_id, args.full_verify, args.read_ahead, args.max_buffer_mb * 1024 * 1024)
+    else:
+        play_secure_tempfile(args.movie_id, args.full_verify)
@@ -1,8 +1,25 @@
 import os
+from functools import lru_cache
+from manifest_reader import Catalog
+from shard_io import MappedShard
 
 SHARD_DIR = "../backend/encrypted_shards"
 
-def load_encrypted_shard(shard_id):
-    path = os.path.join(SHARD_DIR, shard_id)
-    with open(path, "rb") as f:
+@lru_cache(maxsize=None)
+def _catalog():
+    return Catalog()
+
+def shard_path(shard, movie_id=None):
+    """Path of a shard, given its id or its manifest entry
+    (entries of shard-store objects carry an ``object`` id)."""
+    if movie_id:
+        return _catalog().part_path(movie_id, shard if isinstance(shard, dict) else {"id": shard})
+    return os.path.join(SHARD_DIR, shard["id"] if isinstance(shard, dict) else shard)
+
+def open_encrypted_shard(shard, movie_id=None):
+    """Memory-map an encrypted shard; slices of ``.view`` are zero-copy."""
+    return MappedShard(shard_path(shard, movie_id))
+
+def load_encrypted_shard(shard, movie_id=None):
+    with open(shard_path(shard, movie_id), "rb") as f:
         return f.read()
@@ -0,0 +1,73 @@
+"""
+A 'prepare' session keeps streaming after its prepared file is deleted.
+
+Runs the real ingest pipeline on test_clip.mp4, so it needs ffmpeg and
+ffprobe on PATH. App state is pointed at a scratch directory, as in
+benchmarks/pipeline_bench.py.
+"""
+import os
+import sys
+import shutil
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "frontend"))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+import app  # noqa: E402
+from catalog import Catalog  # noqa: E402
+from prepared_cache import PreparedCache  # noqa: E402
+from sessions import SessionStore  # noqa: E402
+from verify_cache import VerificationCache  # noqa: E402
+
+MOVIE = "test_movie"
+THEATRE = "THEATRE_TEST"
+
+pytestmark = pytest.mark.skipif(
+    not (shutil.which("ffmpeg") and shutil.which("ffprobe")),
+    reason="needs ffmpeg and ffprobe"
+)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "catalog", Catalog(str(tmp_path / "catalog")))
+    monkeypatch.setattr(app, "verify_cache", VerificationCache(str(tmp_path / "verify_cache.json")))
+    monkeypatch.setattr(app, "prepared_cache", PreparedCache(str(tmp_path / "prepared"), app.PREPARED_CACHE_BYTES))
+    monkeypatch.setattr(app, "sessions", SessionStore())
+    monkeypatch.setattr(app, "audit_log", lambda *args, **kwargs: None)
+    monkeypatch.setattr(app, "PLAYBACK_MODE", "prepare")
+    app.validated_keys.clear()
+    return app.app.test_client()
+
+
+@pytest.fixture
+def movie_key(client):
+    app.catalog.create(MOVIE, "test_clip.mp4", THEATRE)
+    _, key, shard_info, _ = app.shard_and_encrypt(MOVIE, os.path.join(ROOT, "test_clip.mp4"), workers=1)
+    app.generate_manifest(
+        MOVIE, theatre_id=THEATRE, shard_info=shard_info,
+        durations=app.segment_durations(MOVIE), key=key.decode()
+    )
+    app.catalog.update(MOVIE, status="ready")
+    return key.decode()
+
+
+def test_stream_rebuilds_deleted_prepared_file(client, movie_key):
+    response = client.post("/api/authenticate", json={"key": movie_key, "movie_id": MOVIE})
+    assert response.status_code == 200
+    token = response.get_json()["token"]
+
+    first = client.get(f"/api/stream/{token}")
+    assert first.status_code == 200
+    body = first.data
+    first.close()
+
+    os.remove(app.sessions.get(token)["filepath"])
+
+    again = client.get(f"/api/stream/{token}")
+    assert again.status_code == 200
+    assert again.data == body
+    again.close()
+    assert os.path.exists(app.sessions.get(token)["filepath"])